@@ -2,6 +2,8 @@ import sys, os
 from abc import ABCMeta
 import numpy as np
 
+from PyGRB.preprocess.rebin import rebin_label
+
 def mkdir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
@@ -102,8 +104,25 @@ class Admin(metaclass=ABCMeta):
             file_string += '_YL'
         else:
             file_string +='_NL'
-        file_string += f'{self.nSamples}_{self.model["name"]}_'
-        return file_string
+        file_string += f'{self.nSamples}_{self.model["name"]}'
+        file_string += self._get_data_string()
+        return file_string + '_'
+
+    def _get_data_string(self):
+        """
+        Labels the data being fit and its likelihood, so that fits of
+        differently binned data, or of counts integrated over the bins
+        rather than rates at their left edges, never share result files or
+        resume from each other. Rebinned data are labelled with
+        :func:`~PyGRB.preprocess.rebin.rebin_label`, and integrated bins
+        with IB and the number of quadrature nodes.
+        """
+        data_string = ''
+        if getattr(self, 'rebin', None) is not None:
+            data_string += f'_{rebin_label(**self.rebin)}'
+        if getattr(self, 'integrate_bins', False):
+            data_string += f'_IB{self.n_nodes}'
+        return data_string
 
     def _setup_labels(self, model):
         """ Sets up the labelling so plots etc. can be created. """
@@ -1,4 +1,9 @@
 import numpy as np
+from collections import namedtuple
+
+# a row of the parameter table of a model: the parameter key, its family
+# (eg. 'tau'), and the pulse and channel keys it belongs to, if any
+Parameter = namedtuple('Parameter', ['key', 'family', 'pulse', 'channel'])
 
 class MakeKeys(object):
     '''
@@ -40,6 +45,7 @@ class MakeKeys(object):
         self.param_lists  =[self.gauss_list, self.FRED_list, self.FREDx_list,
                             self.conv_list, self.res_sg_list, self.res_bes_list]
         self.keys = []
+        self.parameter_table = []
         self._get_max_pulse()
         self.get_residual_list()
         self.fill_keys_list()
@@ -64,11 +70,18 @@ class MakeKeys(object):
                                               for i in array]
 
     def fill_keys_list(self):
+        """
+        Fills the parameter table of the model, and the keys in its order.
+        """
+        table = []
         if self.lens:
-            self.keys += self.lens_list
-        self.keys += [f'background_{self.c}']
+            table += [Parameter(key, key, None, None) for key in self.lens_list]
+        table += [Parameter(f'background_{self.c}', 'background', None, self.c)]
         for p_list, p_type in zip(self.param_lists, self.rate_counts):
-            self.keys += self.fill_list(p_list, p_type)
+            table += [Parameter(f'{p}_{i}_{self.c}', p, i, self.c)
+                      for p in p_list for i in p_type]
+        self.parameter_table += table
+        self.keys += [row.key for row in table]
 
     def get_residual_list(self):
         mylist = self.count_sg + self.count_bes
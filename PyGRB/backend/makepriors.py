@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.special import gammaln
 
 from bilby.core.prior import PriorDict        as bilbyPriorDict
 from bilby.core.prior import Uniform          as bilbyUniform
@@ -7,6 +8,250 @@ from bilby.core.prior import Constraint       as bilbyConstraint
 
 from PyGRB.backend.makekeys import MakeKeys
 
+# the prior of each parameter family, as (prior, minimum, maximum, latex label,
+# unit). Bounds given as strings are the attributes of MakePriors holding them.
+PRIOR_TABLE = {
+    'background'    : ( bilbyLogUniform, 'priors_bg_lo', 'priors_bg_hi',
+                        'B {c}', 'counts / sec'),
+    'time_delay'    : ( bilbyUniform, 'priors_td_lo', 'priors_td_hi',
+                        '$\\Delta t$', ' seconds '),
+    'magnification_ratio' : (
+                        bilbyUniform, 'priors_mr_lo', 'priors_mr_hi',
+                        '$\\Delta \\mu$', ' '),
+    'start'         : ( bilbyUniform, 'priors_pulse_start', 'priors_pulse_end',
+                        '$\\Delta_{n} {c}$', 'sec'),
+    'scale'         : ( bilbyLogUniform, 'priors_scale_min', 'priors_scale_max',
+                        '$A_{n} {c}$', 'counts / sec'),
+    'tau'           : ( bilbyLogUniform, 'priors_tau_lo', 'priors_tau_hi',
+                        '$\\tau_{n} {c}$', ' '),
+    'xi'            : ( bilbyLogUniform, 'priors_xi_lo', 'priors_xi_hi',
+                        '$\\xi_{n} {c}$', ' '),
+    'gamma'         : ( bilbyLogUniform, 'priors_gamma_min', 'priors_gamma_max',
+                        '$\\gamma_{n} {c}$', ' '),
+    'nu'            : ( bilbyLogUniform, 'priors_nu_min', 'priors_nu_max',
+                        '$\\nu_{n} {c}$', ' '),
+    'sigma'         : ( bilbyLogUniform, 'priors_sigma_lo', 'priors_sigma_hi',
+                        '$\\sigma_{n} {c}$', ' '),
+    'res_begin'     : ( bilbyUniform, 'priors_pulse_start', 'priors_pulse_end',
+                        '$\\delta_{n} {c}$', 'sec'),
+    'sg_A'          : ( bilbyLogUniform, 1e0, 1e3, 'res $A_{n} {c}$', None),
+    'sg_lambda'     : ( bilbyLogUniform, 1e-3, 1e3,
+                        'res $\\lambda_{n} {c}$', None),
+    'sg_omega'      : ( bilbyLogUniform, 1e-3, 1e4,
+                        'res $\\omega_{n} {c}$', None),
+    'sg_phi'        : ( bilbyUniform, -np.pi, np.pi,
+                        'res $\\phi_{n} {c}$', None),
+    'bes_A'         : ( bilbyLogUniform, 1e-1, 1e6, 'res $A_{n} {c}$', None),
+    'bes_Omega'     : ( bilbyLogUniform, 1e-3, 1e3,
+                        'res $\\Omega_{n} {c}$', None),
+    'bes_s'         : ( bilbyLogUniform, 1e-3, 1e3, 'res $s_{n} {c}$', None),
+    'bes_Delta'     : ( bilbyUniform, -np.pi, np.pi,
+                        'res $\\Delta_{n} {c}$', None),
+    }
+
+
+class StartConstraint(object):
+    """
+    The conversion function of the prior dictionary, which calculates the
+    differences between consecutive pulse (and residual) start times for the
+    constraint priors. A class rather than a closure so that the priors can
+    be pickled and sent to sampler worker processes. The keys are made once,
+    and the parameters may be arrays of many samples.
+
+    Parameters
+    ----------
+    channel : str or list of str
+        The channel key, eg. 'a', or the keys of each channel of a joint
+        prior.
+    max_pulse : int
+        The number of pulses in the model.
+    residual_list : list of int
+        The pulses which have a residual attached.
+
+    """
+
+    def __init__(self, channel, max_pulse, residual_list):
+        super(StartConstraint, self).__init__()
+        channels = [channel] if isinstance(channel, str) else list(channel)
+        l = residual_list
+        # (constraint key, earlier start key, later start key)
+        self.key_tuples = [
+            (f'constraint_{i}_{c}', f'start_{i-1}_{c}', f'start_{i}_{c}')
+            for c in channels for i in range(2, max_pulse + 1)]
+        self.key_tuples += [
+            (f'constraint_{l[k]}_{c}_res', f'res_begin_{l[k-1]}_{c}',
+             f'res_begin_{l[k]}_{c}')
+            for c in channels for k in range(1, len(l))]
+
+    def __call__(self, parameters):
+        for con_key, st_key1, st_key2 in self.key_tuples:
+            parameters[con_key] = parameters[st_key2] - parameters[st_key1]
+        return parameters
+
+
+class PulsePriorDict(bilbyPriorDict):
+    """
+    A bilby PriorDict which maps the unit cube straight to ordered pulse
+    start times, so no draws are lost to the start constraints.
+
+    The n uniform start times of an ordered group are the order statistics
+    of n draws, found from the unit cube as
+
+    .. math::
+
+        x_n = u_n^{1/n}, \\quad x_k = x_{k+1} u_k^{1/k}
+
+    and scaled to the bounds of the group. The uniform and log-uniform
+    priors of a rescale are each transformed as one array operation. The
+    ordered prior is normalised, so its density is n! times that of the
+    independent priors, which the constraint priors (kept for the other
+    methods of bilby) truncate.
+
+    Parameters
+    ----------
+    ordered_keys : list of list of str, optional
+        The groups of keys which are ordered, e.g. the start times of the
+        pulses of a channel in pulse order. A group is only ordered while its
+        priors are uniform with the same bounds, otherwise it is left to the
+        constraint priors.
+    **kwargs
+        The keyword arguments of bilby.core.prior.PriorDict.
+
+    """
+
+    def __init__(self, dictionary = None, filename = None,
+                 conversion_function = None, ordered_keys = None):
+        # a key repeated in a group would be ordered against itself
+        self.ordered_keys = [list(dict.fromkeys(group))
+                             for group in ordered_keys or []
+                             if len(set(group)) > 1]
+        self._plans = {}
+        super(PulsePriorDict, self).__init__(dictionary, filename,
+                                             conversion_function)
+
+    def copy(self):
+        return self.__class__(dictionary = dict(self),
+                              conversion_function = self.conversion_function,
+                              ordered_keys = self.ordered_keys)
+
+    def __setitem__(self, key, value):
+        # the transform of every rescale is rebuilt when a prior is changed
+        self._plans = {}
+        super(PulsePriorDict, self).__setitem__(key, value)
+
+    def _ordered_groups(self):
+        """ Returns the groups of ordered_keys whose priors can be ordered. """
+        groups = []
+        for group in self.ordered_keys:
+            priors = [self.get(key) for key in group]
+            if all(type(p) is bilbyUniform for p in priors) and len(
+                    {(p.minimum, p.maximum) for p in priors}) == 1:
+                groups.append(group)
+        return groups
+
+    def _plan(self, keys):
+        """
+        Returns the transform of a rescale of keys, as (index, lower, width)
+        of the uniform and log-uniform priors and of each ordered group, and
+        the index of the other priors, which are rescaled one by one.
+        """
+        if keys not in self._plans:
+            position = {key : i for i, key in enumerate(keys)}
+            ordered  = [group for group in self._ordered_groups()
+                        if all(key in position for key in group)]
+            grouped  = {key for group in ordered for key in group}
+            kinds    = {bilbyUniform : [], bilbyLogUniform : []}
+            other    = []
+            for i, key in enumerate(keys):
+                if key not in grouped:
+                    kinds.get(type(self[key]), other).append(i)
+            lower = lambda idx: np.array([self[keys[i]].minimum for i in idx])
+            upper = lambda idx: np.array([self[keys[i]].maximum for i in idx])
+            idx = np.array(kinds[bilbyUniform], dtype = int)
+            uniform = (idx, lower(idx), upper(idx) - lower(idx))
+            idx = np.array(kinds[bilbyLogUniform], dtype = int)
+            log_uniform = (idx, np.log(lower(idx)),
+                           np.log(upper(idx)) - np.log(lower(idx)))
+            groups = []
+            for group in ordered:
+                idx = np.array([position[key] for key in group])
+                groups.append((idx, lower(idx[:1])[0],
+                               upper(idx[:1])[0] - lower(idx[:1])[0]))
+            self._plans[keys] = dict(uniform = uniform, other = other,
+                                     log_uniform = log_uniform,
+                                     ordered = groups)
+        return self._plans[keys]
+
+    def rescale(self, keys, theta):
+        """
+        Rescales points of the unit cube to the prior.
+
+        Parameters
+        ----------
+        keys : list of str
+            The prior keys to be rescaled.
+        theta : array_like
+            The values on the unit cube of each key, or a (len(keys), N)
+            array of N points.
+
+        Returns
+        -------
+        list or array
+            The rescaled values, as a list for a single point.
+
+        """
+        keys   = tuple(keys)
+        theta  = np.asarray(theta, dtype = float)
+        plan   = self._plan(keys)
+        cube   = theta.reshape(len(keys), -1)
+        values = np.empty_like(cube)
+        idx, lower, width = plan['uniform']
+        values[idx] = lower[:, None] + width[:, None] * cube[idx]
+        idx, lower, width = plan['log_uniform']
+        values[idx] = np.exp(lower[:, None] + width[:, None] * cube[idx])
+        for i in plan['other']:
+            values[i] = self[keys[i]].rescale(cube[i])
+        for idx, lower, width in plan['ordered']:
+            power   = 1. / np.arange(1, len(idx) + 1)
+            factors = cube[idx] ** power[:, None]
+            # the running product from the last start back to the first
+            values[idx] = lower + width * np.cumprod(factors[::-1],
+                                                     axis = 0)[::-1]
+        if theta.ndim == 1:
+            return list(values[:, 0])
+        return values.reshape(theta.shape)
+
+    def sample(self, size = None):
+        """
+        Draws samples from the prior by rescaling uniform draws. If a group
+        of ordered keys cannot be ordered the constraints are sampled by
+        rejection, as by bilby.
+        """
+        if len(self._ordered_groups()) < len(self.ordered_keys):
+            return super(PulsePriorDict, self).sample(size)
+        self.convert_floats_to_delta_functions()
+        keys  = [key for key in self
+                     if not isinstance(self[key], bilbyConstraint)]
+        shape = () if size is None else np.atleast_1d(size)
+        cube  = np.random.uniform(size = (len(keys), int(np.prod(shape))))
+        values = self.rescale(keys, cube)
+        return {key : v.reshape(shape)[()] if size is None else
+                      v.reshape(shape) for key, v in zip(keys, values)}
+
+    def _log_order_factor(self, sample):
+        """ The log of n! for each ordered group of n keys in sample. """
+        return sum(gammaln(len(group) + 1) for group in self._ordered_groups()
+                   if all(key in sample for key in group))
+
+    def ln_prob(self, sample, axis = None):
+        ln_prob = super(PulsePriorDict, self).ln_prob(sample, axis = axis)
+        return ln_prob + self._log_order_factor(sample)
+
+    def prob(self, sample, **kwargs):
+        prob = super(PulsePriorDict, self).prob(sample, **kwargs)
+        return prob * np.exp(self._log_order_factor(sample))
+
+
 class MakePriors(MakeKeys):
     """ Doc string goes here. """
 
@@ -35,8 +280,9 @@ class MakePriors(MakeKeys):
                         **kwargs):
 
         super(MakePriors, self).__init__(lens = lens,channel = channel,**kwargs)
-        self.priors = bilbyPriorDict(
-                        conversion_function = self._make_constraints())
+        self.priors = PulsePriorDict(
+                        conversion_function = self._make_constraints(),
+                        ordered_keys = self._ordered_keys())
         self.priors_pulse_start  = priors_pulse_start
         self.priors_pulse_end    = priors_pulse_end
         self.priors_bg_lo        = priors_bg_lo
@@ -60,150 +306,53 @@ class MakePriors(MakeKeys):
         self.populate_priors()
 
     def _make_constraints(self):
-        n = self.max_pulse + 1
-        l = self.residual_list
-        def constraint_function(parameters):
-            # accessing pulses directly by index
-            for i in range(2, n):
-                con_key = f'constraint_{i}_{self.c}'
-                st_key1 = f'start_{i-1}_{self.c}'
-                st_key2 = f'start_{i}_{self.c}'
-                parameters[con_key] = parameters[st_key2] - parameters[st_key1]
-            # accessing residuals through list of residual positions
-            for k in range(1, len(l)):
-                con_key = f'constraint_{l[k]}_{self.c}_res'
-                st_key1 = f'res_begin_{l[k-1]}_{self.c}'
-                st_key2 = f'res_begin_{l[k]}_{self.c}'
-                parameters[con_key] = parameters[st_key2] - parameters[st_key1]
-            return parameters
-        return constraint_function
+        return StartConstraint(self.c, self.max_pulse, self.residual_list)
+
+    def _ordered_keys(self):
+        """
+        Returns the start (and residual start) keys of each channel, in
+        pulse order, for the ordered groups of the prior dictionary. The
+        residuals of a pulse share its res_begin key, which appears once.
+        """
+        groups = {}
+        for row in self.parameter_table:
+            if row.family in ['start', 'res_begin']:
+                groups.setdefault((row.family, row.channel), {})[row.key] = \
+                                  row.pulse
+        return [sorted(group, key = group.get) for group in groups.values()
+                if len(group) > 1]
 
     def populate_priors(self):
         """
         initialise priors
 
-        Pass in kwargs, then overwrite pulse parameters as
-        applicable. Otherwise take generic parameters defined in init.
-
-        just make an overwrite prior function later
+        Each row of the parameter table of the model is given the prior of
+        its family in PRIOR_TABLE, with the bounds of the family set on
+        initialisation.
 
         """
-        for key in self.keys:
-            # find integer in key and put in label
-            n = ''.join([char for char in key if char.isdigit()])
-            self._make_prior(key, n, key[-1])
-
-    def _make_prior(self, key: str, n: str, k: str):
-        # where n is an integer given in string format.
-        if key == f'background_{k}':
-            self.priors[key] = bilbyLogUniform(
-                minimum=self.priors_bg_lo,
-                maximum=self.priors_bg_hi,
-                latex_label = f'B {k}',
-                unit='counts / sec')
-
-        elif key == 'time_delay':
-            self.priors[key] = bilbyUniform(
-                minimum=self.priors_td_lo,
-                maximum=self.priors_td_hi,
-                latex_label='$\\Delta t$',
-                unit=' seconds ')
-            ## throw error if self.lens is False
-
-        elif key == 'magnification_ratio':
-            self.priors[key] = bilbyUniform(
-                minimum=self.priors_mr_lo,
-                maximum=self.priors_mr_hi,
-                latex_label='$\\Delta \\mu$',
-                unit=' ')
-            ## throw error if self.lens is False
-
-        elif 'start' in key:
-            self.priors[key] = bilbyUniform(
-                minimum=self.priors_pulse_start,
-                maximum=self.priors_pulse_end,
-                latex_label=f'$\\Delta_{n} {k}$', unit='sec')
-            if int(n) > 1:
-                c_key = f'constraint_{n}_{k}'
-                self.priors[c_key] = bilbyConstraint(
-                    minimum=0,
-                    maximum=float(self.priors_pulse_end -
-                                  self.priors_pulse_start))
-
-        elif 'scale' in key:
-            self.priors[key] = bilbyLogUniform(
-                minimum=self.priors_scale_min,
-                maximum=self.priors_scale_max,
-                latex_label=f'$A_{n} {k}$', unit='counts / sec')
-
-        elif 'tau' in key:
-            self.priors[key] = bilbyLogUniform(
-                minimum=self.priors_tau_lo,
-                maximum=self.priors_tau_hi,
-                latex_label = f'$\\tau_{n} {k}$', unit=' ')
-
-        elif 'xi' in key:
-            self.priors[key] = bilbyLogUniform(
-                minimum=self.priors_xi_lo,
-                maximum=self.priors_xi_hi,
-                latex_label=f'$\\xi_{n} {k}$', unit=' ')
-
-        elif 'gamma' in key:
-            self.priors[key] = bilbyLogUniform(
-                minimum=self.priors_gamma_min,
-                maximum=self.priors_gamma_max,
-                latex_label=f'$\\gamma_{n} {k}$', unit=' ')
-
-        elif 'nu' in key:
-            self.priors[key] = bilbyLogUniform(
-                minimum=self.priors_nu_min,
-                maximum=self.priors_nu_max,
-                latex_label=f'$\\nu_{n} {k}$', unit=' ')
-
-        elif 'sigma' in key:
-            self.priors[key] = bilbyLogUniform(
-                minimum = self.priors_sigma_lo,
-                maximum = self.priors_sigma_hi,
-                latex_label= f'$\\sigma_{n} {k}$', unit = ' ')
-
-        elif 'begin' in key:
-            self.priors[key] = bilbyUniform(
-                minimum=self.priors_pulse_start,
-                maximum=self.priors_pulse_end,
-                latex_label=f'$\\delta_{n} {k}$', unit='sec')
-            if int(n) > 1:
-                c_key = f'constraint_{n}_{k}_res'
-                self.priors[c_key] = bilbyConstraint(
-                    minimum=0,
-                    maximum=float(self.priors_pulse_end -
-                                  self.priors_pulse_start))
-
-        elif 'sg_A' in key:
-            self.priors[key] = bilbyLogUniform(1e0, 1e3,
-                                latex_label=f'res $A_{n} {k}$')
-        elif 'sg_lambda' in key:
-            self.priors[key] = bilbyLogUniform(1e-3, 1e3,
-                                latex_label = f'res $\\lambda_{n} {k}$')
-        elif 'sg_omega' in key:
-            self.priors[key] = bilbyLogUniform(1e-3, 1e4,
-                                latex_label = f'res $\\omega_{n} {k}$')
-        elif 'sg_phi' in key:
-            self.priors[key] = bilbyUniform(-np.pi, np.pi,
-                                latex_label = f'res $\\phi_{n} {k}$')
-        elif 'bes_A' in key:
-            self.priors[key] = bilbyLogUniform(1e-1, 1e6,
-                                latex_label = f'res $A_{n} {k}$')
-        elif 'bes_Omega' in key:
-            self.priors[key] = bilbyLogUniform(1e-3, 1e3,
-                                latex_label = f'res $\\Omega_{n} {k}$')
-        elif 'bes_s' in key:
-            self.priors[key] = bilbyLogUniform(1e-3, 1e3,
-                                latex_label = f'res $s_{n} {k}$')
-        elif 'bes_Delta' in key:
-            self.priors[key] = bilbyUniform(-np.pi, np.pi,
-                                latex_label = f'res $\\Delta_{n} {k}$')
-        else:
+        for row in self.parameter_table:
+            self._make_prior(row.key, row.family, row.pulse, row.channel)
+
+    def _make_prior(self, key, family, n, k):
+        # where n is the pulse number and k the channel key of the parameter
+        if family not in PRIOR_TABLE:
             raise Exception(f'Key not found : {key}')
+        prior, minimum, maximum, latex_label, unit = PRIOR_TABLE[family]
+        if isinstance(minimum, str):
+            minimum, maximum = getattr(self, minimum), getattr(self, maximum)
+        self.priors[key] = prior(minimum = minimum, maximum = maximum,
+                                 latex_label = latex_label.format(n = n, c = k),
+                                 unit = unit)
+        # consecutive starts are ordered by a constraint on their difference
+        if family in ['start', 'res_begin'] and n > 1:
+            c_key = f'constraint_{n}_{k}'
+            if family == 'res_begin':
+                c_key += '_res'
+            self.priors[c_key] = bilbyConstraint(
+                minimum=0,
+                maximum=float(self.priors_pulse_end -
+                              self.priors_pulse_start))
 
     def return_prior_dict(self):
         """
@@ -5,7 +5,8 @@ from bilby.core.prior import Uniform          as bilbyUniform
 from bilby.core.prior import LogUniform       as bilbyLogUniform
 from bilby.core.prior import Constraint       as bilbyConstraint
 
-from PyGRB.backend.makepriors import MakePriors
+from PyGRB.backend.makepriors import (MakePriors, StartConstraint,
+                                      PulsePriorDict)
 
 class MultiPriors(MakePriors):
     '''
@@ -36,13 +37,16 @@ class MultiPriors(MakePriors):
                         priors_scale_max    = 1e5,  ## SCALING IS COUNTS / BIN
                         **kwargs):
 
-        keys = []
+        keys, table = [], []
         for k in channels:
             super(MakePriors, self).__init__(lens = lens, channel = k, **kwargs)
-            keys += self.keys
+            keys  += self.keys
+            table += self.parameter_table
         self.keys = keys
-        self.priors = bilbyPriorDict(
-                conversion_function = self._make_constraints_multi(channels))
+        self.parameter_table = table
+        self.priors = PulsePriorDict(
+                conversion_function = self._make_constraints_multi(channels),
+                ordered_keys = self._ordered_keys())
 
         self.priors_pulse_start  = priors_pulse_start
         self.priors_pulse_end    = priors_pulse_end
@@ -67,25 +71,8 @@ class MultiPriors(MakePriors):
         self.populate_priors()
 
     def _make_constraints_multi(self, channels):
-        n = self.max_pulse + 1
-        l = self.residual_list
-        c_keys = ['a', 'b', 'c', 'd']
-        def constraint_function(parameters):
-            # accessing pulses directly by index
-            for c in c_keys:
-                for i in range(2, n):
-                    con_key = f'constraint_{i}_{c}'
-                    st_key1 = f'start_{i-1}_{c}'
-                    st_key2 = f'start_{i}_{c}'
-                    parameters[con_key] = parameters[st_key2] - parameters[st_key1]
-                # accessing residuals through list of residual positions
-                for k in range(1, len(l)):
-                    con_key = f'constraint_{l[k]}_{c}_res'
-                    st_key1 = f'res_begin_{l[k-1]}_{c}'
-                    st_key2 = f'res_begin_{l[k]}_{c}'
-                    parameters[con_key] = parameters[st_key2] - parameters[st_key1]
-                return parameters
-        return constraint_function
+        return StartConstraint([self.get_channel_key(c) for c in channels],
+                               self.max_pulse, self.residual_list)
 
 if __name__ == '__main__':
     pass
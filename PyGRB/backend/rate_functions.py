@@ -2,14 +2,29 @@ import sys
 import math
 import numpy as np
 import scipy.special as special
-from scipy.signal import convolve
 
 MIN_FLOAT = sys.float_info[3]
 MAX_FLOAT = sys.float_info[0]
 MAX_EXP   = np.log(MAX_FLOAT)
 
 
-def gaussian_pulse(times, start, scale, sigma):
+def _buffer(out, *args):
+    """ Returns out, or a new array of the broadcast shape of args. """
+    if out is None:
+        out = np.empty(np.broadcast(*args).shape)
+    return out
+
+
+def _before_start(times, start, work):
+    """
+    Returns a mask of the times at or before the start of a pulse, held in
+    the memory of the (C-contiguous) scratch array work.
+    """
+    mask = work.view(np.bool_)[..., :work.shape[-1]]
+    return np.less_equal(times, start, out = mask)
+
+
+def gaussian_pulse(times, start, scale, sigma, out = None):
     r"""
     The amplitude-normalised equation for a fast-rise expontential-decay pulse.
     The rate is calculated at each input time and returned as an array.
@@ -31,6 +46,8 @@ def gaussian_pulse(times, start, scale, sigma):
         The amplitude of the pulse.
     sigma : float
         The width of the pulse.
+    out : ndarray, optional
+        An array of the broadcast shape of the inputs to hold the result.
 
     Returns
     -------
@@ -38,12 +55,17 @@ def gaussian_pulse(times, start, scale, sigma):
          Output array containing the pulse.
 
     """
-    rate = scale * np.exp(- np.power(times - start, 2.) / (
-                        2 * np.power(sigma, 2.) + MIN_FLOAT))
+    rate = _buffer(out, times, start, scale, sigma)
+    np.subtract(times, start, out = rate)
+    np.power(rate, 2., out = rate)
+    np.negative(rate, out = rate)
+    np.divide(rate, 2 * np.power(sigma, 2.) + MIN_FLOAT, out = rate)
+    np.exp(rate, out = rate)
+    np.multiply(rate, scale, out = rate)
     return rate
 
 
-def FRED_pulse(times, start, scale, tau, xi):
+def FRED_pulse(times, start, scale, tau, xi, out = None, work = None):
     r"""
     The amplitude-normalised equation for a fast-rise expontential-decay pulse.
     The rate is calculated at each input time and returned as an array.
@@ -66,6 +88,10 @@ def FRED_pulse(times, start, scale, tau, xi):
         The duration of the pulse.
     xi : float
         The asymmetry of the pulse.
+    out : ndarray, optional
+        An array of the broadcast shape of the inputs to hold the result.
+    work : ndarray, optional
+        An array of the same shape to use as scratch space.
 
     Returns
     -------
@@ -74,10 +100,21 @@ def FRED_pulse(times, start, scale, tau, xi):
 
     """
 
-    rate = np.where(times - start <= 0, MIN_FLOAT, scale * np.exp( - xi * (
-            (tau / np.where(times - start <= 0,
-            times - start - MIN_FLOAT, times - start + MIN_FLOAT))
-         +  ((times - start) / (tau + MIN_FLOAT)) - 2.)))
+    rate = _buffer(out,  times, start, scale, tau, xi)
+    work = _buffer(work, times, start, scale, tau, xi)
+    # times before the start are evaluated at the start (a rate of zero)
+    # and then set to MIN_FLOAT
+    np.subtract(times, start, out = work)
+    np.maximum(work, 0., out = work)
+    with np.errstate(divide = 'ignore'):
+        np.divide(tau, work, out = rate)
+    np.divide(work, tau, out = work)
+    np.add(rate, work, out = rate)
+    np.subtract(rate, 2., out = rate)
+    np.multiply(rate, np.negative(xi), out = rate)
+    np.exp(rate, out = rate)
+    np.multiply(rate, scale, out = rate)
+    np.copyto(rate, MIN_FLOAT, where = _before_start(times, start, work))
     return rate
 
 
@@ -119,7 +156,8 @@ def FRED_pulse_unnorm(times, start, scale, tau, xi):
     return rate
 
 
-def FREDx_pulse(times, start, scale, tau, xi, gamma, nu):
+def FREDx_pulse(times, start, scale, tau, xi, gamma, nu, out = None,
+                work = None):
     r"""
     The amplitude-normalised equation for a fast-rise expontential-decay pulse.
     The rate is calculated at each input time and returned as an array.
@@ -150,6 +188,10 @@ def FREDx_pulse(times, start, scale, tau, xi, gamma, nu):
         An extra exponent on the pulse.
     nu: float
         An extra exponent on the pulse.
+    out : ndarray, optional
+        An array of the broadcast shape of the inputs to hold the result.
+    work : ndarray, optional
+        An array of the same shape to use as scratch space.
 
     Returns
     -------
@@ -157,21 +199,38 @@ def FREDx_pulse(times, start, scale, tau, xi, gamma, nu):
          Output array containing the pulse.
 
     """
-    pow_1 = xi * (tau / (times - start))
-    pow_2 = xi * ((times - start) / tau)
     norm  =   (xi ** ((2 * gamma * nu) / (gamma + nu) )
             * (
             + (gamma / nu) **(       nu / (gamma + nu))
             + (gamma / nu) **((- gamma) / (gamma + nu)) ))
 
-    exp = ( - np.power( pow_1, gamma )
-            - np.power( pow_2, nu )
-            + norm
-            )
-    X   = np.where(times - start <= 0, MIN_FLOAT,
-            np.where(exp < MAX_EXP, np.exp( exp ), MAX_EXP))
-
-    rate = X * scale
+    rate = _buffer(out,  times, start, scale, tau, xi, gamma, nu)
+    work = _buffer(work, times, start, scale, tau, xi, gamma, nu)
+    # times before the start are evaluated at the start (a rate of zero)
+    # and then set to MIN_FLOAT
+    np.subtract(times, start, out = work)
+    np.maximum(work, 0., out = work)
+    with np.errstate(divide = 'ignore'):
+        np.divide(tau, work, out = rate)
+    np.multiply(rate, xi, out = rate)
+    np.power(rate, gamma, out = rate)
+    np.divide(work, tau, out = work)
+    np.multiply(work, xi, out = work)
+    np.power(work, nu, out = work)
+    np.negative(rate, out = rate)
+    np.subtract(rate, work, out = rate)
+    np.add(rate, norm, out = rate)
+    # exponents which are not below MAX_EXP (or are nan) are set to MAX_EXP,
+    # the mask is only made in that rare case
+    clipped = rate.size > 0 and not rate.max() < MAX_EXP
+    if clipped:
+        mask = np.logical_not(rate < MAX_EXP)
+    with np.errstate(over = 'ignore'):
+        np.exp(rate, out = rate)
+    if clipped:
+        np.copyto(rate, MAX_EXP, where = mask)
+    np.copyto(rate, MIN_FLOAT, where = _before_start(times, start, work))
+    np.multiply(rate, scale, out = rate)
     return rate
 
 
@@ -224,7 +283,398 @@ def FREDx_pulse_unnorm(times, start, scale, tau, xi, gamma, nu):
     return rate
 
 
-def sine_gaussian(times, res_begin, sg_A, sg_lambda, sg_omega, sg_phi):
+def _log_pulse_window(times, start, out = None, work = None):
+    """
+    Returns the times since the start of a pulse (held in work), a mask of
+    the times after the start, and out filled with -inf (the log-rate before
+    the pulse starts) to be filled in where the mask is True.
+    """
+    work = _buffer(work, times, start)
+    out  = _buffer(out,  times, start)
+    delta = np.subtract(times, start, out = work)
+    out.fill(- np.inf)
+    return delta, delta > 0, out
+
+
+def log_gaussian_pulse(times, start, scale, sigma, out = None):
+    """
+    The natural logarithm of :func:`~gaussian_pulse`.
+
+    Parameters
+    ----------
+    times : array_like
+        The input time array.
+    start : float
+        The start time of the pulse.
+    scale : float
+        The amplitude of the pulse.
+    sigma : float
+        The width of the pulse.
+    out : ndarray, optional
+        An array of the broadcast shape of the inputs to hold the result.
+
+    Returns
+    -------
+    log_rate : ndarray
+         Output array containing the log of the pulse.
+
+    """
+    log_rate = _buffer(out, times, start, scale, sigma)
+    np.subtract(times, start, out = log_rate)
+    np.square(log_rate, out = log_rate)
+    np.divide(log_rate, - 2 * np.power(sigma, 2.) - MIN_FLOAT, out = log_rate)
+    np.add(log_rate, np.log(scale), out = log_rate)
+    return log_rate
+
+
+def log_FRED_pulse(times, start, scale, tau, xi, out = None, work = None):
+    r"""
+    The natural logarithm of :func:`~FRED_pulse`, which is -inf at and before
+    the start of the pulse. The exponent is written as
+
+    .. math::
+
+        \log S = \log A - \xi \frac{(u - 1)^2}{u}, \quad
+        u = \frac{t - \Delta}{\tau}
+
+    which is only evaluated after the start, and needs no overflow guard.
+
+    Parameters
+    ----------
+    times : array_like
+        The input time array.
+    start : float
+        The start time of the pulse.
+    scale : float
+        The amplitude of the pulse.
+    tau : float
+        The duration of the pulse.
+    xi : float
+        The asymmetry of the pulse.
+    out : ndarray, optional
+        An array of the broadcast shape of the inputs to hold the result.
+    work : ndarray, optional
+        An array of the same shape to use as scratch space.
+
+    Returns
+    -------
+    log_rate : ndarray
+         Output array containing the log of the pulse.
+
+    """
+    u, after, log_rate = _log_pulse_window(times, start, out, work)
+    np.divide(u, tau, out = u)
+    np.subtract(u, 1., out = log_rate, where = after)
+    np.square(log_rate, out = log_rate, where = after)
+    np.divide(log_rate, u, out = log_rate, where = after)
+    np.multiply(log_rate, np.negative(xi), out = log_rate, where = after)
+    np.add(log_rate, np.log(scale), out = log_rate, where = after)
+    return log_rate
+
+
+def log_FRED_pulse_unnorm(times, start, scale, tau, xi):
+    """ The natural logarithm of :func:`~FRED_pulse_unnorm`. """
+    return log_FRED_pulse(times, start, scale, tau, xi) - 2. * xi
+
+
+def _log_FREDx_shape(times, start, tau, xi, gamma, nu):
+    """ The exponent of :func:`~FREDx_pulse_unnorm`, -inf before the start. """
+    u, after, log_rate = _log_pulse_window(times, start)
+    np.divide(u, tau, out = u)
+    # - (xi tau / (t - start)) ** gamma
+    np.divide(xi, u, out = log_rate, where = after)
+    np.power(log_rate, gamma, out = log_rate, where = after)
+    np.negative(log_rate, out = log_rate, where = after)
+    # - (xi (t - start) / tau) ** nu
+    np.multiply(u, xi, out = u)
+    np.power(u, nu, out = u, where = after)
+    np.subtract(log_rate, u, out = log_rate, where = after)
+    return log_rate, after
+
+
+def log_FREDx_pulse(times, start, scale, tau, xi, gamma, nu, out = None,
+                    work = None):
+    r"""
+    The natural logarithm of :func:`~FREDx_pulse`, which is -inf at and before
+    the start of the pulse. The two terms of the exponent are written
+    relative to their values at the peak of the pulse,
+
+    .. math::
+
+        \log S = \log A - P \left[ \left(\frac{u}{u_p}\right)^{-\gamma}
+        - 1 \right] - Q \left[ \left(\frac{u}{u_p}\right)^{\nu} - 1 \right],
+        \quad u = \frac{t - \Delta}{\tau}
+
+    where P + Q is the normalisation of :func:`~FREDx_pulse`, so the large
+    terms do not cancel for steep pulses. A pulse whose normalisation
+    overflows is narrower than the precision of the times, and is -inf
+    everywhere.
+
+    Parameters
+    ----------
+    times : array_like
+        The input time array.
+    start : float
+        The start time of the pulse.
+    scale : float
+        The amplitude of the pulse.
+    tau : float
+        The duration of the pulse.
+    xi : float
+        The asymmetry of the pulse.
+    gamma: float
+        An extra exponent on the pulse.
+    nu: float
+        An extra exponent on the pulse.
+    out : ndarray, optional
+        An array of the broadcast shape of the inputs to hold the result.
+    work : ndarray, optional
+        An array of the same shape to use as scratch space.
+
+    Returns
+    -------
+    log_rate : ndarray
+         Output array containing the log of the pulse.
+
+    """
+    log_xi    = np.log(xi)
+    log_ratio = np.log(gamma / nu)
+    log_P = ((2 * gamma * nu * log_xi - gamma * log_ratio) / (gamma + nu))
+    log_Q = ((2 * gamma * nu * log_xi +    nu * log_ratio) / (gamma + nu))
+    # the log of the time since the start in units of the peak time
+    l, after, log_rate = _log_pulse_window(times, start, out, work)
+    after &= np.isfinite(np.exp(log_P) + np.exp(log_Q))
+    np.log(l, out = l, where = after)
+    np.subtract(l, np.log(tau) + log_Q / nu - log_xi, out = l, where = after)
+    with np.errstate(invalid = 'ignore'):
+        terms = (_scaled_expm1(log_P, - gamma * l)
+               + _scaled_expm1(log_Q,      nu * l))
+    np.subtract(np.log(scale), terms, out = log_rate, where = after)
+    return log_rate
+
+
+def _scaled_expm1(log_c, y):
+    """
+    Returns c * (exp(y) - 1) given log(c), which is accurate for small y and
+    neither overflows nor is nan (from 0 * inf) for large y.
+    """
+    with np.errstate(divide = 'ignore', over = 'ignore'):
+        return np.sign(y) * np.exp(log_c + np.maximum(y, 0.)
+                                   + np.log(- np.expm1(- np.abs(y))))
+
+
+def log_FREDx_pulse_unnorm(times, start, scale, tau, xi, gamma, nu):
+    """ The natural logarithm of :func:`~FREDx_pulse_unnorm`. """
+    log_rate, after = _log_FREDx_shape(times, start, tau, xi, gamma, nu)
+    np.add(log_rate, np.log(scale), out = log_rate, where = after)
+    return log_rate
+
+
+def log_convolution_gaussian(times, start, scale, sigma, tau):
+    """
+    The natural logarithm of :func:`~convolution_gaussian`, which is accurate
+    far into the rise and the decay of the pulse.
+
+    Parameters
+    ----------
+    times : array_like
+        The input time array.
+    start : float
+        The centre of the Gaussian.
+    scale : float
+        The amplitude of the pulse.
+    sigma : float
+        The width of the Gaussian.
+    tau : float
+        The characteristic expontential decay scale.
+
+    Returns
+    -------
+    log_rate : ndarray
+         Output array containing the log of the pulse.
+
+    """
+    delta = np.subtract(times, start, dtype = float)
+    z = (np.divide(sigma, tau) - delta / sigma) * math.sqrt(0.5)
+    with np.errstate(divide = 'ignore'):
+        log_rate = np.where(z >= 0.,
+                    np.log(special.erfcx(z)) - np.square(delta) / (
+                                                2. * np.power(sigma, 2.)),
+                    np.log(special.erfc(z)) - delta / tau
+                    + np.power(sigma, 2.) / (2. * np.power(tau, 2.)))
+    return log_rate + np.log(scale * sigma / tau * math.sqrt(math.pi / 2.))
+
+
+def gaussian_window(start, scale, sigma, rtol):
+    """
+    The support window of :func:`~gaussian_pulse`, outside of which the
+    pulse is less than rtol times its amplitude.
+
+    Parameters
+    ----------
+    start : float
+        The start time of the pulse.
+    scale : float
+        The amplitude of the pulse.
+    sigma : float
+        The width of the pulse.
+    rtol : float
+        The relative tolerance, between 0 and 1.
+
+    Returns
+    -------
+    tuple
+        The (earliest, latest) times of the window.
+
+    """
+    half_width = sigma * np.sqrt(- 2. * np.log(rtol))
+    return start - half_width, start + half_width
+
+
+def FRED_window(start, scale, tau, xi, rtol):
+    r"""
+    The support window of :func:`~FRED_pulse`, outside of which the pulse is
+    less than rtol times its amplitude. The edges are the roots of
+
+    .. math::
+
+        u + \frac{1}{u} = 2 - \frac{\log r}{\xi}, \quad
+        u = \frac{t - \Delta}{\tau}
+
+    Parameters
+    ----------
+    start : float
+        The start time of the pulse.
+    scale : float
+        The amplitude of the pulse.
+    tau : float
+        The duration of the pulse.
+    xi : float
+        The asymmetry of the pulse.
+    rtol : float
+        The relative tolerance, between 0 and 1.
+
+    Returns
+    -------
+    tuple
+        The (earliest, latest) times of the window.
+
+    """
+    c = 2. - np.log(rtol) / xi
+    root = np.sqrt(c * c - 4.)
+    # the smaller root as 2 / (c + root) avoids cancellation for large c
+    return start + tau * 2. / (c + root), start + tau * (c + root) / 2.
+
+
+def FREDx_window(start, scale, tau, xi, gamma, nu, rtol):
+    """
+    A support window of :func:`~FREDx_pulse`, outside of which the pulse is
+    less than rtol times its amplitude. Each term of the exponent must be
+    smaller than the normalisation minus log(rtol) inside the pulse, which
+    bounds the window conservatively.
+
+    Parameters
+    ----------
+    start : float
+        The start time of the pulse.
+    scale : float
+        The amplitude of the pulse.
+    tau : float
+        The duration of the pulse.
+    xi : float
+        The asymmetry of the pulse.
+    gamma: float
+        An extra exponent on the pulse.
+    nu: float
+        An extra exponent on the pulse.
+    rtol : float
+        The relative tolerance, between 0 and 1.
+
+    Returns
+    -------
+    tuple
+        The (earliest, latest) times of the window.
+
+    """
+    norm  =   (xi ** ((2 * gamma * nu) / (gamma + nu) )
+            * (
+            + (gamma / nu) **(       nu / (gamma + nu))
+            + (gamma / nu) **((- gamma) / (gamma + nu)) ))
+    log_bound = np.log(norm - np.log(rtol))
+    return (start + tau * xi * np.exp(- log_bound / gamma),
+            start + tau / xi * np.exp(  log_bound / nu))
+
+
+def convolution_gaussian_window(start, scale, sigma, tau, rtol):
+    r"""
+    A support window of :func:`~convolution_gaussian`, outside of which the
+    pulse is less than rtol times its amplitude. Before the centre the pulse
+    is bounded by the Gaussian, and after it by
+
+    .. math::
+
+        \exp \left[ - \frac{t - \Delta}{2\tau} \right] + \exp \left[
+        - \frac{\left( t - \Delta \right)^2}{8\sigma^2} \right]
+
+    which bounds the window conservatively.
+
+    Parameters
+    ----------
+    start : float
+        The centre of the Gaussian.
+    scale : float
+        The amplitude of the pulse.
+    sigma : float
+        The width of the Gaussian.
+    tau : float
+        The characteristic expontential decay scale.
+    rtol : float
+        The relative tolerance, between 0 and 1.
+
+    Returns
+    -------
+    tuple
+        The (earliest, latest) times of the window.
+
+    """
+    log_rtol = np.log(rtol)
+    tail = np.maximum(2. * tau * (math.log(2.) - log_rtol),
+                      2. * sigma * np.sqrt(2. * (math.log(2.) - log_rtol)))
+    return start - sigma * np.sqrt(- 2. * log_rtol), start + tail
+
+
+def sine_gaussian_window(res_begin, sg_A, sg_lambda, sg_omega, sg_phi, rtol):
+    """
+    The support window of :func:`~sine_gaussian`, outside of which the
+    envelope of the residual is less than rtol times its amplitude.
+
+    Parameters
+    ----------
+    res_begin : float
+        The start time of the pulse.
+    sg_A : float
+        The amplitude of the pulse.
+    sg_lambda : float
+        The duration of the pulse.
+    sg_omega : float
+        The angular frequency of the cosine function.
+    sg_phi: float
+        The phase of the cosine function.
+    rtol : float
+        The relative tolerance, between 0 and 1.
+
+    Returns
+    -------
+    tuple
+        The (earliest, latest) times of the window.
+
+    """
+    half_width = sg_lambda * np.sqrt(- np.log(rtol))
+    return res_begin - half_width, res_begin + half_width
+
+
+def sine_gaussian(times, res_begin, sg_A, sg_lambda, sg_omega, sg_phi,
+                  out = None, work = None):
     r"""
     The sine-gaussian residual function. This pulse is not amplitude-normalised.
 
@@ -249,6 +699,10 @@ def sine_gaussian(times, res_begin, sg_A, sg_lambda, sg_omega, sg_phi):
         The angular frequency of the cosine function.
     sg_phi: float
         The phase of the cosine function.
+    out : ndarray, optional
+        An array of the broadcast shape of the inputs to hold the result.
+    work : ndarray, optional
+        An array of the same shape to use as scratch space.
 
     Returns
     -------
@@ -256,9 +710,20 @@ def sine_gaussian(times, res_begin, sg_A, sg_lambda, sg_omega, sg_phi):
          Output array containing the residual.
 
     """
-    s = (np.exp(- np.square((times - res_begin) / sg_lambda)) *
-         np.cos(sg_omega * times + sg_phi))
-    return sg_A * s
+    args = times, res_begin, sg_A, sg_lambda, sg_omega, sg_phi
+    s    = _buffer(out,  *args)
+    work = _buffer(work, *args)
+    np.subtract(times, res_begin, out = s)
+    np.divide(s, sg_lambda, out = s)
+    np.square(s, out = s)
+    np.negative(s, out = s)
+    np.exp(s, out = s)
+    np.multiply(times, sg_omega, out = work)
+    np.add(work, sg_phi, out = work)
+    np.cos(work, out = work)
+    np.multiply(s, work, out = s)
+    np.multiply(s, sg_A, out = s)
+    return s
 
 
 def modified_bessel(times, bes_A, bes_Omega, bes_s, res_begin, bes_Delta):
@@ -278,28 +743,42 @@ def exp_decay(times, tau, start):
             np.exp( - (times - start) / (tau + MIN_FLOAT)))
     return dex
 
-def convolution_gaussian(times, start, scale, sigma, tau):
+def convolution_gaussian(times, start, scale, sigma, tau, out = None,
+                         work = None):
     r"""
-    Gaussian convolution function.
+    A Gaussian pulse convolved with a one-sided exponential decay of unit
+    area, an exponentially modified Gaussian. The amplitude is that of the
+    Gaussian, so the peak never exceeds it.
 
     .. math::
 
-        S(t|A,\Delta,\sigma,\tau) = A \int_{-\infty}^{\infty} \exp \left[
-        \frac{\left( z - \Delta \right)^2}{2\sigma^2}
-        \right] \exp \left[ \frac{t - z + \Delta }{\tau} \right] dz
+        S(t|A,\Delta,\sigma,\tau) = \frac{A}{\tau} \int_{-\infty}^{t}
+        \exp \left[ - \frac{\left( z - \Delta \right)^2}{2\sigma^2} \right]
+        \exp \left[ - \frac{t - z}{\tau} \right] dz
+        = A \frac{\sigma}{\tau} \sqrt{\frac{\pi}{2}}
+        \exp \left[ - \frac{\left( t - \Delta \right)^2}{2\sigma^2} \right]
+        \mathrm{erfcx} \left( \frac{1}{\sqrt{2}} \left(
+        \frac{\sigma}{\tau} - \frac{t - \Delta}{\sigma} \right) \right)
+
+    where the argument of erfcx is negative, the equivalent form with erfc
+    is used instead.
 
     Parameters
     ----------
     times : array_like
         The input time array.
     start : float
-        The start time of the pulse.
+        The centre of the Gaussian.
     scale : float
         The amplitude of the pulse.
     sigma : float
-        The duration of the pulse.
+        The width of the Gaussian.
     tau : float
         The characteristic expontential decay scale.
+    out : ndarray, optional
+        An array of the broadcast shape of the inputs to hold the result.
+    work : ndarray, optional
+        An array of the same shape to use as scratch space.
 
     Returns
     -------
@@ -307,12 +786,133 @@ def convolution_gaussian(times, start, scale, sigma, tau):
          Output array containing the convolution.
 
     """
-    s = np.mean(times)
-    conv  = convolve(gaussian_pulse(times, s, 1, sigma),
-                    exp_decay(times, tau, start), 'same')
-    return scale * conv
+    rate = _buffer(out,  times, start, scale, sigma, tau)
+    work = _buffer(work, times, start, scale, sigma, tau)
+    np.subtract(times, start, out = work)
+    # the argument of erfc(x)
+    np.divide(work, sigma, out = rate)
+    np.subtract(np.divide(sigma, tau), rate, out = rate)
+    np.multiply(rate, math.sqrt(0.5), out = rate)
+    rising  = rate >= 0.
+    falling = ~rising
+    special.erfcx(rate, out = rate, where = rising)
+    special.erfc( rate, out = rate, where = falling)
+    np.square(work, out = work, where = rising)
+    np.divide(work, - 2. * np.power(sigma, 2.), out = work, where = rising)
+    np.divide(work, np.negative(tau), out = work, where = falling)
+    np.add(work, np.power(sigma, 2.) / (2. * np.power(tau, 2.)), out = work,
+           where = falling)
+    np.exp(work, out = work)
+    np.multiply(rate, work, out = rate)
+    np.multiply(rate, scale * sigma / tau * math.sqrt(math.pi / 2.),
+                out = rate)
+    return rate
+
+
+def gaussian_integral(lower, upper, start, scale, sigma):
+    """
+    The integral of :func:`~gaussian_pulse` from lower to upper.
+
+    Parameters
+    ----------
+    lower : float
+        The lower limit of the integral.
+    upper : float
+        The upper limit of the integral.
+    start : float
+        The start time of the pulse.
+    scale : float
+        The amplitude of the pulse.
+    sigma : float
+        The width of the pulse.
+
+    Returns
+    -------
+    float
+        The integral of the pulse.
+
+    """
+    a = (lower - start) / (math.sqrt(2.) * sigma)
+    b = (upper - start) / (math.sqrt(2.) * sigma)
+    # differences of erfc are accurate in the tails
+    if a > 0:
+        diff = special.erfc(a) - special.erfc(b)
+    elif b < 0:
+        diff = special.erfc(- b) - special.erfc(- a)
+    else:
+        diff = special.erf(b) - special.erf(a)
+    return scale * sigma * math.sqrt(math.pi / 2.) * diff
+
+
+def FRED_integral(start, scale, tau, xi):
+    r"""
+    The integral of :func:`~FRED_pulse` over all time,
+
+    .. math::
+
+        \int_\Delta^\infty S(t) dt = 2 A \tau e^{2\xi} K_1(2\xi)
+
+    where K_1 is a modified Bessel function of the second kind. The
+    integral over a finite interval has no closed form.
+
+    Parameters
+    ----------
+    start : float
+        The start time of the pulse.
+    scale : float
+        The amplitude of the pulse.
+    tau : float
+        The duration of the pulse.
+    xi : float
+        The asymmetry of the pulse.
+
+    Returns
+    -------
+    float
+        The integral of the pulse.
+
+    """
+    return 2. * scale * tau * special.kve(1, 2. * xi)
 
 
+def convolution_gaussian_integral(lower, upper, start, scale, sigma, tau):
+    r"""
+    The integral of :func:`~convolution_gaussian` from lower to upper. The
+    pulse S is the Gaussian G convolved with the exponential decay, so
+    :math:`\tau S' = G - S`, and
+
+    .. math::
+
+        \int_a^b S(t) dt = \int_a^b G(t) dt - \tau \left[ S(b) - S(a) \right]
+
+    Parameters
+    ----------
+    lower : float
+        The lower limit of the integral.
+    upper : float
+        The upper limit of the integral.
+    start : float
+        The centre of the Gaussian.
+    scale : float
+        The amplitude of the pulse.
+    sigma : float
+        The width of the Gaussian.
+    tau : float
+        The characteristic expontential decay scale.
+
+    Returns
+    -------
+    float
+        The integral of the pulse.
+
+    """
+    edges = convolution_gaussian(np.array([lower, upper], dtype = float),
+                                 start, scale, sigma, tau)
+    integral = (gaussian_integral(lower, upper, start, scale, sigma)
+                - tau * (edges[1] - edges[0]))
+    # rounding can leave a negative integral far in the tails
+    return max(integral, 0.)
+
 
 if __name__ == '__main__':
     pass
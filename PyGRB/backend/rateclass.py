@@ -4,6 +4,8 @@ from scipy.special import gammaln
 from bilby import Likelihood as bilbyLikelihood
 
 from PyGRB.backend.makekeys import MakeKeys
+from PyGRB.backend.ratekernel import (RateKernel, IntegratedRateKernel,
+                                      batch_chunk_size)
 from PyGRB.backend.rate_functions import *
 
 
@@ -21,6 +23,27 @@ class PoissonRate(MakeKeys, bilbyLikelihood):
         The channels to be evaluated. Needed for the parameter keywords.
     lens : bool
         Should the rate be duplicated simulating a gravitational lensing event?
+    log_space : bool, optional
+        Should the likelihood be calculated from log-rates? Only used by
+        models made of gaussian, FRED, FREDx and convolution pulses, see
+        :meth:`~PyGRB.backend.ratekernel.RateKernel.log_rates`. This is for
+        numerical stability with steep pulses, not speed, as the pulses are
+        added in log-space and the rate is exponentiated again.
+    support_rtol : float, optional
+        If given, pulses are only evaluated over the bins in which they are
+        larger than support_rtol times their amplitude, see
+        :class:`~PyGRB.backend.ratekernel.RateKernel`.
+    bin_right : array_like, optional
+        The right edges of the bins starting at x. If given, the expected
+        counts of each bin are the integral of the rate over the bin rather
+        than the rate at x, see
+        :class:`~PyGRB.backend.ratekernel.IntegratedRateKernel`, which also
+        takes the keywords bin_width and n_nodes.
+
+    Notes
+    -----
+    The terms of the likelihood that depend only on the data are calculated
+    once on construction, so y should not be changed afterwards.
 
     """
     def __init__(self, x, y, channel, lens, **kwargs):
@@ -28,9 +51,76 @@ class PoissonRate(MakeKeys, bilbyLikelihood):
                                             **kwargs)
         self.x = x
         self.y = y
+        self._cache_data_terms()
+        # workspace for the rate and log-rate of a likelihood evaluation
+        self._rate     = np.empty(len(self._y_float))
+        self._log_rate = np.empty(len(self._y_nonzero))
         self.parameters = {k: None for k in self.keys} ## creates a dict
         self.rate_lists = [gaussian_pulse, FRED_pulse, FREDx_pulse,
                            convolution_gaussian, sine_gaussian, modified_bessel]
+        # compiled rate for the sampler, see ratekernel.py
+        if kwargs.get('bin_right') is None:
+            self.kernel = RateKernel(x, channel, lens, **kwargs)
+        else:
+            self.kernel = IntegratedRateKernel(x, channel, lens, **kwargs)
+        self.log_space = kwargs.get('log_space', False)
+
+    def _cache_data_terms(self):
+        """
+        Precomputes the parts of the Poisson likelihood which depend only on
+        the counts. The y * log(rate) term vanishes in bins with zero counts,
+        so the indices of the non-zero bins are kept when there are any
+        empty bins to skip.
+        """
+        self._y_float       = np.asarray(self.y, dtype = float)
+        self._log_factorial = np.sum(gammaln(self._y_float + 1))
+        nonzero = np.flatnonzero(self._y_float)
+        if len(nonzero) < len(self._y_float):
+            self._nonzero   = nonzero
+            self._y_nonzero = self._y_float[nonzero]
+        else:
+            self._nonzero   = None
+            self._y_nonzero = self._y_float
+
+    def _log_likelihood_from_rate(self, rate):
+        """ The Poisson log-likelihood of the counts given a valid rate. """
+        log_rate = self._log_rate
+        if self._nonzero is None:
+            np.log(rate, out = log_rate)
+        else:
+            # mode = 'clip' as out is always buffered with mode = 'raise'
+            np.take(rate, self._nonzero, out = log_rate, mode = 'clip')
+            np.log(log_rate, out = log_rate)
+        return (np.dot(self._y_nonzero, log_rate) - np.sum(rate)
+                - self._log_factorial)
+
+    def _log_likelihood_from_log_rate(self, log_rate):
+        """ The Poisson log-likelihood of the counts given the log-rate. """
+        if self._nonzero is not None:
+            np.take(log_rate, self._nonzero, out = self._log_rate,
+                    mode = 'clip')
+            y_log_rate = np.dot(self._y_nonzero, self._log_rate)
+        else:
+            y_log_rate = np.dot(self._y_nonzero, log_rate)
+        rate = np.exp(log_rate, out = self._rate)
+        return y_log_rate - np.sum(rate) - self._log_factorial
+
+    def _batch_log_likelihood_from_rates(self, rates):
+        """
+        The Poisson log-likelihood of the counts for each row of rates. Rows
+        which are not strictly positive have zero likelihood.
+        """
+        valid = rates.min(axis = 1) > 0.
+        if not valid.all():
+            rates = rates[valid]
+        if self._nonzero is None:
+            log_rates = np.log(rates)
+        else:
+            log_rates = np.log(rates[:, self._nonzero])
+        log_l = np.full(len(valid), -np.inf)
+        log_l[valid] = (log_rates @ self._y_nonzero - np.sum(rates, axis = 1)
+                        - self._log_factorial)
+        return log_l
 
     @staticmethod
     def calculate_rate(x, parameters, pulse_arr, key_list, rate_function, k):
@@ -103,29 +193,258 @@ class PoissonRate(MakeKeys, bilbyLikelihood):
 
 
     def log_likelihood(self):
-        if self.lens:
-            rate = self._sum_rates(self.x, self.parameters, self.calculate_rate_lens)
-        else:
-            rate = self._sum_rates(self.x, self.parameters, self.calculate_rate)
+        if self.log_space and self.kernel.has_log_rates:
+            log_rate = self.kernel.log_rates(self.kernel.pack(self.parameters))
+            return self._log_likelihood_from_log_rate(log_rate)
+        rate = self.kernel.rates(self.kernel.pack(self.parameters),
+                                 out = self._rate)
 
         if not isinstance(rate, np.ndarray):
             raise ValueError(
                 "Poisson rate function returns wrong value type! "
                 "Is {} when it should be numpy.ndarray".format(type(rate)))
-        elif np.any(rate < 0.):
+        rate_min = rate.min()
+        if rate_min < 0.:
             raise ValueError(("Poisson rate function returns a negative",
                               " value!"))
-        elif np.any(rate == 0.):
+        elif rate_min == 0.:
             return -np.inf
         else:
-            return np.sum(-rate + self.y * np.log(rate) - gammaln(self.y + 1))
+            return self._log_likelihood_from_rate(rate)
+
+    def log_likelihood_batch(self, parameter_array, chunk_size = None):
+        """
+        Evaluates the log-likelihood at many points of parameter space at once.
+
+        Parameters
+        ----------
+        parameter_array : array_like
+            The (N, n_params) array of parameter points. The columns are
+            ordered as :attr:`keys`.
+        chunk_size : int, optional
+            The number of points to evaluate in each NumPy pass. By default
+            this is chosen to bound the memory of the intermediate
+            (chunk_size, len(x)) rate array.
+
+        Returns
+        -------
+        array
+            The N log-likelihoods.
+
+        """
+        theta = np.atleast_2d(np.asarray(parameter_array, dtype = float))
+        if theta.shape[1] != len(self.keys):
+            raise ValueError(
+                'Input variable `parameter_array` should have {} columns. '
+                'Has {} columns.'.format(len(self.keys), theta.shape[1]))
+        chunk_size = batch_chunk_size(
+                len(self.x) * self.kernel.points_per_bin, chunk_size)
+        log_l = np.empty(len(theta))
+        for i in range(0, len(theta), chunk_size):
+            rates = self.kernel.batch_rates(theta[i:i + chunk_size])
+            log_l[i:i + chunk_size] = self._batch_log_likelihood_from_rates(rates)
+        return log_l
 
     def return_line_from_sample(self, sample_dict):
-        if self.lens:
-            rate = self._sum_rates(self.x, sample_dict, self.calculate_rate_lens)
+        return self.kernel(sample_dict)
+
+
+class MultiChannelPoissonRate(bilbyLikelihood):
+    """
+    The joint Poisson likelihood of the counts of several channels of the
+    same bins, for a model fit to every channel at once.
+
+    The channels of a model differ only in their parameter keys, so a single
+    compiled kernel evaluates the rates of all of them as one
+    (n_channels, n_bins) batch, see
+    :meth:`~PyGRB.backend.ratekernel.RateKernel.batch_rates`. Parameters
+    shared by the channels, such as the time_delay of a lens, are read once.
+    This replaces a bilby JointLikelihood of one :class:`~PoissonRate` per
+    channel, which it equals.
+
+    Parameters
+    ----------
+    x : array_like
+        The array of times to be evaluated at.
+    y : array of int
+        The (len(x), len(channels)) array of counts at each time step.
+    channels : list of int
+        The channels to be evaluated, in the order of the columns of y.
+    lens : bool
+        Should the rate be duplicated simulating a gravitational lensing event?
+    **kwargs
+        The pulse counts of the model and the keywords of
+        :class:`~PoissonRate`, log_space, support_rtol, bin_right, bin_width
+        and n_nodes.
+
+    Notes
+    -----
+    The counts are held as one contiguous (n_channels, n_bins) array, the
+    layout of the rates, so y should not be changed afterwards.
+
+    """
+    def __init__(self, x, y, channels, lens, **kwargs):
+        super(MultiChannelPoissonRate, self).__init__(parameters = dict())
+        self.x = x
+        self.y = np.asarray(y)
+        self.channels = list(channels)
+        if self.y.shape != (len(x), len(self.channels)):
+            raise ValueError(
+                'Input variable `y` should have shape (len(x), len(channels)). '
+                'Is {} when it should be {}.'.format(
+                    self.y.shape, (len(x), len(self.channels))))
+        channel_keys = [MakeKeys(lens = lens, channel = c, **kwargs).keys
+                        for c in self.channels]
+        # the keys of every channel, with the shared keys once
+        self.keys  = list(dict.fromkeys(k for keys in channel_keys
+                                          for k in keys))
+        self.index = {key : i for i, key in enumerate(self.keys)}
+        # the positions in the parameter vector of each channel's parameters,
+        # ordered as the keys of the kernel
+        self._channel_index = np.array([[self.index[k] for k in keys]
+                                        for keys in channel_keys], dtype = int)
+        self.parameters = {k: None for k in self.keys} ## creates a dict
+        if kwargs.get('bin_right') is None:
+            self.kernel = RateKernel(x, self.channels[0], lens, **kwargs)
+        else:
+            self.kernel = IntegratedRateKernel(x, self.channels[0], lens,
+                                               **kwargs)
+        self.log_space = kwargs.get('log_space', False)
+        self._y_float = np.ascontiguousarray(self.y.T, dtype = float)
+        self._log_factorial = np.sum(gammaln(self._y_float + 1))
+
+    def pack(self, parameters):
+        """
+        Returns the parameter dictionary as an (n_channels, n_params) array,
+        each row the parameter vector of the kernel for one channel.
+        """
+        theta = np.array([parameters[key] for key in self.keys], dtype = float)
+        return theta[self._channel_index]
+
+    def log_likelihood(self):
+        theta = self.pack(self.parameters)
+        if self.log_space and self.kernel.has_log_rates:
+            log_rates = np.array([self.kernel.log_rates(t) for t in theta])
+            return (np.vdot(self._y_float, log_rates)
+                    - np.sum(np.exp(log_rates)) - self._log_factorial)
+        rates = self.kernel.batch_rates(theta)
+        if rates.min() <= 0.:
+            return -np.inf
+        return (np.vdot(self._y_float, np.log(rates)) - np.sum(rates)
+                - self._log_factorial)
+
+    def log_likelihood_batch(self, parameter_array, chunk_size = None):
+        """
+        Evaluates the log-likelihood at many points of parameter space at
+        once, see :meth:`PoissonRate.log_likelihood_batch`.
+
+        Parameters
+        ----------
+        parameter_array : array_like
+            The (N, n_params) array of parameter points. The columns are
+            ordered as :attr:`keys`.
+        chunk_size : int, optional
+            The number of points to evaluate in each NumPy pass.
+
+        Returns
+        -------
+        array
+            The N log-likelihoods.
+
+        """
+        theta = np.atleast_2d(np.asarray(parameter_array, dtype = float))
+        if theta.shape[1] != len(self.keys):
+            raise ValueError(
+                'Input variable `parameter_array` should have {} columns. '
+                'Has {} columns.'.format(len(self.keys), theta.shape[1]))
+        n_channels, n_params = self._channel_index.shape
+        chunk_size = batch_chunk_size(
+                len(self.x) * n_channels * self.kernel.points_per_bin,
+                chunk_size)
+        log_l = np.full(len(theta), -np.inf)
+        for i in range(0, len(theta), chunk_size):
+            chunk = theta[i:i + chunk_size, self._channel_index]
+            rates = self.kernel.batch_rates(chunk.reshape(-1, n_params))
+            rates = rates.reshape(len(chunk), n_channels, -1)
+            valid = rates.min(axis = (1, 2)) > 0.
+            rates = rates[valid]
+            log_l[i:i + chunk_size][valid] = (
+                    np.einsum('ijk,jk->i', np.log(rates), self._y_float)
+                    - np.sum(rates, axis = (1, 2)) - self._log_factorial)
+        return log_l
+
+
+class UnbinnedPoissonRate(MakeKeys, bilbyLikelihood):
+    r"""
+    The likelihood of the arrival times of individual photons, such as
+    those of BATSE TTE lists, as an inhomogeneous Poisson process,
+
+    .. math::
+
+        \log \mathcal{L} = \sum_i \log \lambda(t_i)
+        - \int_{T_0}^{T_1} \lambda(t) dt
+
+    The cost scales with the number of photons rather than with the number
+    of fine bins needed to resolve them. The integral is analytic for most
+    pulse types, see :meth:`~PyGRB.backend.ratekernel.RateKernel.integral`.
+
+    Parameters
+    ----------
+    x : array_like
+        The sorted arrival times of the photons.
+    channel : list of int
+        The channels to be evaluated. Needed for the parameter keywords.
+    lens : bool
+        Should the rate be duplicated simulating a gravitational lensing event?
+    lower : float, optional
+        The start of the observation. Defaults to the first arrival time.
+    upper : float, optional
+        The end of the observation. Defaults to the last arrival time.
+    bin_width : float, optional
+        The time in which the rate is measured, so the pulse amplitudes and
+        background are counts per bin_width, as for a :class:`~PoissonRate`
+        with bins of that width. Defaults to 1, counts per unit time.
+    log_space : bool, optional
+        Should the likelihood be calculated from log-rates? See
+        :class:`~PoissonRate`.
+    support_rtol : float, optional
+        See :class:`~PyGRB.backend.ratekernel.RateKernel`.
+
+    """
+    def __init__(self, x, channel, lens, lower = None, upper = None,
+                 bin_width = 1., **kwargs):
+        super(UnbinnedPoissonRate, self).__init__(  lens = lens,
+                                                    channel = channel,
+                                                    **kwargs)
+        self.x = np.asarray(x, dtype = float)
+        if np.any(np.diff(self.x) < 0):
+            raise ValueError(
+                'Input variable `x` should be sorted.')
+        self.lower = self.x[0]  if lower is None else lower
+        self.upper = self.x[-1] if upper is None else upper
+        self.bin_width = bin_width
+        # the log-likelihood of the counts per bin_width rather than per
+        # unit time differs by this constant
+        self._log_bin_width = len(self.x) * np.log(bin_width)
+        self._rate = np.empty(len(self.x))
+        self.parameters = {k: None for k in self.keys} ## creates a dict
+        self.kernel = RateKernel(self.x, channel, lens, **kwargs)
+        self.log_space = kwargs.get('log_space', False)
+
+    def log_likelihood(self):
+        theta = self.kernel.pack(self.parameters)
+        if self.log_space and self.kernel.has_log_rates:
+            log_rates = np.sum(self.kernel.log_rates(theta))
         else:
-            rate = self._sum_rates(self.x, sample_dict, self.calculate_rate)
-        return rate
+            rate = self.kernel.rates(theta, out = self._rate)
+            if rate.min() <= 0.:
+                return -np.inf
+            log_rates = np.sum(np.log(rate))
+        integral = self.kernel.integral(theta, self.lower, self.upper)
+        return log_rates - self._log_bin_width - integral / self.bin_width
+
+    def return_line_from_sample(self, sample_dict):
+        return self.kernel(sample_dict)
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,846 @@
+import inspect
+import numpy as np
+from scipy.special import logsumexp
+
+from PyGRB.backend.makekeys import MakeKeys
+from PyGRB.backend.rate_functions import *
+
+# bound on the number of elements of a (samples, bins) array made per chunk
+MAX_BATCH_ELEMENTS = 2 ** 22
+
+# pulses are integrated over the window in which they exceed this tolerance
+INTEGRAL_RTOL = 1e-12
+
+# bins starting within this many bin widths after the start of a FRED or
+# FREDx pulse, or all the bins of a narrower pulse, are integrated over
+# ONSET_PANELS panels which grow geometrically from the start, as the pulse
+# may be sharper than the nodes
+ONSET_WIDTHS = 16
+ONSET_PANELS = 16
+
+
+def batch_chunk_size(n_bins, chunk_size = None):
+    """
+    Returns the number of parameter points to evaluate at once so that a
+    (chunk_size, n_bins) array holds at most MAX_BATCH_ELEMENTS elements.
+    """
+    if chunk_size is None:
+        chunk_size = MAX_BATCH_ELEMENTS // max(n_bins, 1)
+    return max(int(chunk_size), 1)
+
+
+def _logaddexp_into(a, b, work):
+    """
+    Adds b to a in log-space, as np.logaddexp(a, b, out = a) but as a few
+    vectorised passes, using the array work as scratch space.
+    """
+    with np.errstate(invalid = 'ignore'):
+        np.subtract(a, b, out = work)
+        np.abs(work, out = work)
+        np.negative(work, out = work)
+        np.exp(work, out = work)
+        np.log1p(work, out = work)
+        np.maximum(a, b, out = a)
+        # work is nan where a and b are both -inf, and a stays -inf
+        np.add(a, work, out = a, where = work == work)
+    return a
+
+
+def histogram_quantiles(hist, lower, width, q):
+    """
+    Interpolates quantiles from histograms on regular grids.
+
+    Parameters
+    ----------
+    hist : array_like
+        The (n, n_grid) array of counts, one histogram per row.
+    lower : array_like
+        The lower edge of each row's grid.
+    width : array_like
+        The cell width of each row's grid.
+    q : array_like
+        The quantiles to calculate, between 0 and 1.
+
+    Returns
+    -------
+    array
+        The (len(q), n) array of quantiles, accurate to about a cell width.
+
+    """
+    n, n_grid = hist.shape
+    rows  = np.arange(n)
+    cdf   = np.cumsum(hist, axis = 1)
+    quantiles = np.empty((len(q), n))
+    for j, q_j in enumerate(q):
+        target = q_j * cdf[:, -1]
+        cell   = np.minimum(np.sum(cdf < target[:, None], axis = 1), n_grid - 1)
+        below  = np.where(cell > 0, cdf[rows, cell - 1], 0)
+        frac   = (target - below) / np.maximum(hist[rows, cell], 1)
+        quantiles[j] = lower + (cell + frac) * width
+    return quantiles
+
+
+def compile_model(x, channel, model, bin_right = None, **kwargs):
+    """
+    Compiles a model dictionary into a :class:`~RateKernel`.
+
+    Parameters
+    ----------
+    x : array_like
+        The array of times to be evaluated at.
+    channel : int
+        The channel to be evaluated. Needed for the parameter keywords.
+    model : dict
+        A model dictionary, as made by
+        :func:`~PyGRB.backend.makemodels.create_model_from_key`.
+    bin_right : array_like, optional
+        The right edges of the bins starting at x. If given, the kernel is an
+        :class:`~IntegratedRateKernel` of the expected counts of each bin.
+    **kwargs
+        Further keyword arguments of the kernel.
+
+    Returns
+    -------
+    RateKernel
+        The compiled rate kernel of the model.
+
+    """
+    if bin_right is not None:
+        return IntegratedRateKernel(x, channel, bin_right = bin_right,
+                                    **kwargs, **model)
+    return RateKernel(x, channel, **kwargs, **model)
+
+
+class RateKernel(MakeKeys):
+    """
+    A rate function specialised to a single model and channel.
+
+    The parameter keys of the model are resolved once, on construction, into
+    integer index arrays into a flat parameter vector ordered as
+    :attr:`keys`. Only the pulse types present in the model are kept, so
+    evaluating the rate does no string formatting or dictionary dispatch.
+
+    Parameters
+    ----------
+    x : array_like
+        The array of times to be evaluated at.
+    channel : int
+        The channel to be evaluated. Needed for the parameter keywords.
+    lens : bool
+        Should the rate be duplicated simulating a gravitational lensing event?
+    support_rtol : float, optional
+        If given, the gaussian, FRED, FREDx, convolution and sine-gaussian
+        pulses are only evaluated over the slice of (sorted) x in which they
+        are larger than support_rtol times their amplitude. By default every
+        pulse is evaluated over all of x.
+
+    """
+
+    def __init__(self, x, channel, lens, **kwargs):
+        super(RateKernel, self).__init__(lens = lens, channel = channel,
+                                         **kwargs)
+        self.x = np.asarray(x, dtype = float)
+        self.rate_lists = [gaussian_pulse, FRED_pulse, FREDx_pulse,
+                           convolution_gaussian, sine_gaussian, modified_bessel]
+        # rate functions which do not broadcast over a batch of parameters
+        self.unbatched  = []
+        # rate functions which can take negative values
+        self.residuals  = [sine_gaussian, modified_bessel]
+        # log-space forms of the rate functions which are always positive
+        self.log_rate_lists = { gaussian_pulse  : log_gaussian_pulse,
+                                FRED_pulse      : log_FRED_pulse,
+                                FREDx_pulse     : log_FREDx_pulse,
+                        convolution_gaussian    : log_convolution_gaussian}
+        self.index = {key : i for i, key in enumerate(self.keys)}
+        self.bg_index = self.index[f'background_{self.c}']
+        if self.lens:
+            self.td_index = self.index['time_delay']
+            self.mr_index = self.index['magnification_ratio']
+        # analytic support windows of the rate functions, see _window
+        self.window_lists = {   gaussian_pulse  : gaussian_window,
+                                FRED_pulse      : FRED_window,
+                                FREDx_pulse     : FREDx_window,
+                        convolution_gaussian    : convolution_gaussian_window,
+                                sine_gaussian   : sine_gaussian_window}
+        # analytic integrals of the rate functions, see integral
+        self.integral_lists = { gaussian_pulse  : gaussian_integral,
+                        convolution_gaussian    : convolution_gaussian_integral}
+        self.total_integral_lists = {FRED_pulse : FRED_integral}
+        # rate functions which are zero before their start
+        self.onset_pulses = [FRED_pulse, FREDx_pulse]
+        self.support_rtol = kwargs.get('support_rtol')
+        if self.support_rtol is not None and np.any(np.diff(self.x) < 0):
+            raise ValueError(
+                'Input variable `x` should be sorted when `support_rtol` '
+                'is given.')
+        self.pulses = self._compile_pulses()
+        # the number of times the rate is evaluated in each bin, by which
+        # the bins of a batch are counted against MAX_BATCH_ELEMENTS
+        self.points_per_bin = 1
+        # scratch arrays for the rate functions which can write into them
+        self._pulse = np.empty(len(self.x))
+        self._work  = np.empty(len(self.x))
+        self.has_log_rates = all(rate in self.log_rate_lists
+                                 for rate, idx, shift in self.pulses)
+        rates = [rate for rate, idx, shift in self.pulses]
+        if self.has_log_rates:
+            rates += [self.log_rate_lists[rate] for rate in rates]
+        self._buffers = {rate : [a for a in ['out', 'work']
+                                 if a in inspect.signature(rate).parameters]
+                         for rate in rates}
+
+    def _compile_pulses(self):
+        """
+        Makes a list of (rate_function, index_array, shift) for each pulse
+        type in the model. Each row of index_array holds the positions in the
+        parameter vector of one pulse's arguments, ordered as in the rate
+        function's signature. shift gives the columns of index_array that are
+        translated by the time delay of a lensed pulse.
+        """
+        pulses = []
+        for count_list, p_list, rate in zip(
+        self.rate_counts, self.param_lists, self.rate_lists):
+            if len(count_list) == 0:
+                continue
+            args  = [a for a in inspect.signature(rate).parameters
+                       if a in p_list]
+            idx   = np.array([[self.index[f'{a}_{j}_{self.c}'] for a in args]
+                               for j in count_list], dtype = int)
+            shift = [i for i, a in enumerate(args)
+                       if a in ['start', 'res_begin']]
+            pulses.append((rate, idx, shift))
+        return pulses
+
+    def _window(self, rate, x, args):
+        """
+        Returns the slice of x over which a pulse is evaluated, given its
+        arguments (or a batch of arguments as columns of args.T), found by
+        a binary search of its support window.
+        """
+        window = self.window_lists.get(rate)
+        if self.support_rtol is None or window is None:
+            return slice(None)
+        lo, hi = window(*np.transpose(args), rtol = self.support_rtol)
+        i, j   = np.searchsorted(x, [np.min(lo), np.max(hi)])
+        return slice(i, j)
+
+    def _workspace(self, n):
+        """ Returns the scratch arrays for n times. """
+        if n == len(self._pulse):
+            return self._pulse, self._work
+        return np.empty(n), np.empty(n)
+
+    def _call(self, rate, x, args, out, work):
+        """
+        Evaluates a rate function, into out (using work as scratch space) if
+        it accepts them.
+        """
+        buffers = self._buffers[rate]
+        if len(buffers) == 0:
+            return rate(x, *args)
+        return rate(x, *args, **dict(zip(buffers, [out, work])))
+
+    def pack(self, parameters):
+        """ Returns the parameter dictionary as a vector ordered as keys. """
+        return np.array([parameters[key] for key in self.keys], dtype = float)
+
+    def pack_batch(self, parameters):
+        """
+        Returns a dictionary of parameter arrays (or a pandas DataFrame of
+        posterior samples) as an (N, n_params) array with columns ordered as
+        keys.
+        """
+        return np.column_stack([np.asarray(parameters[key], dtype = float)
+                                for key in self.keys])
+
+    def rates(self, theta, x = None, out = None):
+        """
+        Calculates the rate given a parameter vector.
+
+        Parameters
+        ----------
+        theta : array_like
+            The parameter vector, ordered as :attr:`keys`.
+        x : array_like, optional
+            The array of times to be evaluated at. Defaults to :attr:`x`.
+        out : ndarray, optional
+            An array of len(x) to hold the result. Together with the scratch
+            arrays of the kernel this means that evaluating the rate
+            allocates no arrays the size of x for the gaussian, FRED, FREDx
+            and sine-gaussian pulses.
+
+        Returns
+        -------
+        array
+            The rate calculated for each x. If the rate is negative anywhere
+            the whole array is returned as zeros.
+
+        """
+        if x is None:
+            x = self.x
+        if out is None:
+            out = np.empty(len(x))
+        rates = out
+        rates[:] = theta[self.bg_index]
+        pulse, work = self._workspace(len(x))
+        for rate, idx, shift in self.pulses:
+            for row in idx:
+                args   = theta[row]
+                window = self._window(rate, x, args)
+                rates[window] += self._call(rate, x[window], args,
+                                            pulse[window], work[window])
+                if self.lens:
+                    args[shift] += theta[self.td_index]
+                    window = self._window(rate, x, args)
+                    lensed = self._call(rate, x[window], args,
+                                        pulse[window], work[window])
+                    np.multiply(lensed, theta[self.mr_index], out = lensed)
+                    rates[window] += lensed
+        if rates.min() < 0.:
+            rates[:] = 0.
+        return rates
+
+    def log_rates(self, theta, x = None):
+        """
+        Calculates the natural logarithm of the rate given a parameter vector.
+
+        When every pulse of the model has a log-space form (see
+        :attr:`has_log_rates`) the pulses are evaluated as log-rates and
+        combined with the background by a running log-sum-exp, so no pulse
+        overflows and the pre-onset bins of each pulse are not exponentiated.
+        Otherwise this is the log of :meth:`rates`. Adding in log-space
+        takes several passes over the bins per pulse, so this is slower
+        than :meth:`rates`.
+
+        Parameters
+        ----------
+        theta : array_like
+            The parameter vector, ordered as :attr:`keys`.
+        x : array_like, optional
+            The array of times to be evaluated at. Defaults to :attr:`x`.
+
+        Returns
+        -------
+        array
+            The log-rate calculated for each x.
+
+        """
+        if x is None:
+            x = self.x
+        if not self.has_log_rates:
+            with np.errstate(divide = 'ignore'):
+                return np.log(self.rates(theta, x))
+        log_rates = np.full(len(x), np.log(theta[self.bg_index]))
+        pulse, work = self._workspace(len(x))
+        for rate, idx, shift in self.pulses:
+            log_rate = self.log_rate_lists[rate]
+            for row in idx:
+                args   = theta[row]
+                window = self._window(rate, x, args)
+                _logaddexp_into(log_rates[window],
+                               self._call(log_rate, x[window], args,
+                                          pulse[window], work[window]),
+                               work[window])
+                if self.lens:
+                    args[shift] += theta[self.td_index]
+                    window = self._window(rate, x, args)
+                    lensed = self._call(log_rate, x[window], args,
+                                        pulse[window], work[window])
+                    np.add(lensed, np.log(theta[self.mr_index]), out = lensed)
+                    _logaddexp_into(log_rates[window], lensed, work[window])
+        return log_rates
+
+    def batch_rates(self, theta, x = None):
+        """
+        Calculates the rate for each of a batch of parameter vectors.
+
+        Parameters
+        ----------
+        theta : array_like
+            The (N, n_params) array of parameter vectors, with columns ordered
+            as :attr:`keys`.
+        x : array_like, optional
+            The array of times to be evaluated at. Defaults to :attr:`x`.
+
+        Returns
+        -------
+        array
+            The (N, len(x)) array of rates. Rows which are negative anywhere
+            are returned as zeros.
+
+        """
+        rates = self._summed_rates(theta, x)
+        rates[rates.min(axis = 1) < 0.] = 0.
+        return rates
+
+    def _summed_rates(self, theta, x = None):
+        """
+        Sums the pulses of each of a batch of parameter vectors, keeping
+        negative rates, see :meth:`batch_rates`.
+        """
+        if x is None:
+            x = self.x
+        theta = np.atleast_2d(theta)
+        rates = np.empty((len(theta), len(x)))
+        rates[:] = theta[:, self.bg_index, None]
+        for rate, idx, shift in self.pulses:
+            for row in idx:
+                args   = theta[:, row]
+                # the union of the windows of the batch
+                window = self._window(rate, x, args)
+                rates[:, window] += self._batch_call(rate, x[window], args)
+                if self.lens:
+                    args[:, shift] += theta[:, self.td_index, None]
+                    window = self._window(rate, x, args)
+                    rates[:, window] += (self._batch_call(rate, x[window], args)
+                                         * theta[:, self.mr_index, None])
+        return rates
+
+    def _batch_call(self, rate, x, args):
+        """ Evaluates a rate function over the rows of args. """
+        if rate in self.unbatched:
+            return np.array([rate(x, *a) for a in args])
+        # each argument as an (N, 1) column broadcasts against x
+        return rate(x, *args.T[:, :, None])
+
+    def _negative_rows(self, theta, chunk_size = None):
+        """
+        Returns a mask of the parameter vectors whose rate is negative
+        somewhere, or None if the model cannot produce a negative rate.
+        """
+        if not any(rate in self.residuals for rate, idx, shift in self.pulses):
+            return None
+        chunk_size = batch_chunk_size(len(self.x) * self.points_per_bin,
+                                      chunk_size)
+        negative   = np.zeros(len(theta), dtype = bool)
+        for i in range(0, len(theta), chunk_size):
+            rates = self._summed_rates(theta[i:i + chunk_size])
+            negative[i:i + chunk_size] = rates.min(axis = 1) < 0.
+        return negative
+
+    def rate_quantiles(self, theta, q, chunk_size = None, method = None,
+                             n_grid = 512):
+        """
+        Calculates quantiles of the rate over a batch of parameter vectors,
+        such as the samples of a posterior chain.
+
+        The 'exact' method evaluates the rates of every parameter vector at
+        once over consecutive slices of x, so that about MAX_BATCH_ELEMENTS
+        rates are held in memory at a time, as long as there are fewer
+        parameter vectors than that. The 'sketch' method streams over chunks
+        of parameter vectors, histogramming the rate of each bin on a grid of
+        n_grid cells between its minimum and maximum. Its memory does not
+        depend on the number of parameter vectors, and the quantiles are
+        accurate to about (maximum - minimum) / n_grid.
+
+        Parameters
+        ----------
+        theta : array_like
+            The (N, n_params) array of parameter vectors, with columns ordered
+            as :attr:`keys`.
+        q : array_like
+            The quantiles to calculate, between 0 and 1.
+        chunk_size : int, optional
+            The number of bins to evaluate in each slice for the 'exact'
+            method, or the number of parameter vectors in each chunk for the
+            'sketch' method.
+        method : str, optional
+            Either 'exact' or 'sketch'. Defaults to 'exact' unless there are
+            more than MAX_BATCH_ELEMENTS parameter vectors.
+        n_grid : int, optional
+            The number of histogram cells of the 'sketch' method.
+
+        Returns
+        -------
+        array
+            The (len(q), len(x)) array of rate quantiles.
+
+        """
+        theta = np.atleast_2d(theta)
+        q     = np.atleast_1d(q)
+        if method is None:
+            method = 'exact' if len(theta) <= MAX_BATCH_ELEMENTS else 'sketch'
+        # a rate which is negative anywhere is zero everywhere
+        negative = self._negative_rows(theta)
+        if method == 'exact':
+            return self._exact_quantiles(theta, q, negative, chunk_size)
+        elif method == 'sketch':
+            return self._sketch_quantiles(theta, q, negative, chunk_size,
+                                          n_grid)
+        else:
+            raise ValueError(
+                'Input variable `method` is {} when it '
+                'should be `exact` or `sketch`.'.format(method))
+
+    def integral(self, theta, lower, upper, n_panels = 256, n_nodes = 8):
+        """
+        Integrates the rate from lower to upper given a parameter vector.
+
+        The background and the gaussian and convolution pulses are
+        integrated analytically, as are FRED pulses whose support window
+        lies inside the interval. Other pulses are integrated by composite
+        Gauss-Legendre quadrature over the part of their support window (or
+        of the interval, for pulses without one) inside the interval. The
+        panels of FRED and FREDx pulses grow geometrically from their start.
+
+        Parameters
+        ----------
+        theta : array_like
+            The parameter vector, ordered as :attr:`keys`.
+        lower : float
+            The lower limit of the integral.
+        upper : float
+            The upper limit of the integral.
+        n_panels : int, optional
+            The number of panels of the quadrature.
+        n_nodes : int, optional
+            The number of Gauss-Legendre nodes in each panel.
+
+        Returns
+        -------
+        float
+            The integral of the rate.
+
+        """
+        integral = theta[self.bg_index] * (upper - lower)
+        for rate, idx, shift in self.pulses:
+            for row in idx:
+                args = theta[row]
+                integral += self._pulse_integral(rate, args, lower, upper,
+                                                 n_panels, n_nodes)
+                if self.lens:
+                    args[shift] += theta[self.td_index]
+                    integral += theta[self.mr_index] * self._pulse_integral(
+                            rate, args, lower, upper, n_panels, n_nodes)
+        return integral
+
+    def _pulse_integral(self, rate, args, lower, upper, n_panels, n_nodes):
+        """ Integrates a single pulse from lower to upper. """
+        if rate in self.integral_lists:
+            return self.integral_lists[rate](lower, upper, *args)
+        window = self.window_lists.get(rate)
+        if window is not None:
+            lo, hi = window(*args, rtol = INTEGRAL_RTOL)
+            if (rate in self.total_integral_lists
+                    and lower <= lo and hi <= upper):
+                return self.total_integral_lists[rate](*args)
+            lower, upper = max(lower, lo), min(upper, hi)
+        if upper <= lower:
+            return 0.
+        if rate in self.onset_pulses:
+            # panels grow geometrically from the start, so they resolve both
+            # a sharp rise and a long decay
+            start = args[0]
+            after = upper - start
+            edges = start + np.geomspace(max(lower - start, after * 1e-9),
+                                         after, n_panels + 1)
+        else:
+            edges = np.linspace(lower, upper, n_panels + 1)
+        points, weights = np.polynomial.legendre.leggauss(n_nodes)
+        half  = np.diff(edges) / 2.
+        nodes = (edges[:-1] + half)[:, None] + half[:, None] * points
+        rates = rate(nodes.ravel(), *args).reshape(nodes.shape)
+        return np.dot(rates @ weights, half)
+
+    def _bin_rates(self, theta, bins):
+        """ The batch rates of the slice bins of x. """
+        return self.batch_rates(theta, self.x[bins])
+
+    def _masked_batch_rates(self, theta, bins, negative):
+        rates = self._bin_rates(theta, bins)
+        if negative is not None:
+            rates[negative] = 0.
+        return rates
+
+    def _exact_quantiles(self, theta, q, negative, chunk_size):
+        chunk_size = batch_chunk_size(len(theta) * self.points_per_bin,
+                                      chunk_size)
+        quantiles  = np.empty((len(q), len(self.x)))
+        for i in range(0, len(self.x), chunk_size):
+            rates = self._masked_batch_rates(
+                            theta, slice(i, i + chunk_size), negative)
+            quantiles[:, i:i + chunk_size] = np.quantile(rates, q, axis = 0)
+        return quantiles
+
+    def _sketch_quantiles(self, theta, q, negative, chunk_size, n_grid):
+        if negative is None:
+            negative = np.zeros(len(theta), dtype = bool)
+        quantiles = np.empty((len(q), len(self.x)))
+        # slices of bins whose histograms together have MAX_BATCH_ELEMENTS
+        bin_chunk = batch_chunk_size(n_grid)
+        for a in range(0, len(self.x), bin_chunk):
+            bins = slice(a, a + bin_chunk)
+            x = self.x[bins]
+            n = batch_chunk_size(len(x) * self.points_per_bin, chunk_size)
+            # first pass finds the range of each bin
+            lower = np.full(len(x),  np.inf)
+            upper = np.full(len(x), -np.inf)
+            for i in range(0, len(theta), n):
+                rates = self._masked_batch_rates(
+                                theta[i:i + n], bins, negative[i:i + n])
+                lower = np.minimum(lower, rates.min(axis = 0))
+                upper = np.maximum(upper, rates.max(axis = 0))
+            width = (upper - lower) / n_grid
+            scale = np.where(width > 0, width, 1.)
+            # second pass histograms each bin on its own grid
+            offset = np.arange(len(x)) * n_grid
+            hist   = np.zeros(len(x) * n_grid, dtype = np.int64)
+            for i in range(0, len(theta), n):
+                rates = self._masked_batch_rates(
+                                theta[i:i + n], bins, negative[i:i + n])
+                cells = ((rates - lower) / scale).astype(np.int64)
+                np.clip(cells, 0, n_grid - 1, out = cells)
+                hist += np.bincount((cells + offset).ravel(),
+                                    minlength = len(hist))
+            quantiles[:, a:a + bin_chunk] = histogram_quantiles(
+                    hist.reshape(len(x), n_grid), lower, width, q)
+        return quantiles
+
+    def __call__(self, parameters):
+        return self.rates(self.pack(parameters))
+
+
+class IntegratedRateKernel(RateKernel):
+    """
+    A :class:`~RateKernel` which gives the expected counts of each bin
+    [x, bin_right] instead of the rate at its left edge.
+
+    The rate is integrated over each bin by Gauss-Legendre quadrature, in
+    units of bin_width. The pulse amplitudes and background are then counts
+    per bin_width, as those of a :class:`~RateKernel` are counts per bin, so
+    the same priors apply to both. Sharp pulses are not biased by the point
+    sampling, so coarser bins can be fit with the same accuracy.
+
+    Parameters
+    ----------
+    x : array_like
+        The array of the left edges of the bins.
+    channel : int
+        The channel to be evaluated. Needed for the parameter keywords.
+    lens : bool
+        Should the rate be duplicated simulating a gravitational lensing event?
+    bin_right : array_like
+        The array of the right edges of the bins.
+    bin_width : float, optional
+        The bin width in which the rate is measured. Defaults to the width
+        of the narrowest bin.
+    n_nodes : int, optional
+        The number of quadrature nodes in each bin.
+
+    Notes
+    -----
+    The rates are calculated at every node, so the kernel keeps the nodes in
+    :attr:`nodes`. An explicit x given to the methods of the kernel is
+    evaluated as point rates.
+
+    The rise of a FRED or FREDx pulse can be much sharper than the bins, so
+    the bins within ONSET_WIDTHS bin widths of its start (or all the bins of
+    a pulse narrower than that) are integrated from the start over
+    geometrically growing panels instead of at the nodes.
+
+    """
+
+    def __init__(self, x, channel, lens, bin_right, bin_width = None,
+                 n_nodes = 4, **kwargs):
+        x = np.asarray(x, dtype = float)
+        bin_right = np.asarray(bin_right, dtype = float)
+        if bin_right.shape != x.shape or np.any(bin_right <= x):
+            raise ValueError(
+                'Input variable `bin_right` should be the same length as `x` '
+                'and greater than it.')
+        widths = bin_right - x
+        if bin_width is None:
+            bin_width = np.min(widths)
+        points, weights = np.polynomial.legendre.leggauss(n_nodes)
+        nodes = (x + bin_right)[:, None] / 2. + widths[:, None] / 2. * points
+        super(IntegratedRateKernel, self).__init__(nodes.ravel(), channel,
+                                                   lens, **kwargs)
+        self.nodes     = self.x
+        self.x         = x
+        self.bin_right = bin_right
+        self.bin_width = bin_width
+        self.n_nodes   = n_nodes
+        self.points_per_bin = n_nodes
+        # the (n_bins, n_nodes) quadrature weights in units of bin_width
+        self.weights = widths[:, None] / (2. * bin_width) * weights
+        self._node_rates = np.empty(len(self.nodes))
+        self._points, self._node_weights = points, weights
+        self._panel_powers = np.linspace(0., 1., ONSET_PANELS + 1)[:, None]
+        self._onset_pulses = [(rate, idx, shift)
+                              for rate, idx, shift in self.pulses
+                              if rate in self.onset_pulses]
+        self._sorted = not (np.any(np.diff(x) < 0)
+                            or np.any(np.diff(bin_right) < 0))
+        # the least x - ONSET_WIDTHS * widths of each bin and the bins after
+        # it, so no bin from the first whose limit exceeds the start of a
+        # pulse starts within ONSET_WIDTHS bin widths of it
+        self._max_width  = np.max(widths)
+        self._rise_limit = np.minimum.accumulate(
+                                (x - ONSET_WIDTHS * widths)[::-1])[::-1]
+
+    def _onset_pairs(self, rate, args, bins):
+        """
+        Returns the (row, bin) pairs of a batch of pulse arguments, one pulse
+        per row of args, and of the slice bins over which the pulses are
+        integrated by panels: the bins in their support windows which start
+        within ONSET_WIDTHS bin widths of their start, or all of them if the
+        window is narrower than that. Also returns the support window of the
+        pulse of each pair.
+        """
+        first, last, step = bins.indices(len(self.x))
+        start  = args[:, 0]
+        lo, hi = self.window_lists[rate](*args.T, rtol = INTEGRAL_RTOL)
+        lo = np.maximum(lo, start)
+        if self._sorted:
+            i   = np.searchsorted(self.bin_right, lo, side = 'right')
+            end = np.searchsorted(self.x, hi)
+            # no bin after the first j can start within ONSET_WIDTHS widths
+            j = np.searchsorted(self._rise_limit, start)
+            narrow = hi - lo < ONSET_WIDTHS * self._max_width
+            j = np.where(narrow, end, np.minimum(j, end))
+            i, j = np.maximum(i, first), np.minimum(j, last)
+            if len(args) == 1:
+                cols = np.arange(i[0], j[0])
+                rows = np.zeros(len(cols), dtype = int)
+            else:
+                # the ranges of bins [i, j) of each row, concatenated
+                counts = np.maximum(j - i, 0)
+                rows = np.repeat(np.arange(len(args)), counts)
+                cols = (np.repeat(i - np.cumsum(counts) + counts, counts)
+                        + np.arange(np.sum(counts)))
+        else:
+            inside = ((self.bin_right[bins] > lo[:, None])
+                      & (self.x[bins] < hi[:, None]))
+            rows, cols = np.nonzero(inside)
+            cols += first
+        widths = ONSET_WIDTHS * (self.bin_right[cols] - self.x[cols])
+        keep = ((self.x[cols] - start[rows] < widths)
+                | ((hi - lo)[rows] < widths))
+        rows, cols = rows[keep], cols[keep]
+        return rows, cols, lo[rows], hi[rows]
+
+    def _onset_correction(self, rate, args, bins, lo, hi):
+        """
+        The integrals of pulses over bins, one pulse per row of args, clipped
+        to their support windows [lo, hi], by panels growing geometrically
+        from their start, less their quadrature over the nodes of the bins.
+        """
+        start = args[:, 0]
+        lower = np.maximum(self.x[bins], lo) - start
+        upper = np.minimum(self.bin_right[bins], hi) - start
+        lower = np.maximum(lower, upper * 1e-9)
+        edges = start + lower * (upper / lower) ** self._panel_powers
+        half  = np.diff(edges, axis = 0) / 2.
+        nodes = (edges[:-1] + half)[..., None] + half[..., None] * self._points
+        # each argument as a (P, 1) column broadcasts against the nodes
+        columns = args.T[:, :, None]
+        panels = np.einsum('pbn,n,pb->b', rate(nodes, *columns),
+                           self._node_weights, half) / self.bin_width
+        nodes = self.nodes.reshape(self.weights.shape)[bins]
+        return panels - np.einsum('bn,bn->b', rate(nodes, *columns),
+                                  self.weights[bins])
+
+    def _onset_corrections(self, theta, out, bins = slice(None)):
+        """
+        Adds to the (N, n) counts out of the slice bins, for each of the N
+        parameter vectors of theta, the correction of the counts integrated
+        from the start of each FRED and FREDx pulse, and returns out.
+        """
+        first = bins.indices(len(self.x))[0]
+        # the pairs of a chunk have MAX_BATCH_ELEMENTS panel nodes
+        chunk = batch_chunk_size(ONSET_PANELS * self.n_nodes)
+        for rate, idx, shift in self._onset_pulses:
+            for row in idx:
+                args = theta[:, row]
+                for lensed in [False, True][:1 + self.lens]:
+                    if lensed:
+                        args[:, shift] += theta[:, self.td_index, None]
+                    rows, cols, lo, hi = self._onset_pairs(rate, args, bins)
+                    for a in range(0, len(rows), chunk):
+                        r, c = rows[a:a + chunk], cols[a:a + chunk]
+                        correction = self._onset_correction(
+                            rate, args[r], c, lo[a:a + chunk], hi[a:a + chunk])
+                        if lensed:
+                            correction *= theta[r, self.mr_index]
+                        np.add.at(out, (r, c - first), correction)
+        return out
+
+    def _integrate(self, rates, bins = slice(None), out = None):
+        """ Sums rates at the nodes of the slice bins into counts. """
+        weights = self.weights[bins]
+        rates = rates.reshape(rates.shape[:-1] + weights.shape)
+        return np.einsum('...ij,ij->...i', rates, weights, out = out)
+
+    def rates(self, theta, x = None, out = None):
+        """
+        Calculates the expected counts of each bin given a parameter vector,
+        see :meth:`RateKernel.rates`.
+        """
+        if x is not None:
+            return super(IntegratedRateKernel, self).rates(theta, x, out)
+        rates = super(IntegratedRateKernel, self).rates(
+                                theta, self.nodes, out = self._node_rates)
+        rates = self._integrate(rates, out = out)
+        # a negative rate is returned as zeros
+        if rates.any():
+            self._onset_corrections(theta[None], rates[None])
+        return rates
+
+    def log_rates(self, theta, x = None):
+        """
+        Calculates the natural logarithm of the expected counts of each bin,
+        by a log-sum-exp over the nodes of each bin when the model has
+        log-space forms, see :meth:`RateKernel.log_rates`.
+        """
+        if x is not None:
+            return super(IntegratedRateKernel, self).log_rates(theta, x)
+        if not self.has_log_rates:
+            with np.errstate(divide = 'ignore'):
+                return np.log(self.rates(theta))
+        log_rates = super(IntegratedRateKernel, self).log_rates(
+                                theta, self.nodes)
+        log_rates = logsumexp(log_rates.reshape(self.weights.shape), axis = 1,
+                              b = self.weights)
+        if len(self._onset_pulses):
+            correction = self._onset_corrections(
+                                theta[None], np.zeros((1, len(log_rates))))[0]
+            onset = np.flatnonzero(correction)
+            log_rates[onset] = np.log(np.exp(log_rates[onset])
+                                      + correction[onset])
+        return log_rates
+
+    def batch_rates(self, theta, x = None):
+        """
+        Calculates the expected counts of each bin for each of a batch of
+        parameter vectors, see :meth:`RateKernel.batch_rates`.
+        """
+        if x is not None:
+            return super(IntegratedRateKernel, self).batch_rates(theta, x)
+        return self._bin_rates(theta, slice(None))
+
+    def _summed_rates(self, theta, x = None):
+        """
+        Sums the pulses at the nodes of the bins by default, see
+        :meth:`RateKernel._summed_rates`.
+        """
+        if x is None:
+            x = self.nodes
+        return super(IntegratedRateKernel, self)._summed_rates(theta, x)
+
+    def _bin_rates(self, theta, bins):
+        nodes = self.nodes.reshape(self.weights.shape)[bins].ravel()
+        rates = super(IntegratedRateKernel, self).batch_rates(theta, nodes)
+        rates = self._integrate(rates, bins)
+        if len(self._onset_pulses):
+            theta = np.atleast_2d(theta)
+            # the rows of negative rates are left as zeros
+            active = rates.any(axis = 1)
+            if active.all():
+                self._onset_corrections(theta, rates, bins)
+            elif active.any():
+                rates[active] = self._onset_corrections(theta[active],
+                                                        rates[active], bins)
+        return rates
+
+if __name__ == '__main__':
+    pass
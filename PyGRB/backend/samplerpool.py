@@ -0,0 +1,99 @@
+import copy
+import multiprocessing
+from functools import partial
+
+from bilby.core.sampler.base_sampler import Sampler as bilbySampler
+
+# the sampler methods which are evaluated by the worker processes
+_SHIPPED_METHODS = ['log_likelihood', 'prior_transform']
+# sampler attributes which are not needed to evaluate the shipped methods
+_UNSHIPPED_ATTRIBUTES = ['sampler', 'kwargs', 'result', 'external_sampler']
+
+_worker_sampler = None
+
+
+def _initialise_worker(sampler_class, state):
+    """ Rebuilds the bilby sampler in a worker process. """
+    global _worker_sampler
+    _worker_sampler = object.__new__(sampler_class)
+    _worker_sampler.__dict__.update(state)
+
+
+def _call_sampler_method(name, theta):
+    return getattr(_worker_sampler, name)(theta)
+
+
+class SamplerPool(object):
+    """
+    A process pool to be passed to the sampler by bilby.run_sampler.
+
+    bilby hands the external sampler bound methods of its own sampler object,
+    which also holds this pool, so they cannot be sent to worker processes
+    as they are. Instead, on the first map the likelihood, priors and the
+    rest of the bilby sampler state are pickled once to each worker. The
+    bilby methods passed to map afterwards, directly or inside the argument
+    tuples of the external sampler, are swapped for calls to the worker's
+    copy. This requires the likelihood and priors to be picklable.
+
+    Parameters
+    ----------
+    processes : int
+        The number of worker processes.
+
+    """
+
+    def __init__(self, processes):
+        super(SamplerPool, self).__init__()
+        self.size  = processes
+        self._pool = None
+
+    def _start(self, sampler):
+        state = {key : value for key, value in sampler.__dict__.items()
+                 if key not in _UNSHIPPED_ATTRIBUTES}
+        self._pool = multiprocessing.Pool(  self.size, _initialise_worker,
+                                            (type(sampler), state))
+
+    def _substitute(self, obj):
+        """
+        Returns obj, or a picklable stand-in if obj is one of the shipped
+        bilby sampler methods, or a function wrapper around one.
+        """
+        func    = getattr(obj, 'func', obj)
+        sampler = getattr(func, '__self__', None)
+        name    = getattr(func, '__name__', None)
+        if (not isinstance(sampler, bilbySampler)
+            or name not in _SHIPPED_METHODS):
+            return obj
+        if self._pool is None:
+            self._start(sampler)
+        worker_func = partial(_call_sampler_method, name)
+        if obj is func:
+            return worker_func
+        obj = copy.copy(obj)
+        obj.func = worker_func
+        return obj
+
+    def map(self, func, iterable):
+        func = self._substitute(func)
+        iterable = [tuple(self._substitute(arg) for arg in args)
+                    if isinstance(args, tuple) else args
+                    for args in iterable]
+        if self._pool is None:
+            return list(map(func, iterable))
+        return self._pool.map(func, iterable)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __getstate__(self):
+        """ The worker processes are not pickled with the sampler. """
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        return state
+
+
+if __name__ == '__main__':
+    pass
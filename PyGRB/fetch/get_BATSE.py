@@ -1,16 +1,155 @@
 import os
+import gzip
+import zlib
+import time
+import shutil
 import urllib
+import urllib.request
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 from bs4 import BeautifulSoup
 from os.path import join, exists
 
+BATSE_URL = 'https://heasarc.gsfc.nasa.gov/FTP/compton/data/batse/trigger/'
+
 def mkdir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
     else:
         pass
 
+def _check_gzip(path):
+    """ Raises an OSError if a gzipped file is truncated or corrupt. """
+    try:
+        with gzip.open(path, 'rb') as f:
+            while f.read(2 ** 20):
+                pass
+    except (EOFError, zlib.error) as error:
+        raise OSError(f'{path} is not a complete gzip file.') from error
+
+
+def fetch_file(url, path, retries = 3, backoff = 1., timeout = 60):
+    """
+    Downloads a file, retrying failed attempts with exponential backoff.
+
+    The file is downloaded to path + '.part' and renamed into place once
+    complete, so path is never left half written. A .part file left by an
+    interrupted run is resumed with an HTTP range request, if the server
+    supports them. Gzipped files are checked for integrity before the
+    rename.
+
+    Parameters
+    ----------
+    url : str
+        The url of the file.
+    path : str
+        Where to save the file.
+    retries : int, optional
+        The number of times a failed download is retried.
+    backoff : float, optional
+        The wait before the first retry, in seconds. It doubles with each
+        further retry.
+    timeout : float, optional
+        The timeout of each request, in seconds.
+
+    Returns
+    -------
+    str
+        The path to the file.
+
+    """
+    part = f'{path}.part'
+    for attempt in range(retries + 1):
+        try:
+            size = os.path.getsize(part) if exists(part) else 0
+            request = urllib.request.Request(url)
+            if size:
+                request.add_header('Range', f'bytes={size}-')
+            with urllib.request.urlopen(request, timeout = timeout) as r:
+                # a server which ignores the range sends the whole file
+                mode = 'ab' if r.status == 206 else 'wb'
+                with open(part, mode) as f:
+                    shutil.copyfileobj(r, f)
+            if path.endswith('.gz'):
+                try:
+                    _check_gzip(part)
+                except OSError:
+                    os.remove(part)
+                    raise
+            os.replace(part, path)
+            return path
+        except urllib.error.HTTPError as error:
+            # the file does not exist, which retrying will not change
+            if error.code == 404:
+                raise FileNotFoundError(url) from error
+            # the .part file is already complete, or is not a prefix
+            if error.code == 416:
+                os.remove(part)
+            if attempt == retries:
+                raise
+        except OSError:
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
+
+
+def fetch_bursts(triggers, datatypes, max_workers = 8, retries = 3,
+                 backoff = 1., base_url = BATSE_URL, detector = None):
+    """
+    Downloads the files of many BATSE triggers concurrently.
+
+    Files which have already been downloaded are skipped, so an
+    interrupted run is resumed by calling this again. See
+    :func:`~fetch_file` for the retries and integrity checks of each file.
+
+    Parameters
+    ----------
+    triggers : iterable of int
+        The BATSE trigger numbers, e.g. range(1, 8122).
+    datatypes : str or list of str
+        The datatypes to download for each trigger, see
+        :class:`~GetBATSEBurst`.
+    max_workers : int, optional
+        The number of concurrent downloads.
+    retries : int, optional
+        The number of times a failed download is retried.
+    backoff : float, optional
+        The wait before the first retry, in seconds.
+    base_url : str, optional
+        The url of the BATSE trigger directory.
+    detector : int, optional
+        The detector of the herb and sherb datatypes.
+
+    Returns
+    -------
+    tuple
+        Two dictionaries keyed by (trigger, datatype), of the paths of the
+        downloaded files and of the errors of the failed downloads.
+
+    """
+    if isinstance(datatypes, str):
+        datatypes = [datatypes]
+    paths, failed, futures = {}, {}, {}
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        for trigger in triggers:
+            for datatype in datatypes:
+                burst = GetBATSEBurst(trigger, datatype, detector = detector,
+                                      base_url = base_url, download = False)
+                if exists(burst.path):
+                    paths[(trigger, datatype)] = burst.path
+                else:
+                    futures[(trigger, datatype)] = executor.submit(
+                            fetch_file, burst.remote, burst.path,
+                            retries = retries, backoff = backoff)
+        for key, future in futures.items():
+            try:
+                paths[key] = future.result()
+            except Exception as error:
+                failed[key] = error
+    return paths, failed
+
+
 class GetBATSEBurst():
     """
     A class to download BATSE bursts.
@@ -21,10 +160,18 @@ class GetBATSEBurst():
         The BATSE trigger number.
     datatype : string
         The datatype desired. ('tte', or 'discsc')
+    base_url : string, optional
+        The url of the BATSE trigger directory.
+    download : bool, optional
+        If *False* only finds the url and path of the file.
+    retries : int, optional
+        The number of times a failed download is retried, see
+        :func:`~fetch_file`.
 
     """
 
-    def __init__(self, trigger, datatype, detector = None):
+    def __init__(self, trigger, datatype, detector = None,
+                 base_url = BATSE_URL, download = True, retries = 0):
         datatypes = {   'tte'       : 'tte_bfits',
                         'tte_list'  : 'tte_list',
                         'stte_list' : 'stte_list',
@@ -39,14 +186,18 @@ class GetBATSEBurst():
                 f'Input variable `datatype` is {datatype} when it '
                 f'should be `discsc`, `tte`, `tte_list`, or `stte_list`.')
 
-        self._base_string = 'https://heasarc.gsfc.nasa.gov/FTP/compton/data/batse/trigger/'
+        self._base_string = base_url
         self._trigger     = trigger
         self._root        = f'data/BATSE/{datatype}/'
         self._file_name   = f'{datatypes[datatype]}_{trigger}.fits.gz'
         self._url         = self._make_url()
+        self._retries     = retries
+        self.path         = join(self._root, self._file_name)
+        self.remote       = f'{self._url}/{self._file_name}'
 
         mkdir(self._root)
-        self.download_file()
+        if download:
+            self.download_file()
 
     def _make_url(self):
         """
@@ -74,18 +225,15 @@ class GetBATSEBurst():
         Concatenates the trigger folder url with the filename of the required
         datatype and requests the file from the NASA server.
         """
-        path = join(self._root, self._file_name)
-        if not exists(path):
-            remote = f'{self._url}/{self._file_name}'
+        if not exists(self.path):
             try:
-                urllib.request.urlretrieve(remote, path)
+                fetch_file(self.remote, self.path, retries = self._retries)
             except:
                 raise FileNotFoundError(
                         f'The file:  << {self._file_name} >>  '
                         f'does not exist at the specified url:\n'
-                        f'{remote}'
+                        f'{self.remote}'
                         f'This trigger has either been deleted, or is not a burst.')
-        self.path = path
 
 if __name__ == '__main__':
     pass
@@ -1,20 +1,33 @@
+import os
+import time
 import numpy  as np
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
 import bilby
-from bilby.core.likelihood import JointLikelihood as bilbyJointLikelihood
 
 from PyGRB.preprocess import BATSEpreprocess
 from PyGRB.preprocess import GRB_class
+from PyGRB.preprocess.rebin import rebin_GRB
 from PyGRB.backend.admin import Admin
 from PyGRB.backend.makepriors import MakePriors
 from PyGRB.backend.multipriors import MultiPriors
-from PyGRB.backend.rateclass import PoissonRate
+from PyGRB.backend.rateclass import PoissonRate, MultiChannelPoissonRate
+from PyGRB.backend.ratekernel import compile_model
+from PyGRB.backend.samplerpool import SamplerPool
 from PyGRB.postprocess.plot_analysis import PlotPulseFit
 from PyGRB.postprocess.plot_gl_posteriors import GravLens
 from PyGRB.postprocess.make_evidence_tables import EvidenceTables
 
 
+def _run_1_channel_job(fitter, channel, model):
+    """ Runs a single channel fit in a worker process, returns its time. """
+    start = time.time()
+    fitter.main_1_channel(channel, model)
+    return time.time() - start
+
+
 class PulseFitter(Admin, EvidenceTables):
     """ Wrapper object for Bayesian analysis. """
 
@@ -42,7 +55,20 @@ class PulseFitter(Admin, EvidenceTables):
         self.nSamples            = nSamples
         self.trigger             = trigger
         self.injection_parameters= kwargs.get('injection_parameters')
-        # self.sampler_kwargs      = kwargs.get('sampler_kwargs')
+        # extra keyword arguments for bilby.run_sampler
+        self.sampler_kwargs      = kwargs.get('sampler_kwargs', {})
+        # number of sampler worker processes
+        self.npool               = kwargs.get('npool')
+        # calculate the likelihood from log-rates where the model allows
+        self.log_space           = kwargs.get('log_space', False)
+        # only evaluate pulses over the bins where they exceed this tolerance
+        self.support_rtol        = kwargs.get('support_rtol')
+        # fit the integral of the rate over each bin rather than its value
+        # at the left edge, with n_nodes quadrature nodes per bin
+        self.integrate_bins      = kwargs.get('integrate_bins', False)
+        self.n_nodes             = kwargs.get('n_nodes', 4)
+        # the bin width of the rate when integrating bins
+        self.bin_width           = kwargs.get('bin_width')
         self.save                = save
 
 
@@ -58,6 +84,16 @@ class PulseFitter(Admin, EvidenceTables):
         self.p_type  = kwargs.get('p_type', 'docs')
         self.directory_label  = kwargs.get('directory_label')
         self.overwrite_priors = kwargs.get('overwrite_priors')
+        # quantiles of the posterior rate calculated by get_residuals
+        self.quantiles = kwargs.get('quantiles', [0.05, 0.16, 0.5, 0.84, 0.95])
+        # 'exact' or 'sketch', see RateKernel.rate_quantiles
+        self.quantile_method = kwargs.get('quantile_method')
+        self.credible_bands = {}
+
+        # read BATSE files through a columnar mirror in mirror_root, see
+        # PyGRB.preprocess.mirror.FITSMirror, or directly if mirror is False
+        mirror = {  'mirror'      : kwargs.get('mirror', True),
+                    'mirror_root' : kwargs.get('mirror_root')}
 
         self.test = kwargs.get('test')
         if not self.test:
@@ -67,18 +103,27 @@ class PulseFitter(Admin, EvidenceTables):
             else:
                 try:
                     (self.start, self.end) = times
-                    self.GRB = BATSEpreprocess.make_GRB(
-                        burst = self.trigger, times = (self.start, self.end),
-                        datatype = self.datatype, bgs = False)
-                except:
+                except (TypeError, ValueError):
+                    # times is 'full', 'T90' or 'T100', see BATSESignal
                     self.GRB = BATSEpreprocess.make_GRB(
                         burst = self.trigger, times = times,
-                        datatype = self.datatype, bgs = False)
+                        datatype = self.datatype, bgs = False, **mirror)
                     self.start = self.GRB.bin_left[0]
                     self.end   = self.GRB.bin_right[-1]
+                else:
+                    self.GRB = BATSEpreprocess.make_GRB(
+                        burst = self.trigger, times = (self.start, self.end),
+                        datatype = self.datatype, bgs = False, **mirror)
         else:
             self.GRB = kwargs.get('GRB')
 
+        # the keywords of rebin_GRB, to fit signal-adaptive bins
+        self.rebin = kwargs.get('rebin')
+        if self.rebin is not None:
+            if self.bin_width is None:
+                self.bin_width = np.min(self.GRB.bin_right - self.GRB.bin_left)
+            self.GRB = rebin_GRB(self.GRB, **self.rebin)
+            self.integrate_bins = True
 
     def _split_array_job_to_4_channels(self, models, indices, channels = None):
         for idx in indices:
@@ -87,6 +132,95 @@ class PulseFitter(Admin, EvidenceTables):
             channel    = channels[idx % n_channels]
             self.main_1_channel(channel, models[m_index])
 
+    def _result_file(self, channel, model):
+        """ Returns the path of the bilby result file of a channel fit. """
+        self._setup_labels(model)
+        result_label = f'{self.fstring}{self.clabels[channel]}'
+        return f'{self.outdir}/{result_label}_result.json'
+
+    def main_local_pool(self, models, channels, n_processes = None):
+        """
+        Runs the single channel fit of every model and channel combination
+        over a pool of local processes, as an alternative to sending array
+        jobs to a cluster. Jobs whose result file already exists are skipped.
+
+        Parameters
+        ----------
+        models : list of dict
+            The models to be fit.
+        channels : list of int
+            The channels to be fit.
+        n_processes : int, optional
+            The size of the process pool. Defaults to the number of CPUs. If 1
+            the jobs are run serially in this process.
+
+        Returns
+        -------
+        dict
+            The run time in seconds of each completed job, keyed by
+            (model name, channel).
+
+        Raises
+        ------
+        RuntimeError
+            If any job failed, once all the other jobs have finished. The
+            error of the first failed job is its cause.
+
+        """
+        jobs = []
+        for model in models:
+            for channel in channels:
+                if os.path.exists(self._result_file(channel, model)):
+                    print(f'Skipping model {model["name"]} channel {channel},'
+                          f' result already exists.')
+                else:
+                    jobs.append((channel, model))
+        if n_processes is None:
+            n_processes = os.cpu_count() or 1
+        n_processes = max(min(n_processes, len(jobs)), 1)
+        print(f'Running {len(jobs)} jobs on {n_processes} processes.')
+
+        if n_processes == 1:
+            # each job is run as its result is asked for
+            results = ((job, partial(_run_1_channel_job, self, *job))
+                       for job in jobs)
+            timings, failed = self._collect_jobs(results, len(jobs))
+        else:
+            with ProcessPoolExecutor(max_workers = n_processes) as pool:
+                futures = {pool.submit(_run_1_channel_job, self, *job) : job
+                           for job in jobs}
+                results = ((futures[future], future.result)
+                           for future in as_completed(futures))
+                timings, failed = self._collect_jobs(results, len(jobs))
+        if failed:
+            names = ', '.join(f'model {name} channel {channel}'
+                              for name, channel in failed)
+            raise RuntimeError(
+                f'{len(failed)} of {len(jobs)} jobs failed: {names}.'
+                ) from next(iter(failed.values()))
+        return timings
+
+    @staticmethod
+    def _collect_jobs(results, n_jobs):
+        """
+        Reports the outcome of each ((channel, model), result) as it comes,
+        where result returns the run time of the job or raises its error.
+        Returns dictionaries keyed by (model name, channel) of the run times
+        of the completed jobs and of the errors of the failed jobs.
+        """
+        timings, failed = {}, {}
+        for i, ((channel, model), result) in enumerate(results):
+            job = f'[{i + 1}/{n_jobs}] model {model["name"]} channel {channel}'
+            try:
+                elapsed = result()
+            except Exception as error:
+                failed[(model['name'], channel)] = error
+                print(f'{job} failed: {error!r}')
+                continue
+            timings[(model['name'], channel)] = elapsed
+            print(f'{job} finished in {elapsed:.1f} seconds.')
+        return timings, failed
+
     def main_multi_channel(self, channels, model):
         self._setup_labels(model)
         self.plot_lc(channels = channels, return_axes = False)
@@ -118,7 +252,9 @@ class PulseFitter(Admin, EvidenceTables):
 
         x = self.GRB.bin_left
         y = np.rint(self.GRB.counts[:,i]).astype('uint')
-        likelihood = PoissonRate(x, y, i, **self.model)
+        likelihood = PoissonRate(x, y, i, log_space = self.log_space,
+                                 support_rtol = self.support_rtol,
+                                 **self._bin_kwargs(), **self.model)
 
         result_label = f'{self.fstring}{self.clabels[i]}'
         plot_label   = f'{self.outdir}/{result_label}_corner.png'
@@ -127,7 +263,6 @@ class PulseFitter(Admin, EvidenceTables):
 
     def main_joint_multi_channel(self, channels, model):
         self._setup_labels(model)
-        likelihoods = []
         dict_update = {**self.model, **self.kwargs}
         prior_shell = MultiPriors(  priors_pulse_start = self.priors_pulse_start,
                                     priors_pulse_end = self.priors_pulse_end,
@@ -136,32 +271,59 @@ class PulseFitter(Admin, EvidenceTables):
                                     channels = channels,**dict_update)
         priors = prior_shell.return_prior_dict()
         x = self.GRB.bin_left
-        for i in channels:
-            y = np.rint(self.GRB.counts[:,i]).astype('uint')
-            likelihoods.append(PoissonRate(x, y, i, **self.model))
-        joint_likelihood = bilbyJointLikelihood(*likelihoods)
+        y = np.rint(self.GRB.counts[:,channels]).astype('uint')
+        joint_likelihood = MultiChannelPoissonRate(x, y, channels,
+                                           log_space = self.log_space,
+                                           support_rtol = self.support_rtol,
+                                           **self._bin_kwargs(), **self.model)
         result_label = f'{self.fstring}_all'
         plot_label   = f'{self.outdir}/{result_label}_corner.png'
         self._run_bilby( joint_likelihood, priors, model, channels,
                         result_label, plot_label)
 
+    def _bin_kwargs(self):
+        """ The keywords of the rate kernel for integrated bins. """
+        if not self.integrate_bins:
+            return {}
+        return dict(bin_right = self.GRB.bin_right, n_nodes = self.n_nodes,
+                    bin_width = self.bin_width)
+
     def _run_bilby(self, likelihood, priors, model, channels,
                          result_label, plot_label):
         """ Calls to bilby.run_sampler given a likelihood, priors and model.
             Channels should be passed as a list, even if a single value.
             result_label and plot_label are the names for the resultant plots
-            and data.
+            and data. The sampler_kwargs given on initialisation are passed
+            to the sampler. If npool is greater than 1 a pool of that many
+            worker processes is given to the sampler (dynesty only).
         """
-        result = bilby.run_sampler(likelihood   = likelihood,
-                                   priors       = priors,
-                                   sampler      = self.sampler,
-                                   nlive        = self.nSamples,
-                                   outdir       = self.outdir,
-                                   label        = result_label,
-                                   save         = self.save,
-                           injection_parameters = self.injection_parameters)
-                           # ,
-                                   # **self.sampler_kwargs)
+        sampler_kwargs = dict(self.sampler_kwargs)
+        npool = sampler_kwargs.pop('npool', self.npool)
+        pool  = None
+        if npool is not None and npool > 1:
+            # the likelihood and priors are pickled to the workers
+            pool = SamplerPool(npool)
+            sampler_kwargs.setdefault('pool', pool)
+            sampler_kwargs.setdefault('queue_size', npool)
+        # with a pool the result is saved once the pool is removed from it
+        save = self.save if pool is None else False
+        try:
+            result = bilby.run_sampler(likelihood   = likelihood,
+                                       priors       = priors,
+                                       sampler      = self.sampler,
+                                       nlive        = self.nSamples,
+                                       outdir       = self.outdir,
+                                       label        = result_label,
+                                       save         = save,
+                               injection_parameters = self.injection_parameters,
+                                       **sampler_kwargs)
+        finally:
+            if pool is not None:
+                pool.close()
+        if pool is not None and self.save:
+            # the pool can not be written to the result file
+            result.sampler_kwargs.pop('pool', None)
+            result.save_to_file(overwrite = True, extension = self.save)
         result.plot_corner(filename = plot_label)
         self.get_residuals(channels = channels, model = model)
 
@@ -175,61 +337,24 @@ class PulseFitter(Admin, EvidenceTables):
         count_fits      = np.zeros((len(self.GRB.bin_left),4))
         residuals       = np.zeros((len(self.GRB.bin_left),4))
         posterior_lines = np.zeros((len(self.GRB.bin_left),nDraws,4))
+        # the median is always needed for the fit and residuals
+        quantiles = sorted(set(self.quantiles) | {0.5})
         for i in channels:
-            prior_shell = MakePriors(
-                                priors_pulse_start = self.priors_pulse_start,
-                                priors_pulse_end = self.priors_pulse_end,
-                                priors_td_lo = self.priors_td_lo,
-                                priors_td_hi = self.priors_td_hi,
-                                channel      = i,
-                                **self.model)
-            priors = prior_shell.return_prior_dict()
-
             x = self.GRB.bin_left
-            y = np.rint(self.GRB.counts[:,i]).astype('uint')
-            likelihood = PoissonRate(x, y, i, **self.model)
+            kernel = compile_model(x, i, self.model, **self._bin_kwargs())
 
             result_label = f'{self.fstring}{self.clabels[i]}'
             open_result  = f'{self.outdir}/{result_label}_result.json'
             result = bilby.result.read_in_result(filename=open_result)
 
-            c_keys = ['a', 'b', 'c', 'd']
-            k      = c_keys[i]
-            for j in range(1, self.num_pulses + 1):
-                try:
-                    key = f'constraint_{j}_{k}'
-                    del priors[key]
-                except:
-                    pass
-                try:
-                    key = f'constraint_{j}_{k}_res'
-                    del priors[key]
-                except:
-                    pass
-
-            posteriors = dict()
-            for parameter in priors:
-                posteriors[parameter] = result.posterior[parameter].values
-            p_chain_len = len(posteriors[f'background_{k}'])
-
-            posterior_draws = np.zeros((len(x), p_chain_len))
-            if model['lens']:
-                for jj in range(p_chain_len):
-                    p_draw = {}
-                    for key in posteriors:
-                        p_draw[key] = posteriors[key][jj]
-                    posterior_draws[:,jj] = likelihood._sum_rates(x, p_draw,
-                                                likelihood.calculate_rate_lens)
-                posterior_draws_median = np.median(posterior_draws, axis = 1)
+            # (p_chain_len, n_params) array of the posterior samples
+            posteriors  = kernel.pack_batch(result.posterior)
+            p_chain_len = len(posteriors)
 
-            else:
-                for jj in range(p_chain_len):
-                    p_draw = {}
-                    for key in posteriors:
-                        p_draw[key] = posteriors[key][jj]
-                    posterior_draws[:,jj] = likelihood._sum_rates(x, p_draw,
-                                                likelihood.calculate_rate)
-                posterior_draws_median = np.median(posterior_draws, axis = 1)
+            bands = kernel.rate_quantiles(posteriors, quantiles,
+                                          method = self.quantile_method)
+            self.credible_bands[i] = dict(zip(quantiles, bands))
+            posterior_draws_median = self.credible_bands[i][0.5]
 
             count_fits[:,i] = posterior_draws_median
             residuals[:,i] = self.GRB.counts[:,i] - posterior_draws_median
@@ -240,9 +365,9 @@ class PulseFitter(Admin, EvidenceTables):
             rates_err_i = np.sqrt(self.GRB.counts[:,i]) / widths
             strings['widths'] = widths
             strings['p_type'] = self.p_type
-            posterior_draws   = posterior_draws / widths[:,None]
-            posterior_lines[:,:,i] = posterior_draws[:,
-                            np.random.randint(p_chain_len, size = nDraws)]
+            draws = np.random.randint(p_chain_len, size = nDraws)
+            posterior_draws = kernel.batch_rates(posteriors[draws])
+            posterior_lines[:,:,i] = posterior_draws.T / widths[:,None]
             PlotPulseFit(   x = self.GRB.bin_left, y = rates_i,
                             y_err = rates_err_i,
                             y_cols = self.GRB.colours[i],
@@ -5,17 +5,27 @@ Written by James Paynter, 2020.
 
 import os
 import numpy as np
-import pandas as pd
-from astropy.io import fits
-from pathlib import Path
 
 from PyGRB.fetch.get_BATSE        import GetBATSEBurst
 from PyGRB.preprocess.abstract    import SignalFramework
+from PyGRB.preprocess.mirror      import open_tables
+from PyGRB.preprocess.catalogue   import lookup_T90
 
 def make_GRB(**kwargs):
     GRB = BATSESignal(**kwargs)
     return GRB.return_GRB()
 
+def _nearest_index(bins, time):
+    """
+    Returns the index of the bin nearest to time, the first on ties, as
+    np.abs(bins - time).argmin() would. The bins should be sorted.
+    """
+    right = min(np.searchsorted(bins, time), len(bins) - 1)
+    left  = max(right - 1, 0)
+    index = right if abs(bins[right] - time) < abs(bins[left] - time) else left
+    # the first of any repeated bins
+    return int(np.searchsorted(bins, bins[index]))
+
 class BATSESignal(SignalFramework):
     """
     Initialize the :class:`~BATSESignal` class. This class inherits from the
@@ -42,6 +52,13 @@ class BATSESignal(SignalFramework):
         calling the :meth:`~get_background` method. The method is a first
         order approximation. This parameter should be set to *False* for
         light-curve fitting with the main :mod:`~DynamicBilby` methods.
+    mirror : bool, optional
+        If *True* (the default) the FITS file is read through a columnar
+        :class:`~PyGRB.preprocess.mirror.FITSMirror`, which is written on
+        first use. If *False* it is read directly with astropy.
+    mirror_root : str, optional
+        The directory of the mirror. Defaults to one next to the FITS file,
+        see :func:`~PyGRB.preprocess.mirror.mirror_path`.
 
     """
 
@@ -49,7 +66,9 @@ class BATSESignal(SignalFramework):
                         datatype: str = None,
                         times = None,
                         bgs: bool = False,
-                        light_GRB: bool = True):
+                        light_GRB: bool = True,
+                        mirror: bool = True,
+                        mirror_root: str = None):
 
         self.colours   = ['red', 'orange', 'green', 'blue']
         self.clabels   = ['1', '2', '3', '4']
@@ -80,64 +99,80 @@ class BATSESignal(SignalFramework):
         self.light_GRB = light_GRB
         # GetBATSEBurst downdloads file if it does not exist
         fetch = GetBATSEBurst(trigger = self.burst, datatype = self.datatype)
-        # with closes the file automatically after finished.
-        with fits.open(fetch.path) as hdu_list:
-            self.data = hdu_list[-1].data
-            ### initialise data arrays from fits file, over entire data set
-            self.bin_left  = np.array(self.data['TIMES'][:, 0])
-            self.bin_right = np.array(self.data['TIMES'][:, 1])
-            self.rates     = np.array(self.data['RATES'][:, :])
-            # errors in BATSE rates are calculated by scaling the counts
-            # count errors are calculated with as Poisson errors = sqrt(counts)
-            self.errors = np.array(self.data['ERRORS'][:, :])
-            self.counts = np.array([np.multiply(self.rates[:, i],
-                    self.bin_right - self.bin_left) for i in range(4)]).T
-            self.count_err = np.sqrt(self.counts)
-            self.t90_st, self.end = self.bin_left[0], self.bin_right[-1]
-            try:
-                (self.t90_st, self.end) = times
-            except:
-                if times == 'T90':
-                    self._read_T90_table()
-                elif times == 'T100':
-                    self._read_T90_table()
-                    self.t90_st = min(-2, self.t90_st)
-                    self.end += max(5, 0.25 * self.t90)
-
-            super().__init__(times, bgs)
-
-    def _open_T90_excel(self):
-        """ Open the BATSE 4B csv information file. """
-        xls_file = f'../data/BATSE_4B_catalogue.xls'
-        path = Path(__file__).parent / xls_file
-        cols = ['trigger_num', 't90', 't90_error', 't90_start']
-        dtypes = {  'trigger_num': np.int32, 't90' : np.float64,
-                    't90_error' : np.float64, 't90_start' : np.float64}
+        # the columns of the mirror are memory-mapped, see FITSMirror,
+        # so only the rows we keep are read, unless mirror is False
+        tables = open_tables(fetch.path, mirror, mirror_root)
+        # the whole table is only read if data is accessed
+        self._tables, self._data = tables, None
+        self._times = tables.column('TIMES')
+        self._rates = tables.column('RATES')
+        self.t90_st, self.end = self._times[0, 0], self._times[-1, 1]
         try:
-            table = pd.read_excel(path, sheet_name = 'batsegrb', header = 0,
-                                    usecols = cols, dtype = dtypes)
-            return table
-        except FileNotFoundError as fnf_error:
-                    print(fnf_error)
+            (self.t90_st, self.end) = times
+        except:
+            if times == 'T90':
+                self._read_T90_table()
+            elif times == 'T100':
+                self._read_T90_table()
+                self.t90_st = min(-2, self.t90_st)
+                self.end += max(5, 0.25 * self.t90)
+
+        rows = self._window_rows(times)
+        self.bin_left  = np.array(self._times[rows, 0])
+        self.bin_right = np.array(self._times[rows, 1])
+        self.rates     = np.array(self._rates[rows])
+        # errors in BATSE rates are calculated by scaling the counts
+        # count errors are calculated with as Poisson errors = sqrt(counts)
+        self.errors    = np.array(tables.column('ERRORS')[rows])
+        self.counts    = self.rates * (self.bin_right - self.bin_left)[:, None]
+        self.count_err = np.sqrt(self.counts)
+        super().__init__(times, bgs)
+
+    @property
+    def data(self):
+        """
+        The table of the FITS file, over the entire data set, as a record
+        array of columns such as 'TIMES', 'RATES', and 'ERRORS'. It is read
+        from the mirror when first accessed.
+        """
+        if self._data is None:
+            self._data = self._tables.table()
+        return self._data
+
+    def _window_rows(self, times):
+        """
+        Returns the slice of rows which hold the requested times. The
+        SignalFramework cuts the light-curve between the bins nearest the
+        start and end times, so the bin nearest the end is kept for it.
+        """
+        if not (type(times) is tuple or times in ('T90', 'T100')):
+            return slice(None)
+        bin_left = self._times[:, 0]
+        if np.any(np.diff(bin_left) < 0):
+            return slice(None)
+        start = _nearest_index(bin_left, self.t90_st)
+        stop  = _nearest_index(bin_left, self.end)
+        return slice(start, stop + 1)
+
+    def get_background(self):
+        """ Creates background from bins of width greater than nominal
+            resolution of 64ms. i.e. uses the larger 1024ms+ bins, over the
+            entire data set.
+        """
+        widths = np.round(self._times[:, 1] - self._times[:, 0], 3)
+        return np.mean(self._rates[widths > 0.065], axis=0)
 
     def _read_T90_table(self):
         """
-        Opens the BATSE T90 bursts as a pandas object. Searches for the
-        current burst's trigger, T90, T90 error, and T90 start time.
+        Looks up the current burst's T90, T90 error, and T90 start time in
+        the BATSE 4B catalogue, see :func:`~PyGRB.preprocess.catalogue.lookup_T90`.
         Throws an exception if the burst is not found in the T90 table.
         (i.e. no T90 exists for this burst).
         """
-        table = self._open_T90_excel()
-        self.burst_list     = table['trigger_num']
-        self.t90_list       = table['t90']
-        self.t90_err_list   = table['t90_error']
-        self.t90_st_list    = table['t90_start']
         try:
-            self.t90 = float(self.t90_list[self.burst_list == self.burst])
-            self.t90_err = float(self.t90_err_list[self.burst_list == self.burst])
-            self.t90_st = float(self.t90_st_list[self.burst_list == self.burst])
+            self.t90, self.t90_err, self.t90_st = lookup_T90(self.burst)
             self.end = self.t90_st + self.t90
-        except:
+        except KeyError:
              raise Exception('There is no T90 for this trigger in the BATSE 4B'
                              'catalogue. Try `full` or enter custom times as a'
                              'tuple, i.e. (start, end).')
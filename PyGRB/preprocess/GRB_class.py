@@ -1,13 +1,12 @@
-import os
 from pathlib import Path
 
 import numpy as np
 import matplotlib.pyplot as plt
-from astropy.io import fits
 from astropy.stats import bayesian_blocks
 
-from PyGRB.backend.admin import mkdir
 from PyGRB.preprocess.grb import EmptyGRB
+from PyGRB.preprocess.cache import ArrayCache, file_hash
+from PyGRB.preprocess.mirror import open_tables
 from PyGRB.fetch.get_BATSE import GetBATSEBurst
 
 
@@ -16,28 +15,142 @@ def make_GRB(**kwargs):
     return GRB.return_GRB()
 
 
+# a photon of a TTE list: its arrival time, detector and energy channel
+PHOTON_DTYPE = np.dtype([('time', 'f8'), ('detector', 'u1'), ('channel', 'u1')])
+
+
+def merge_photon_lists(photon_lists, channel_lists, detectors):
+    """
+    Merges the photon lists of several detectors into a single list sorted
+    by arrival time, keeping the detector and channel of each photon.
+
+    Each detector's list is already time-ordered, so the stable sort of the
+    concatenated lists only merges the sorted runs. Photons which arrive at
+    the same time keep the order of the detectors.
+
+    Parameters
+    ----------
+    photon_lists : list of array_like
+        The sorted arrival times of the photons of each detector.
+    channel_lists : list of array_like
+        The energy channel of each photon of each detector.
+    detectors : list of int
+        The detectors to merge.
+
+    Returns
+    -------
+    array
+        A structured array of PHOTON_DTYPE sorted by time.
+
+    """
+    detectors = [int(k) for k in detectors]
+    sizes = [len(photon_lists[k]) for k in detectors]
+    times = np.concatenate([np.zeros(0)] + [photon_lists[k] for k in detectors])
+    order = np.argsort(times, kind = 'stable')
+    # each field is gathered on its own, which is much faster than
+    # gathering the structured array
+    photons = np.empty(len(times), dtype = PHOTON_DTYPE)
+    photons['time'] = times[order]
+    photons['detector'] = np.repeat(detectors, sizes)[order]
+    photons['channel']  = np.concatenate(
+            [np.zeros(0, dtype = 'u1')]
+            + [channel_lists[k] for k in detectors])[order]
+    return photons
+
+
+def _nearest_bins(bins, times):
+    """
+    Returns the index of the nearest bin to each time, the first on ties,
+    and the distance to it. The bins should be sorted.
+    """
+    right = np.searchsorted(bins, times)
+    left  = np.clip(right - 1, 0, len(bins) - 1)
+    right = np.clip(right, 0, len(bins) - 1)
+    d_left  = np.abs(bins[left]  - times)
+    d_right = np.abs(bins[right] - times)
+    closer  = d_right < d_left
+    return np.where(closer, right, left), np.where(closer, d_right, d_left)
+
+
+def bin_arrival_times(arrival_times, bins, chunk_size = None):
+    """
+    Assigns the photons to the nearest of a grid of bins.
+
+    Each distinct arrival time is assigned to its nearest bin, and the bin is
+    set to the number of photons arriving at that time. If several distinct
+    times share a bin the last of them sets it.
+
+    Parameters
+    ----------
+    arrival_times : array_like
+        The sorted photon arrival times. May be a memory-mapped array.
+    bins : array_like
+        The sorted times of the bins.
+    chunk_size : int, optional
+        The number of photons to read at a time. By default all of them.
+
+    Returns
+    -------
+    tuple
+        The counts of each bin, and the distance from each distinct arrival
+        time to its bin.
+
+    """
+    bins       = np.asarray(bins)
+    new_counts = np.zeros(len(bins))
+    difference = []
+    if chunk_size is None:
+        chunk_size = max(len(arrival_times), 1)
+    last_time, last_count = None, 0
+    for i in range(0, len(arrival_times), chunk_size):
+        unique, counts = np.unique(arrival_times[i:i + chunk_size],
+                                   return_counts = True)
+        # photons at the same time may span two chunks
+        if unique[0] == last_time:
+            counts[0] += last_count
+            difference[-1] = difference[-1][:-1]
+        idx, diff = _nearest_bins(bins, unique)
+        # the distinct times are sorted, so the last to reach each bin is
+        # the last of each run of equal indices
+        last = np.append(idx[1:] != idx[:-1], True)
+        new_counts[idx[last]] = counts[last]
+        difference.append(diff)
+        last_time, last_count = unique[-1], counts[-1]
+    if len(difference) == 0:
+        return new_counts, np.zeros(0)
+    return new_counts, np.concatenate(difference)
+
+
 class BATSETTEList(object):
     """docstring for BATSETTEList."""
 
-    def __init__(self, live_detectors = None):
+    def __init__(self, live_detectors = None, chunk_size = None,
+                       cache_root = None, mirror = True, mirror_root = None):
         super(BATSETTEList, self).__init__()
+        # the number of photons binned at a time, see bin_arrival_times
+        self.chunk_size = chunk_size
+        # the interpolated bins are cached here, see ArrayCache
+        self.cache = ArrayCache(cache_root)
         if self.verbose:
             print('Analysing BATSE TTE list data')
 
         fetch = GetBATSEBurst(trigger = self.trigger, datatype = self.datatype)
-        with fits.open(fetch.path) as hdu_list:
-            self._get_energy_bin_edges(hdu_list[1].data)
-            count_data  = hdu_list[2].data
+        self._source_path = fetch.path
+        # the columns of the mirror are memory-mapped, see FITSMirror, or
+        # read directly from the FITS file if mirror is False
+        tables = open_tables(fetch.path, mirror, mirror_root)
+        self._get_energy_bin_edges(tables.column(tables.names(1)[3], hdu = 1))
+        det, num_phots, a1, a2, photons, channels = [
+                tables.column(name, hdu = 2) for name in tables.names(2)]
 
         self.detectors    = np.arange(8)
         self.det_count    = np.zeros( 8)
         self.photon_list  = []
         self.channel_list = []
         for i in range(8):
-            det, num_phots, a1, a2, photons, channels = count_data[i]
-            self.det_count[i] = num_phots
-            self.photon_list.append(photons)
-            self.channel_list.append(channels)
+            self.det_count[i] = num_phots[i]
+            self.photon_list.append(photons[i])
+            self.channel_list.append(channels[i])
 
         if live_detectors is not None:
             self.live_detectors = live_detectors
@@ -46,6 +159,10 @@ class BATSETTEList(object):
             print('Analysis running over all 8 detectors.')
             print('Would you rather analyse only the triggered detectors?')
 
+        # the photons of the live detectors, sorted by arrival time
+        self.photons = merge_photon_lists(  self.photon_list,
+                                            self.channel_list,
+                                            self.live_detectors)
         self.channel_1_times = self._sum_detectors(1)
         self.channel_2_times = self._sum_detectors(2)
         self.channel_3_times = self._sum_detectors(3)
@@ -78,11 +195,11 @@ class BATSETTEList(object):
         self.counts[:,2] = ch3_rts
         self.counts[:,3] = ch4_rts
 
-    def _get_energy_bin_edges(self, energy_data):
+    def _get_energy_bin_edges(self, energy_edges):
         ### 8 detectors x 4 bins => 5 edges
         self.energy_bin_edges = np.zeros((8,5))
-        for i in range(len(energy_data)):
-            self.energy_bin_edges[i,:] = energy_data[i][3]
+        for i in range(len(energy_edges)):
+            self.energy_bin_edges[i,:] = energy_edges[i]
         if self.verbose:
             print('\n\nThe energy bin edges are (keV):')
             E = self.energy_bin_edges
@@ -98,20 +215,16 @@ class BATSETTEList(object):
 
     def _sum_detectors(self, j):
         ''' j indexes channel '''
-        ch_j = np.array([])
-        # sum photons in the same channel and sort by arrival time
-        for k in self.live_detectors:
-            ch_j_det_k = self.photon_list[k][self.channel_list[k] == j]
-            ch_j       = np.sort(np.hstack((ch_j, ch_j_det_k)))
-        return ch_j
+        # the photons of the live detectors in the channel, by arrival time
+        return self.photons['time'][self.photons['channel'] == j]
 
     def _sum_channels(self, channels):
         try:
             channels = np.array(channels, dtype = 'i')
         except:
             pass
-        idx = channels - 1
-        return np.sort(np.hstack(([self.channels[i] for i in idx])))
+        # the photons of the live detectors in the channels, by arrival time
+        return self.photons['time'][np.isin(self.photons['channel'], channels)]
 
     def _get_sampling_rate(self, numbins = 100):
         unique_times  = np.unique(self.channel_x_times)
@@ -132,53 +245,38 @@ class BATSETTEList(object):
             arrival_times = self.channels[int(channel - 1)]
             string        = f'channel_{channel}'
 
-        direc = 'data/BATSE/TTE_list_data/'
-        d_list    = [f'{d}' for d in self.live_detectors]
-        dets      = ''.join(d_list)
-        file_path = f'{string}_d{dets}'
-
-        path = os.path.join(direc, file_path)
-
-        count_str = f'{path}_counts.npy'
-        bin_str   = f'{path}_bins.npy'
-        diff_str  = f'{path}_diff.npy'
-
-        unique, counts = np.unique(arrival_times, return_counts = True)
         sttt,endd = self.channel_x_times[0], self.channel_x_times[-1]
         num_bins  = int( ( endd - sttt )
                         / self.sampling_rate )
 
-        try:
-            self.interpolated_counts = np.load(count_str, allow_pickle = False)
-            self.interpolated_bins   = np.load(bin_str,   allow_pickle = False)
-            difference               = np.load(diff_str,  allow_pickle = False)
-            new_bins = self.interpolated_bins
-            new_counts = self.interpolated_counts
-            print('Loaded previously interpolated data.')
-        except:
-            mkdir(direc)
+        key = self.cache.key(   product       = 'interpolated_bins',
+                                trigger       = self.trigger,
+                                datatype      = self.datatype,
+                                channel       = string,
+                                detectors     = [int(d) for d in
+                                                 self.live_detectors],
+                                start         = float(arrival_times[0]),
+                                sampling_rate = float(self.sampling_rate),
+                                num_bins      = num_bins,
+                                source        = file_hash(self._source_path))
+        cached = self.cache.load(key, ['bins', 'counts', 'diff'])
+        if cached is not None:
+            new_bins   = cached['bins']
+            new_counts = cached['counts']
+            if self.verbose:
+                print('Loaded previously interpolated data.')
+        else:
             print('Interpolating data.')
             new_bins   = np.linspace(arrival_times[0], (arrival_times[0] +
                         (self.sampling_rate * num_bins)), num_bins  )
-            og_bin_no  = len(unique)
-            ## create a counts bin of req. len
-            new_counts = np.zeros(len(new_bins))
-            ## create a zero array of length of original arr
-            difference = np.zeros(og_bin_no)
-            for i in range(og_bin_no):
-                ## find posn of photon in new bins cf old time
-                difference[i] = np.abs(new_bins - unique[i]).min()
-                new_counts[np.abs(new_bins - unique[i]).argmin()] = counts[i]
-            self.interpolated_counts = new_counts
-            self.interpolated_bins   = new_bins
+            new_counts, difference = bin_arrival_times(
+                    arrival_times, new_bins, self.chunk_size)
+            self.cache.save(key, {  'bins'   : new_bins,
+                                    'counts' : new_counts,
+                                    'diff'   : difference})
             print('Finished data interpolation.')
-            print('Saving difference...')
-            np.save(diff_str,  difference, allow_pickle = False)
-            print('Saving new counts...')
-            np.save(count_str, new_counts, allow_pickle = False)
-            print('Saving new bins...')
-            np.save(bin_str,   new_bins,   allow_pickle = False)
-            print('Done !')
+        self.interpolated_counts = new_counts
+        self.interpolated_bins   = new_bins
         return new_bins, new_counts
 
     def _plot_arrival_histogram(self, channel = 'sum', numbins = 100):
@@ -0,0 +1,110 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+# the environment variable which sets the default cache root
+CACHE_ENV = 'PYGRB_CACHE_DIR'
+
+_file_hashes = {}
+
+
+def default_cache_root():
+    """ Returns the cache root set by PYGRB_CACHE_DIR, or ~/.cache/PyGRB. """
+    root = os.environ.get(CACHE_ENV)
+    if root is None:
+        root = os.path.join(os.path.expanduser('~'), '.cache', 'PyGRB')
+    return os.path.abspath(root)
+
+
+def file_hash(path, block_size = 2 ** 20):
+    """
+    Returns the SHA-256 hash of the contents of a file. Hashes are kept for
+    the lifetime of the process while the size and modification time of the
+    file are unchanged.
+    """
+    stat = os.stat(path)
+    tag  = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if tag not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        _file_hashes[tag] = digest.hexdigest()
+    return _file_hashes[tag]
+
+
+class ArrayCache(object):
+    """
+    A content-addressed cache of derived numpy arrays.
+
+    Each entry is keyed on the hash of everything it was derived from, so a
+    change in any input gives a new entry rather than a stale one. An entry
+    is written to a temporary directory and renamed into place, so it is
+    either complete or absent, even with many processes writing to the same
+    cache. The arrays are loaded as read-only memory maps.
+
+    Parameters
+    ----------
+    root : str, optional
+        The cache directory. Defaults to :func:`~default_cache_root`.
+
+    """
+
+    def __init__(self, root = None):
+        super(ArrayCache, self).__init__()
+        if root is None:
+            root = default_cache_root()
+        self.root = os.path.abspath(root)
+
+    @staticmethod
+    def key(**fields):
+        """
+        Returns the key of an entry from the fields it depends on, which
+        should be JSON serialisable. Floats are keyed on their repr, so
+        they must match exactly.
+        """
+        blob = json.dumps(fields, sort_keys = True, default = repr)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def load(self, key, names):
+        """
+        Returns a dictionary of the arrays of an entry, memory-mapped, or
+        None if the entry is not in the cache.
+        """
+        path = self._path(key)
+        try:
+            return {name : np.load(os.path.join(path, f'{name}.npy'),
+                                   mmap_mode = 'r', allow_pickle = False)
+                    for name in names}
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, arrays):
+        """ Writes a dictionary of arrays to the cache as an entry. """
+        path = self._path(key)
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok = True)
+        temp = tempfile.mkdtemp(dir = parent, prefix = '.tmp-')
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(temp, f'{name}.npy'), array,
+                        allow_pickle = False)
+            os.rename(temp, path)
+        except OSError:
+            # another process wrote the entry first
+            if not os.path.isdir(path):
+                raise
+        finally:
+            if os.path.isdir(temp):
+                shutil.rmtree(temp)
+
+
+if __name__ == '__main__':
+    pass
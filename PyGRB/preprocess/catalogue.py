@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from PyGRB.preprocess.cache import ArrayCache, file_hash
+
+T90_COLUMNS = ['trigger_num', 't90', 't90_error', 't90_start']
+
+CATALOGUE_PATH = Path(__file__).parent / '../data/BATSE_4B_catalogue.xls'
+
+# the index of each process, keyed by the cache root
+_T90_indices = {}
+
+
+def _read_T90_excel(path):
+    """
+    Reads the triggers with a T90 from the BATSE 4B catalogue, sorted by
+    trigger.
+    """
+    table = pd.read_excel(path, sheet_name = 'batsegrb', header = 0,
+                          usecols = T90_COLUMNS)
+    # bursts without a T90 have empty cells
+    table = table.dropna().sort_values('trigger_num')
+    return {'trigger_num' : table['trigger_num'].to_numpy(dtype = np.int64),
+            **{name : table[name].to_numpy(dtype = np.float64)
+               for name in T90_COLUMNS[1:]}}
+
+
+def load_T90_index(cache = None):
+    """
+    Returns the T90 index of the BATSE 4B catalogue, a dictionary of the
+    sorted trigger numbers and their t90, t90_error and t90_start.
+
+    The Excel catalogue is only parsed once. The index is cached on disk,
+    see :class:`~PyGRB.preprocess.cache.ArrayCache`, and held in memory
+    for the rest of the process.
+
+    Parameters
+    ----------
+    cache : ArrayCache, optional
+        The on-disk cache of the index.
+
+    """
+    if cache is None:
+        cache = ArrayCache()
+    if cache.root not in _T90_indices:
+        key = cache.key(product = 'T90_index',
+                        source  = file_hash(CATALOGUE_PATH))
+        index = cache.load(key, T90_COLUMNS)
+        if index is None:
+            cache.save(key, _read_T90_excel(CATALOGUE_PATH))
+            index = cache.load(key, T90_COLUMNS)
+        # the index is small, so it is read into memory
+        _T90_indices[cache.root] = {k : np.array(v) for k, v in index.items()}
+    return _T90_indices[cache.root]
+
+
+def lookup_T90(trigger, cache = None):
+    """
+    Returns the t90, t90_error and t90_start of a trigger, by a binary
+    search of the T90 index.
+
+    Raises
+    ------
+    KeyError
+        If the trigger has no T90 in the BATSE 4B catalogue.
+
+    """
+    index = load_T90_index(cache)
+    triggers = index['trigger_num']
+    i = np.searchsorted(triggers, trigger)
+    if i == len(triggers) or triggers[i] != trigger:
+        raise KeyError(trigger)
+    return tuple(float(index[name][i]) for name in T90_COLUMNS[1:])
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,239 @@
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+from astropy.io import fits
+
+# bumped whenever the layout of a mirror changes
+MIRROR_VERSION = 1
+
+
+def mirror_path(path):
+    """
+    Returns the directory of the mirror of a FITS file, which sits next to
+    it, e.g. discsc_bfits_973.fits.gz is mirrored to discsc_bfits_973/.
+    """
+    stem = os.path.basename(path)
+    for extension in ['.gz', '.fits']:
+        if stem.endswith(extension):
+            stem = stem[:-len(extension)]
+    return os.path.join(os.path.dirname(os.path.abspath(path)), stem)
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return {'name'     : os.path.basename(path),
+            'size'     : stat.st_size,
+            'mtime_ns' : stat.st_mtime_ns}
+
+
+def write_mirror(path, root = None):
+    """
+    Converts each table of a FITS file to one .npy file per column, with a
+    JSON header. Variable length array columns are stored flattened, with
+    the offset of each row in a second .npy file. The mirror is written to
+    a temporary directory and renamed into place.
+
+    Parameters
+    ----------
+    path : str
+        The path to the (possibly gzipped) FITS file.
+    root : str, optional
+        The directory of the mirror. Defaults to :func:`~mirror_path`.
+
+    Returns
+    -------
+    dict
+        The header of the mirror.
+
+    """
+    root   = root or mirror_path(path)
+    parent = os.path.dirname(os.path.abspath(root))
+    os.makedirs(parent, exist_ok = True)
+    header = {'version' : MIRROR_VERSION,
+              'source'  : _source_stat(path),
+              'hdus'    : {}}
+    temp = tempfile.mkdtemp(dir = parent, prefix = '.tmp-')
+    try:
+        with fits.open(path) as hdu_list:
+            for i, hdu in enumerate(hdu_list):
+                if not isinstance(hdu, fits.BinTableHDU):
+                    continue
+                columns = []
+                for name in hdu.columns.names:
+                    data = hdu.data[name]
+                    file = os.path.join(temp, f'hdu{i}_{name}')
+                    variable = data.dtype == object
+                    if variable:
+                        rows = [np.asarray(row) for row in data]
+                        offsets = np.cumsum([0] + [len(r) for r in rows])
+                        data = np.concatenate(rows)
+                        np.save(f'{file}.offsets.npy', offsets)
+                    np.save(f'{file}.npy', np.asarray(data, dtype =
+                            data.dtype.newbyteorder('=')),
+                            allow_pickle = False)
+                    columns.append({'name' : name, 'variable' : variable})
+                header['hdus'][str(i)] = {  'name'    : hdu.name,
+                                            'nrows'   : len(hdu.data),
+                                            'columns' : columns}
+        with open(os.path.join(temp, 'header.json'), 'w') as f:
+            json.dump(header, f, indent = 2)
+        if os.path.isdir(root):
+            # the mirror is stale, so it is replaced
+            stale = tempfile.mkdtemp(dir = parent, prefix = '.tmp-')
+            os.rename(root, os.path.join(stale, 'mirror'))
+            shutil.rmtree(stale)
+        os.rename(temp, root)
+    except OSError:
+        # another process wrote the mirror first
+        if not os.path.isdir(root):
+            raise
+    finally:
+        if os.path.isdir(temp):
+            shutil.rmtree(temp)
+    return header
+
+
+class FITSMirror(object):
+    """
+    An uncompressed, columnar mirror of the tables of a FITS file.
+
+    On first access the FITS file is converted with :func:`~write_mirror`.
+    Later accesses read the JSON header and memory-map the columns as they
+    are requested, instead of decompressing the whole file. The mirror is
+    rewritten if the size or modification time of the FITS file change.
+
+    Parameters
+    ----------
+    path : str
+        The path to the (possibly gzipped) FITS file.
+    root : str, optional
+        The directory of the mirror. Defaults to :func:`~mirror_path`.
+
+    """
+
+    def __init__(self, path, root = None):
+        super(FITSMirror, self).__init__()
+        self.path = path
+        self.root = root or mirror_path(path)
+        try:
+            with open(os.path.join(self.root, 'header.json')) as f:
+                self.header = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.header = None
+        if (self.header is None
+                or self.header.get('version') != MIRROR_VERSION
+                or self.header.get('source') != _source_stat(path)):
+            self.header = write_mirror(path, self.root)
+        self._hdus = sorted(int(i) for i in self.header['hdus'])
+
+    def _hdu(self, hdu):
+        """ Returns the header of a table, indexed as in the FITS file. """
+        if hdu < 0:
+            hdu = self._hdus[hdu]
+        return hdu, self.header['hdus'][str(hdu)]
+
+    def names(self, hdu = -1):
+        """ Returns the names of the columns of a table, in order. """
+        return [c['name'] for c in self._hdu(hdu)[1]['columns']]
+
+    def column(self, name, hdu = -1):
+        """
+        Returns a column of a table as a read-only memory map. A variable
+        length array column is returned as a list of the arrays of each row.
+        """
+        hdu, table = self._hdu(hdu)
+        variable = {c['name'] : c['variable'] for c in table['columns']}
+        if name not in variable:
+            raise KeyError(
+                'Input variable `name` is {} when it should be one of '
+                '{}.'.format(name, list(variable)))
+        file = os.path.join(self.root, f'hdu{hdu}_{name}')
+        data = np.load(f'{file}.npy', mmap_mode = 'r', allow_pickle = False)
+        if not variable[name]:
+            return data
+        offsets = np.load(f'{file}.offsets.npy')
+        return [data[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def table(self, hdu = -1):
+        """
+        Returns a table as a record array of its columns, read into memory.
+        The rows of variable length array columns are held as objects.
+        """
+        names   = self.names(hdu)
+        columns = [self.column(name, hdu) for name in names]
+        dtype   = [(name, object) if isinstance(column, list)
+                   else (name, column.dtype, column.shape[1:])
+                   for name, column in zip(names, columns)]
+        table = np.recarray(len(columns[0]) if columns else 0, dtype = dtype)
+        for name, column in zip(names, columns):
+            if isinstance(column, list):
+                for i, row in enumerate(column):
+                    table[name][i] = row
+            else:
+                table[name] = column
+        return table
+
+
+class FITSTables(FITSMirror):
+    """
+    The tables of a FITS file read directly with astropy, with the methods
+    of :class:`~FITSMirror`, for when no mirror should be written. Each
+    column is decompressed and read into memory when requested.
+
+    Parameters
+    ----------
+    path : str
+        The path to the (possibly gzipped) FITS file.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with fits.open(path) as hdu_list:
+            self._names = {i : list(hdu.columns.names)
+                           for i, hdu in enumerate(hdu_list)
+                           if isinstance(hdu, fits.BinTableHDU)}
+        self._hdus = sorted(self._names)
+
+    def _hdu(self, hdu):
+        """ Returns the column names of a table, indexed as in the FITS file. """
+        if hdu < 0:
+            hdu = self._hdus[hdu]
+        return hdu, self._names[hdu]
+
+    def names(self, hdu = -1):
+        """ Returns the names of the columns of a table, in order. """
+        return list(self._hdu(hdu)[1])
+
+    def column(self, name, hdu = -1):
+        """
+        Returns a column of a table as an array. A variable length array
+        column is returned as a list of the arrays of each row.
+        """
+        hdu, names = self._hdu(hdu)
+        if name not in names:
+            raise KeyError(
+                'Input variable `name` is {} when it should be one of '
+                '{}.'.format(name, names))
+        with fits.open(self.path) as hdu_list:
+            data = hdu_list[hdu].data[name]
+            if data.dtype == object:
+                return [np.array(row) for row in data]
+            return np.array(data, dtype = data.dtype.newbyteorder('='))
+
+
+def open_tables(path, mirror = True, root = None):
+    """
+    Returns the tables of a FITS file, as a :class:`~FITSMirror` in root, or
+    read directly from the file as :class:`~FITSTables` if mirror is False.
+    """
+    if mirror:
+        return FITSMirror(path, root)
+    return FITSTables(path)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,187 @@
+import numpy as np
+from astropy.stats import bayesian_blocks
+
+from PyGRB.preprocess.grb import EmptyGRB
+
+
+def _gap_starts(bin_left, bin_right, tolerance):
+    """
+    Returns the indices of the bins which start more than tolerance after
+    the previous bin finishes. Bins are never merged across these gaps.
+    """
+    return np.flatnonzero(bin_left[1:] - bin_right[:-1] > tolerance) + 1
+
+
+def min_count_starts(counts, min_counts):
+    """
+    Groups consecutive bins, in order, until each group holds at least
+    min_counts counts. The last group may hold fewer.
+
+    Parameters
+    ----------
+    counts : array_like
+        The counts of each bin, summed over the channels if 2D.
+    min_counts : float
+        The minimum number of counts in each group.
+
+    Returns
+    -------
+    array
+        The index of the first bin of each group.
+
+    """
+    counts = np.asarray(counts, dtype = float)
+    if counts.ndim > 1:
+        counts = np.sum(counts, axis = 1)
+    if min_counts <= 0:
+        raise ValueError(
+            'Input variable `min_counts` should be positive. '
+            'Is {} when it should be > 0.'.format(min_counts))
+    cumulative = np.cumsum(counts)
+    starts = [0]
+    below  = 0.
+    while True:
+        # the first bin to take the group to min_counts ends it
+        end = np.searchsorted(cumulative, below + min_counts) + 1
+        if end >= len(counts):
+            break
+        starts.append(end)
+        below = cumulative[end - 1]
+    return np.array(starts, dtype = int)
+
+
+def bayesian_block_starts(bin_left, bin_right, counts, p0 = 0.05):
+    """
+    Groups consecutive bins into Bayesian blocks of constant rate, see
+    :func:`astropy.stats.bayesian_blocks`. The cost grows with the square
+    of the number of bins, so very finely binned data should first be
+    grouped with :func:`~min_count_starts`.
+
+    Parameters
+    ----------
+    bin_left : array_like
+        The left edges of the bins.
+    bin_right : array_like
+        The right edges of the bins.
+    counts : array_like
+        The counts of each bin, summed over the channels if 2D.
+    p0 : float, optional
+        The false alarm probability of each change point.
+
+    Returns
+    -------
+    array
+        The index of the first bin of each group.
+
+    """
+    counts = np.asarray(counts, dtype = float)
+    if counts.ndim > 1:
+        counts = np.sum(counts, axis = 1)
+    centres = (np.asarray(bin_left) + np.asarray(bin_right)) / 2.
+    edges = bayesian_blocks(centres, counts, fitness = 'events', p0 = p0)
+    # the change points lie between the centres of neighbouring bins
+    return np.union1d([0], np.searchsorted(centres, edges[1:-1]))
+
+
+def rebin_counts(bin_left, bin_right, counts, starts):
+    """
+    Merges groups of consecutive bins. The counts of each group are the sum
+    of the counts of its bins, so they remain Poisson distributed.
+
+    Parameters
+    ----------
+    bin_left : array_like
+        The left edges of the bins.
+    bin_right : array_like
+        The right edges of the bins.
+    counts : array_like
+        The (n_bins, n_channels) or (n_bins,) array of counts.
+    starts : array_like
+        The index of the first bin of each group, starting with 0.
+
+    Returns
+    -------
+    tuple
+        The (bin_left, bin_right, counts) of the merged bins.
+
+    """
+    starts = np.asarray(starts, dtype = int)
+    ends   = np.append(starts[1:], len(bin_left)) - 1
+    return (np.asarray(bin_left)[starts], np.asarray(bin_right)[ends],
+            np.add.reduceat(counts, starts, axis = 0))
+
+
+def rebin_label(method = 'bayesian_blocks', tolerance = 1e-6, **kwargs):
+    """
+    Returns a short label of the keywords of :func:`~rebin_GRB` for file
+    names, which is the same for keywords giving the same bins, e.g.
+    'BB0.05' for Bayesian blocks with p0 = 0.05, or 'MC20' for groups of at
+    least 20 counts. A tolerance other than the default is appended.
+    """
+    if method == 'bayesian_blocks':
+        label = 'BB{:g}'.format(kwargs.get('p0', 0.05))
+    elif method == 'min_counts':
+        label = 'MC{:g}'.format(kwargs['min_counts'])
+    else:
+        raise ValueError(
+            'Input variable `method` is {} when it should be '
+            '`bayesian_blocks` or `min_counts`.'.format(method))
+    if tolerance != 1e-6:
+        label += 'T{:g}'.format(tolerance)
+    return label
+
+
+def rebin_GRB(GRB, method = 'bayesian_blocks', tolerance = 1e-6, **kwargs):
+    """
+    Rebins a GRB into signal-adaptive bins. Bins are only merged with their
+    neighbours, and never across gaps in the data. The rebinned bins have
+    variable widths, so they should be fit with integrated bins, see
+    :class:`~PyGRB.backend.ratekernel.IntegratedRateKernel`.
+
+    Parameters
+    ----------
+    GRB : EmptyGRB
+        The GRB to rebin.
+    method : str, optional
+        Either 'bayesian_blocks', see :func:`~bayesian_block_starts`, or
+        'min_counts', see :func:`~min_count_starts`.
+    tolerance : float, optional
+        The largest space between two bins that are merged.
+    **kwargs
+        The keywords of the method, p0 or min_counts.
+
+    Returns
+    -------
+    EmptyGRB
+        The rebinned GRB.
+
+    """
+    bin_left, bin_right = GRB.bin_left, GRB.bin_right
+    gaps = np.concatenate([[0], _gap_starts(bin_left, bin_right, tolerance),
+                           [len(bin_left)]])
+    starts = []
+    # each contiguous stretch of the data is rebinned on its own
+    for a, b in zip(gaps[:-1], gaps[1:]):
+        if method == 'bayesian_blocks':
+            found = bayesian_block_starts(bin_left[a:b], bin_right[a:b],
+                                          GRB.counts[a:b], **kwargs)
+        elif method == 'min_counts':
+            found = min_count_starts(GRB.counts[a:b], **kwargs)
+        else:
+            raise ValueError(
+                'Input variable `method` is {} when it should be '
+                '`bayesian_blocks` or `min_counts`.'.format(method))
+        starts.append(a + found)
+    bin_left, bin_right, counts = rebin_counts(bin_left, bin_right,
+                                               GRB.counts,
+                                               np.concatenate(starts))
+    return EmptyGRB(bin_left, bin_right, counts,
+                    burst     = GRB.burst,
+                    colours   = GRB.colours,
+                    clabels   = GRB.clabels,
+                    datatype  = GRB.datatype,
+                    satellite = GRB.satellite)
+
+
+if __name__ == '__main__':
+    pass
@@ -85,5 +85,19 @@ class TestMakeKeys(unittest.TestCase):
         for key in key_list:
             self.assertIn(key, keys)
 
+    def test_parameter_table(self):
+        key_object   = MakeKeys(count_FREDx = [1, 2],
+                                count_sg  = [2],
+                                lens = True,
+                                channel = 2)
+        table = key_object.parameter_table
+        self.assertEqual([row.key for row in table], key_object.keys)
+        self.assertEqual(table[0], ('time_delay', 'time_delay', None, None))
+        self.assertEqual(table[2], ('background_c', 'background', None, 'c'))
+        for row in table[3:]:
+            self.assertEqual(row.key, f'{row.family}_{row.pulse}_c')
+        self.assertIn(('nu_2_c', 'nu', 2, 'c'), table)
+        self.assertIn(('sg_lambda_2_c', 'sg_lambda', 2, 'c'), table)
+
 if __name__ == '__main__':
     unittest.main()
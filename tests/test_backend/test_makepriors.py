@@ -1,4 +1,6 @@
+import pickle
 import unittest
+import numpy as np
 
 from bilby.core.prior       import PriorDict        as bilbyPriorDict
 from bilby.core.prior       import Uniform          as bilbyUniform
@@ -6,6 +8,7 @@ from bilby.core.prior       import Constraint       as bilbyConstraint
 from bilby.core.prior       import LogUniform       as bilbyLogUniform
 
 from PyGRB.backend.makepriors import MakePriors
+from PyGRB.backend.multipriors import MultiPriors
 
 class TestMakePriors(unittest.TestCase):
 
@@ -215,6 +218,142 @@ class TestMakePriors(unittest.TestCase):
         for key in key_list:
             self.assertIn(key, keys)
 
+    def test_pickle_constraints(self):
+        prior_object = MakePriors(  self.priors_pulse_start,
+                                    self.priors_pulse_end,
+                                    count_FRED  = [1, 2, 3],
+                                    count_FREDx = self.FREDx_pulses,
+                                    count_sg  = [1, 3],
+                                    count_bes = self.residuals_bes,
+                                    lens = self.lens,
+                                    channel = self.channel)
+        priors = pickle.loads(pickle.dumps(prior_object.priors))
+        sample = priors.sample(100)
+        for i in range(100):
+            self.assertTrue(sample['start_1_a'][i] <= sample['start_2_a'][i])
+            self.assertTrue(sample['start_2_a'][i] <= sample['start_3_a'][i])
+            self.assertTrue(
+                sample['res_begin_1_a'][i] <= sample['res_begin_3_a'][i])
+
+    def test_multi_channel_constraints(self):
+        ''' The joint constraints of channels other than the first. '''
+        prior_object = MultiPriors( self.priors_pulse_start,
+                                    self.priors_pulse_end,
+                                    count_FRED  = [1, 2, 3],
+                                    count_sg  = [1, 3],
+                                    lens = self.lens,
+                                    channels = [1, 3])
+        priors = pickle.loads(pickle.dumps(prior_object.priors))
+        sample = priors.sample(100)
+        self.assertNotIn('start_1_a', sample)
+        for c in ['b', 'd']:
+            for i in range(100):
+                self.assertTrue(
+                    sample[f'start_1_{c}'][i] <= sample[f'start_2_{c}'][i])
+                self.assertTrue(
+                    sample[f'start_2_{c}'][i] <= sample[f'start_3_{c}'][i])
+                self.assertTrue(
+                    sample[f'res_begin_1_{c}'][i] <= sample[f'res_begin_3_{c}'][i])
+
+    def test_ordered_rescale(self):
+        ''' The starts are rescaled to order statistics, the rest by key. '''
+        prior_object = MakePriors(  self.priors_pulse_start,
+                                    self.priors_pulse_end,
+                                    count_FRED  = [1, 2, 3, 4, 5],
+                                    count_sg  = [1, 3],
+                                    lens = True,
+                                    priors_td_lo = self.priors_td_lo,
+                                    priors_td_hi = self.priors_td_hi,
+                                    channel = self.channel)
+        priors = prior_object.priors
+        keys   = prior_object.keys
+        starts = [f'start_{i}_a' for i in range(1, 6)]
+        cube   = np.random.uniform(size = (len(keys), 10000))
+        values = dict(zip(keys, priors.rescale(keys, cube)))
+        self.assertTrue(np.all(np.diff([values[k] for k in starts],
+                                       axis = 0) >= 0))
+        self.assertTrue(np.all(values['res_begin_1_a'] <= values['res_begin_3_a']))
+        # the expected order statistics of 5 uniform draws
+        np.testing.assert_allclose([np.mean(values[k]) for k in starts],
+                                   np.arange(1, 6) / 6, atol = 0.01)
+        for key, u in zip(keys, cube):
+            if key not in starts and 'res_begin' not in key:
+                np.testing.assert_allclose(values[key], priors[key].rescale(u))
+        point = priors.rescale(keys, cube[:, 0])
+        self.assertIsInstance(point, list)
+        np.testing.assert_allclose(point, [values[k][0] for k in keys])
+        sample = priors.sample(100)
+        self.assertTrue(np.all(priors.evaluate_constraints(sample)))
+        # the ordered densities are normalised
+        independent = np.sum([priors[k].ln_prob(sample[k][0]) for k in keys])
+        self.assertAlmostEqual(
+            priors.ln_prob({k : sample[k][0] for k in keys}),
+            independent + np.log(120) + np.log(2))
+
+    def test_shared_residual_start(self):
+        ''' Residuals of one pulse share an unordered res_begin key. '''
+        for count_sg, count_bes in [([1], [1]), ([1, 1], [])]:
+            prior_object = MakePriors(  self.priors_pulse_start,
+                                        self.priors_pulse_end,
+                                        count_FRED = [1],
+                                        count_sg  = count_sg,
+                                        count_bes = count_bes,
+                                        lens = self.lens,
+                                        channel = self.channel)
+            priors = prior_object.priors
+            self.assertEqual(priors.ordered_keys, [])
+            keys   = list(dict.fromkeys(prior_object.keys))
+            cube   = np.random.uniform(size = (len(keys), 10000))
+            values = dict(zip(keys, priors.rescale(keys, cube)))
+            self.assertAlmostEqual(np.mean(values['res_begin_1_a']), 0.5,
+                                   delta = 0.02)
+            point = {k : values[k][0] for k in keys}
+            self.assertAlmostEqual(priors.ln_prob(point),
+                            np.sum([priors[k].ln_prob(point[k]) for k in keys]))
+
+    def test_ordered_overwrite(self):
+        ''' Starts with different priors are left to the constraints. '''
+        prior_object = MakePriors(  self.priors_pulse_start,
+                                    self.priors_pulse_end,
+                                    count_FRED  = [1, 2, 3],
+                                    lens = self.lens,
+                                    channel = self.channel)
+        priors = prior_object.priors
+        priors['start_2_a'] = bilbyUniform(0.2, 0.8)
+        keys   = prior_object.keys
+        cube   = np.random.uniform(size = len(keys))
+        np.testing.assert_allclose(priors.rescale(keys, cube),
+                                   [priors[k].rescale(u)
+                                    for k, u in zip(keys, cube)])
+        sample = priors.sample(100)
+        self.assertTrue(np.all(sample['start_1_a'] <= sample['start_2_a']))
+        self.assertTrue(np.all(sample['start_2_a'] <= sample['start_3_a']))
+
+    def test_prior_families(self):
+        ''' Each key has the prior of its family, with its bounds. '''
+        prior_object = MakePriors(  self.priors_pulse_start,
+                                    self.priors_pulse_end,
+                                    count_FREDx = [1, 2],
+                                    count_bes = [2],
+                                    lens = True,
+                                    priors_td_lo = self.priors_td_lo,
+                                    priors_td_hi = self.priors_td_hi,
+                                    priors_nu_min = 0.5,
+                                    priors_nu_max = 5.,
+                                    channel = 1)
+        priors = prior_object.priors
+        for key in ['nu_1_b', 'nu_2_b']:
+            self.assertIsInstance(priors[key], bilbyLogUniform)
+            self.assertEqual((priors[key].minimum, priors[key].maximum),
+                             (0.5, 5.))
+        self.assertEqual(priors['nu_2_b'].latex_label, '$\\nu_2 b$')
+        self.assertEqual(priors['time_delay'].maximum, self.priors_td_hi)
+        self.assertIsInstance(priors['bes_Omega_2_b'], bilbyLogUniform)
+        self.assertEqual(priors['bes_Omega_2_b'].maximum, 1e3)
+        self.assertIsInstance(priors['constraint_2_b'], bilbyConstraint)
+        with self.assertRaises(Exception):
+            prior_object._make_prior('banana_1_b', 'banana', 1, 'b')
+
     def test_bad_key(self):
         key = 'banana'
         prior_object = MakePriors(  self.priors_pulse_start,
@@ -3,8 +3,13 @@ import unittest
 
 from scipy.special import gammaln
 
+from bilby.core.likelihood import JointLikelihood
+
 from PyGRB.backend.makepriors import MakePriors
-from PyGRB.backend.rateclass  import PoissonRate
+from PyGRB.backend.multipriors import MultiPriors
+from PyGRB.backend.rateclass  import (PoissonRate, UnbinnedPoissonRate,
+                                      MultiChannelPoissonRate)
+from PyGRB.backend.rate_functions import FRED_pulse
 
 
 
@@ -95,6 +100,165 @@ class TestPoissonRate(unittest.TestCase):
         for key in priors:
             self.assertIn(key, prior_keys)
 
+    def test_log_likelihood(self):
+        ''' Tests the cached data terms against the full Poisson sum. '''
+        parameters = dict(  background_a = 2., start_1_a = 20.,
+                            scale_1_a = 30., tau_1_a = 10., xi_1_a = 1.)
+        y_zeros = np.random.poisson(2., size = 100)
+        y_zeros[:10] = 0
+        for y in [np.random.poisson(50., size = 100), y_zeros]:
+            rates_object = PoissonRate( x = self.x, y = y,
+                                        count_FRED = [1],
+                                        lens = self.lens,
+                                        channel = self.channel)
+            rates_object.parameters.update(parameters)
+            rate = FRED_pulse(self.x, 20., 30., 10., 1.) + 2.
+            ll = np.sum(-rate + y * np.log(rate) - gammaln(y + 1))
+            self.assertAlmostEqual(rates_object.log_likelihood(), ll)
+            # the workspace is reused between calls
+            self.assertAlmostEqual(rates_object.log_likelihood(), ll)
+
+    def test_integrated_bins(self):
+        ''' Tests the likelihood of integrated bins against the counts. '''
+        parameters = dict(  background_a = 2., start_1_a = 20.,
+                            scale_1_a = 30., tau_1_a = 10., xi_1_a = 1.)
+        y = np.random.poisson(50., size = 100)
+        rates_object = PoissonRate( x = self.x, y = y, count_FRED = [1],
+                                    lens = self.lens, channel = self.channel,
+                                    bin_right = self.x + 1., n_nodes = 16)
+        rates_object.parameters.update(parameters)
+        times = np.linspace(0, 100, 100001)
+        fine  = FRED_pulse(times, 20., 30., 10., 1.) + 2.
+        rate  = np.array([np.trapz(fine[i * 1000:(i + 1) * 1000 + 1],
+                                   times[i * 1000:(i + 1) * 1000 + 1])
+                          for i in range(100)])
+        ll = np.sum(-rate + y * np.log(rate) - gammaln(y + 1))
+        self.assertAlmostEqual(rates_object.log_likelihood() / ll, 1.)
+
+    def test_unbinned(self):
+        ''' Tests the unbinned likelihood against very fine bins. '''
+        times = np.sort(np.random.uniform(0, 100, 2000))
+        kwargs = dict(count_FRED = [1], lens = self.lens,
+                      channel = self.channel)
+        unbinned = UnbinnedPoissonRate(times, lower = 0., upper = 100.,
+                                       bin_width = 0.1, **kwargs)
+        log_object = UnbinnedPoissonRate(times, lower = 0., upper = 100.,
+                                         bin_width = 0.1, log_space = True,
+                                         **kwargs)
+        # at most one photon in each bin of 1e-4
+        edges = np.arange(0, 100, 1e-4)
+        y = np.bincount(np.floor(times * 1e4).astype(int),
+                        minlength = len(edges))
+        binned = PoissonRate(x = edges + 5e-5, y = y, **kwargs)
+        ll, expected = [], []
+        for tau in [10., 20.]:
+            parameters = dict(  background_a = 2., start_1_a = 20.,
+                                scale_1_a = 30., tau_1_a = tau, xi_1_a = 1.)
+            unbinned.parameters.update(parameters)
+            log_object.parameters.update(parameters)
+            ll.append(unbinned.log_likelihood())
+            self.assertAlmostEqual(log_object.log_likelihood() / ll[-1], 1.)
+            # the rate per bin of 1e-4 from the rate per bin_width
+            for key in ['background_a', 'scale_1_a']:
+                parameters[key] *= 1e-3
+            binned.parameters.update(parameters)
+            expected.append(binned.log_likelihood())
+        # the likelihoods differ by the log of the bin width for each photon
+        self.assertAlmostEqual((ll[0] - ll[1]) / (expected[0] - expected[1]),
+                               1., places = 5)
+        self.assertAlmostEqual((ll[0] + 2000 * np.log(1e-4)) / expected[0],
+                               1., places = 3)
+
+    def test_unbinned_unsorted(self):
+        with self.assertRaises(ValueError):
+            UnbinnedPoissonRate(np.array([2., 1.]), count_FRED = [1],
+                                lens = self.lens, channel = self.channel)
+
+    def test_log_space(self):
+        ''' Tests the log-rate likelihood against the rate likelihood. '''
+        prior_object = MakePriors(  0., 100., count_FRED = [1, 2],
+                                    lens = True, priors_td_lo = 0.,
+                                    priors_td_hi = 50., channel = self.channel)
+        y = np.random.poisson(5., size = 100)
+        y[:10] = 0
+        kwargs = dict(x = self.x, y = y, count_FRED = [1, 2], lens = True,
+                      channel = self.channel)
+        rates_object = PoissonRate(**kwargs)
+        log_object   = PoissonRate(log_space = True, **kwargs)
+        for i in range(20):
+            sample = prior_object.priors.sample()
+            rates_object.parameters.update(sample)
+            log_object.parameters.update(sample)
+            ll = rates_object.log_likelihood()
+            if np.isfinite(ll):
+                self.assertAlmostEqual(log_object.log_likelihood() / ll, 1.)
+
+    def test_log_likelihood_batch(self):
+        ''' Tests the batch log-likelihood against single evaluations. '''
+        prior_object = MakePriors(  0., 100., count_FRED = [1, 2],
+                                    count_sg = [2],
+                                    lens = self.lens, channel = self.channel)
+        y = np.random.poisson(5., size = 100)
+        y[:10] = 0
+        rates_object = PoissonRate( x = self.x, y = y,
+                                    count_FRED = [1, 2], count_sg = [2],
+                                    lens = self.lens, channel = self.channel)
+        samples = [prior_object.priors.sample() for i in range(20)]
+        theta   = np.array([[s[key] for key in rates_object.keys]
+                             for s in samples])
+        expected = []
+        for sample in samples:
+            rates_object.parameters.update(sample)
+            expected.append(rates_object.log_likelihood())
+        for chunk_size in [None, 1, 7]:
+            ll = rates_object.log_likelihood_batch(theta, chunk_size)
+            np.testing.assert_allclose(ll, expected, rtol = 1e-10)
+
+    def test_log_likelihood_batch_columns(self):
+        rates_object = PoissonRate( x = self.x, y = self.y,
+                                    count_FRED = [1],
+                                    lens = self.lens, channel = self.channel)
+        with self.assertRaises(ValueError):
+            rates_object.log_likelihood_batch(np.ones((4, 3)))
+
+    def test_multi_channel(self):
+        ''' Tests the multi-channel likelihood against a joint likelihood. '''
+        channels = [0, 1, 3]
+        model = dict(count_FRED = [1], count_sg = [1], lens = True)
+        prior_object = MultiPriors( 0., 100., priors_td_lo = 0.,
+                                    priors_td_hi = 50., channels = channels,
+                                    **model)
+        y = np.random.poisson(5., size = (100, len(channels)))
+        y[:10, 1] = 0
+        for kwargs in [{}, dict(log_space = True),
+                       dict(bin_right = self.x + 1., n_nodes = 4)]:
+            multi = MultiChannelPoissonRate(self.x, y, channels,
+                                            **kwargs, **model)
+            joint = JointLikelihood(*[PoissonRate(self.x, y[:, i], c,
+                                                  **kwargs, **model)
+                                      for i, c in enumerate(channels)])
+            self.assertEqual(sorted(multi.keys), sorted(joint.parameters))
+            samples = [prior_object.priors.sample() for i in range(20)]
+            ll, expected = [], []
+            for sample in samples:
+                multi.parameters.update(sample)
+                joint.parameters.update(sample)
+                ll.append(multi.log_likelihood())
+                expected.append(joint.log_likelihood())
+            np.testing.assert_allclose(ll, expected, rtol = 1e-8)
+            if 'log_space' not in kwargs:
+                theta = np.array([[s[key] for key in multi.keys]
+                                  for s in samples])
+                for chunk_size in [None, 7]:
+                    np.testing.assert_allclose(
+                        multi.log_likelihood_batch(theta, chunk_size),
+                        expected, rtol = 1e-10)
+
+    def test_multi_channel_shape(self):
+        with self.assertRaises(ValueError):
+            MultiChannelPoissonRate(self.x, np.ones((100, 2)), [0, 1, 2],
+                                    count_FRED = [1], lens = self.lens)
+
     # def test_known_FRED_pulse(self):
     #     ''' this is a bad test. '''
     #     self.parameters = dict([ ('start', 5),
@@ -88,10 +88,22 @@ class TestGaussianPulse(unittest.TestCase):
     def test_convolution_gaussian(self):
         y = convolution_gaussian(self.times, self.start, self.scale,
                                  self.sigma, self.tau)
-        expected = np.array([0.1408575,  0.53048148, 1.39662887, 2.72520552,
-        3.9816915, 4.39531788, 3.71217365, 2.44340352, 1.28690833, 0.56161562])
+        expected = np.array([0.32027417, 0.95246984, 2.11834251, 3.54089784,
+        4.47953447, 4.33207252, 3.24944228, 1.93086089, 0.93669363, 0.38626557])
         assert_allclose(y, expected, rtol=1e-7)
 
+    def test_convolution_gaussian_limits(self):
+        # the erfc(x) branches meet smoothly, and a short decay leaves the
+        # gaussian pulse
+        times = np.linspace(-20, 40, 6001)
+        y = convolution_gaussian(times, self.start, self.scale, 1e-2, 3.)
+        assert_(np.all(np.isfinite(y)))
+        assert_(np.all(np.abs(np.diff(y)) < 0.1 * self.scale))
+        assert_allclose(convolution_gaussian(times, self.start, self.scale,
+                                             self.sigma, 1e-6),
+                        gaussian_pulse(times, self.start, self.scale,
+                                       self.sigma), atol=1e-5)
+
     def test_height_convolution_gaussian(self):
         y = convolution_gaussian(self.times, self.start, self.scale,
                                  self.sigma, self.tau)
@@ -110,5 +122,154 @@ class TestGaussianPulse(unittest.TestCase):
                           self.tau, self.omega, self.phi)
         assert(np.max(y) <= self.scale)
 
+    def test_out(self):
+        args = {gaussian_pulse : (self.start, self.scale, self.sigma),
+                FRED_pulse     : (self.start, self.scale, self.tau, self.xi),
+                FREDx_pulse    : (self.start, self.scale, self.tau, self.xi,
+                                  self.gamma, self.nu),
+                sine_gaussian  : (self.start, self.scale, self.tau,
+                                  self.omega, self.phi),
+                convolution_gaussian : (self.start, self.scale, self.sigma,
+                                        self.tau)}
+        for pulse, a in args.items():
+            out = np.empty(len(self.times))
+            y = pulse(self.times, *a, out = out)
+            assert_(y is out)
+            assert_equal(y, pulse(self.times, *a))
+            if pulse is not gaussian_pulse:
+                work = np.empty(len(self.times))
+                assert_equal(pulse(self.times, *a, out = out, work = work),
+                             pulse(self.times, *a))
+
+    def test_out_broadcast(self):
+        start = np.array([[self.start], [self.start + 1]])
+        out   = np.empty((2, len(self.times)))
+        y = FRED_pulse(self.times, start, self.scale, self.tau, self.xi,
+                       out = out)
+        for i in range(2):
+            assert_equal(y[i], FRED_pulse(self.times, start[i, 0], self.scale,
+                                          self.tau, self.xi))
+
+    def test_support_windows(self):
+        times = np.linspace(-20, 40, 60001)
+        rtol  = 1e-6
+        pairs = [(gaussian_pulse, gaussian_window,
+                  (self.start, self.scale, self.sigma)),
+                 (FRED_pulse, FRED_window,
+                  (self.start, self.scale, self.tau, self.xi)),
+                 (FREDx_pulse, FREDx_window,
+                  (self.start, self.scale, self.tau, self.xi,
+                   self.gamma, self.nu)),
+                 (sine_gaussian, sine_gaussian_window,
+                  (self.start, self.scale, self.tau, self.omega, self.phi)),
+                 (convolution_gaussian, convolution_gaussian_window,
+                  (self.start, self.scale, self.sigma, self.tau))]
+        for pulse, window, args in pairs:
+            lo, hi = window(*args, rtol = rtol)
+            assert_(lo < hi)
+            outside = (times < lo) | (times > hi)
+            y = np.abs(pulse(times, *args))
+            assert_(np.all(y[outside] <= rtol * self.scale * (1 + 1e-9)))
+            if pulse in [gaussian_pulse, FRED_pulse]:
+                # the windows of these pulses are exact
+                edges = np.array([lo, hi])
+                assert_allclose(pulse(edges, *args), rtol * self.scale,
+                                rtol = 1e-6)
+
+    def test_log_pulses(self):
+        pairs = [(gaussian_pulse, log_gaussian_pulse,
+                  (self.start, self.scale, self.sigma)),
+                 (FRED_pulse, log_FRED_pulse,
+                  (self.start, self.scale, self.tau, self.xi)),
+                 (FRED_pulse_unnorm, log_FRED_pulse_unnorm,
+                  (self.start, self.scale, self.tau, self.xi)),
+                 (FREDx_pulse, log_FREDx_pulse,
+                  (self.start, self.scale, self.tau, self.xi,
+                   self.gamma, self.nu)),
+                 (FREDx_pulse_unnorm, log_FREDx_pulse_unnorm,
+                  (self.start, self.scale, self.tau, self.xi,
+                   self.gamma, self.nu)),
+                 (convolution_gaussian, log_convolution_gaussian,
+                  (self.start, self.scale, self.sigma, self.tau))]
+        after = self.times > self.start
+        for pulse, log_pulse, args in pairs:
+            y = log_pulse(self.times, *args)
+            assert_allclose(y[after], np.log(pulse(self.times, *args))[after],
+                            rtol=1e-7)
+            if pulse in [gaussian_pulse, convolution_gaussian]:
+                assert_allclose(y, np.log(pulse(self.times, *args)),
+                                rtol=1e-7)
+            else:
+                assert_equal(y[~after], - np.inf)
+
+    def test_log_FRED_pulse_tail(self):
+        # the rate underflows far into the tail but the log-rate does not
+        times = self.times * 1e3
+        y = log_FRED_pulse(times, self.start, self.scale, self.tau, self.xi)
+        assert_(np.all(np.isfinite(y[1:])))
+        assert_allclose(y[-1], np.log(self.scale) - self.xi * (
+                        (times[-1] - self.start - 1) ** 2
+                        / (times[-1] - self.start)), rtol=1e-12)
+
+    def test_log_convolution_gaussian_tails(self):
+        # the rate underflows in both tails but the log-rate does not, it
+        # follows the gaussian in the rise and the exponential in the decay
+        times = np.array([-100., 1e3, 1e3 + 1])
+        y = log_convolution_gaussian(times, self.start, self.scale,
+                                     self.sigma, self.tau)
+        assert_(np.all(np.isfinite(y)))
+        assert_allclose(y[0], log_gaussian_pulse(times[0], self.start,
+                                                 self.scale, self.sigma),
+                        rtol=1e-2)
+        assert_allclose(y[2] - y[1], - 1. / self.tau, rtol=1e-9)
+
+    def test_pulse_integrals(self):
+        times = np.linspace(-20, 60, 800001)
+        for lower, upper in [(-20., 60.), (5., 7.), (-20., 1.), (9., 60.)]:
+            mask = (times >= lower) & (times <= upper)
+            y = gaussian_pulse(times, self.start, self.scale, self.sigma)
+            assert_allclose(gaussian_integral(lower, upper, self.start,
+                                              self.scale, self.sigma),
+                            np.trapz(y[mask], times[mask]), rtol=1e-8)
+            y = convolution_gaussian(times, self.start, self.scale,
+                                     self.sigma, self.tau)
+            assert_allclose(convolution_gaussian_integral(lower, upper,
+                                self.start, self.scale, self.sigma, self.tau),
+                            np.trapz(y[mask], times[mask]), rtol=1e-8)
+        # the upper tail does not cancel
+        assert_allclose(gaussian_integral(30., 40., 0., 1., 1.),
+                        gaussian_integral(-40., -30., 0., 1., 1.), rtol=1e-12)
+        self.assertGreater(gaussian_integral(30., 40., 0., 1., 1.), 0.)
+        y = FRED_pulse(times, self.start, self.scale, self.tau, 0.5)
+        assert_allclose(FRED_integral(self.start, self.scale, self.tau, 0.5),
+                        np.trapz(y, times), rtol=1e-8)
+
+    def test_log_FREDx_pulse_steep(self):
+        # the terms of the exponent are ~ 1e15 but the peak is still the scale
+        times = self.start + self.tau * np.array([0.5, 1. - 1e-6, 1., 2.])
+        y = log_FREDx_pulse(times, self.start, self.scale, self.tau,
+                            10., 15., 15.)
+        assert_(np.all(y <= np.log(self.scale)))
+        assert_allclose(y[2], np.log(self.scale), rtol=1e-12)
+        assert_allclose(y[1], np.log(self.scale) - 225e15 * 1e-12, rtol=1e-3)
+        assert_equal(log_FREDx_pulse(times, self.start, self.scale, self.tau,
+                                     1e3, 300., 300.), - np.inf)
+
+    def test_log_FREDx_pulse_tails(self):
+        # the normalisation terms underflow, which must not give nan
+        times = self.start + self.tau * np.logspace(-8, 3, 1001)
+        y = log_FREDx_pulse(times, self.start, self.scale, self.tau,
+                            1e-4, 100., 100.)
+        assert_(not np.any(np.isnan(y)))
+        assert_(np.all(y <= np.log(self.scale)))
+
+    def test_log_FRED_pulse_broadcast(self):
+        start = np.array([[self.start], [self.start + 1]])
+        tau   = np.array([[self.tau], [2 * self.tau]])
+        y = log_FRED_pulse(self.times, start, self.scale, tau, self.xi)
+        for i in range(2):
+            assert_equal(y[i], log_FRED_pulse(self.times, start[i, 0],
+                                              self.scale, tau[i, 0], self.xi))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,344 @@
+import unittest
+import numpy as np
+from unittest import mock
+
+from numpy.testing import assert_allclose, assert_equal
+
+from PyGRB.backend.makepriors import MakePriors
+from PyGRB.backend.makemodels import create_model_from_key
+from PyGRB.backend.rateclass  import PoissonRate
+from PyGRB.backend.ratekernel import (RateKernel, IntegratedRateKernel,
+                                      compile_model, _logaddexp_into)
+
+
+class TestRateKernel(unittest.TestCase):
+
+    def setUp(self):
+        self.priors_pulse_start = 0.0
+        self.priors_pulse_end   = 5.0
+        self.x = np.arange(200) * 0.064
+        self.y = np.ones(200)
+        self.channel = 1
+        self.keys = ['F', 'FF', 'GX', 'FsL', 'XbF', 'GsXL', 'FC']
+
+    def tearDown(self):
+        del self.priors_pulse_start
+        del self.priors_pulse_end
+        del self.x
+        del self.y
+        del self.channel
+        del self.keys
+
+    def _sample(self, model):
+        priors = MakePriors(priors_pulse_start = self.priors_pulse_start,
+                            priors_pulse_end   = self.priors_pulse_end,
+                            priors_td_lo = 0.5, priors_td_hi = 1.0,
+                            channel = self.channel, **model).priors
+        return priors.sample()
+
+    def test_keys(self):
+        for key in self.keys:
+            model  = create_model_from_key(key)
+            kernel = compile_model(self.x, self.channel, model)
+            rates  = PoissonRate(self.x, self.y, self.channel, **model)
+            self.assertEqual(kernel.keys, rates.keys)
+
+    def test_only_active_pulses(self):
+        kernel = compile_model(self.x, self.channel, create_model_from_key('FF'))
+        self.assertEqual(len(kernel.pulses), 1)
+        self.assertEqual(kernel.pulses[0][1].shape, (2, 4))
+
+    def test_rates_match_sum_rates(self):
+        for key in self.keys:
+            model  = create_model_from_key(key)
+            kernel = RateKernel(self.x, self.channel, **model)
+            rates  = PoissonRate(self.x, self.y, self.channel, **model)
+            if model['lens']:
+                rate_function = rates.calculate_rate_lens
+            else:
+                rate_function = rates.calculate_rate
+            for i in range(10):
+                sample   = self._sample(model)
+                expected = rates._sum_rates(self.x, sample, rate_function)
+                assert_allclose(kernel(sample), expected, rtol = 1e-10)
+
+    def test_batch_rates(self):
+        for key in self.keys:
+            model   = create_model_from_key(key)
+            kernel  = compile_model(self.x, self.channel, model)
+            samples = [self._sample(model) for i in range(5)]
+            theta   = np.array([kernel.pack(sample) for sample in samples])
+            rates   = kernel.batch_rates(theta)
+            self.assertEqual(rates.shape, (5, len(self.x)))
+            for i in range(5):
+                assert_allclose(rates[i], kernel.rates(theta[i]), rtol = 1e-10)
+
+    def test_pack_batch(self):
+        model   = create_model_from_key('FsL')
+        kernel  = compile_model(self.x, self.channel, model)
+        samples = [self._sample(model) for i in range(5)]
+        columns = {key : [s[key] for s in samples] for key in kernel.keys}
+        theta   = kernel.pack_batch(columns)
+        for i in range(5):
+            assert_allclose(theta[i], kernel.pack(samples[i]))
+
+    def test_rate_quantiles(self):
+        q = [0.05, 0.5, 0.95]
+        for key in ['FL', 'Fs']:
+            model   = create_model_from_key(key)
+            kernel  = compile_model(self.x, self.channel, model)
+            samples = [self._sample(model) for i in range(50)]
+            samples[0].update(sg_A_1_b = 1e6, sg_lambda_1_b = 1.,
+                              sg_omega_1_b = 5., res_begin_1_b = 2.)
+            theta   = np.array([kernel.pack(sample) for sample in samples])
+            rates   = np.array([kernel.rates(t) for t in theta])
+            expected = np.quantile(rates, q, axis = 0)
+            for chunk_size in [None, 1, 17]:
+                quantiles = kernel.rate_quantiles(theta, q, chunk_size)
+                assert_allclose(quantiles, expected, rtol = 1e-10)
+
+    def test_sketch_quantiles(self):
+        q = [0.05, 0.16, 0.5, 0.84, 0.95]
+        for key in ['FL', 'Fs']:
+            model   = create_model_from_key(key)
+            kernel  = compile_model(self.x, self.channel, model)
+            samples = [self._sample(model) for i in range(200)]
+            samples[0].update(sg_A_1_b = 1e6, sg_lambda_1_b = 1.,
+                              sg_omega_1_b = 5., res_begin_1_b = 2.)
+            theta   = np.array([kernel.pack(sample) for sample in samples])
+            rates   = np.array([kernel.rates(t) for t in theta])
+            # the sketch is accurate to about a grid cell, but between
+            # sparse samples it need not follow the linear interpolation of
+            # np.quantile, so it is bounded by the neighbouring samples
+            tolerance = (rates.max(axis = 0) - rates.min(axis = 0)) / 256
+            lower = np.quantile(rates, q, axis = 0, method = 'lower')
+            upper = np.quantile(rates, q, axis = 0, method = 'higher')
+            for chunk_size in [None, 13]:
+                sketch = kernel.rate_quantiles(theta, q, chunk_size,
+                                               method = 'sketch', n_grid = 256)
+                self.assertTrue(np.all(
+                    sketch >= lower - 2 * tolerance - 1e-12))
+                self.assertTrue(np.all(
+                    sketch <= upper + 2 * tolerance + 1e-12))
+
+    def test_quantile_method(self):
+        kernel = compile_model(self.x, self.channel, create_model_from_key('F'))
+        with self.assertRaises(ValueError):
+            kernel.rate_quantiles(np.ones((2, 5)), [0.5], method = 'banana')
+
+    def test_log_rates(self):
+        # the linear FREDx pulses lose precision for steep pulses
+        for key in ['G', 'FF', 'GF', 'FL', 'GFL', 'FC', 'Fs']:
+            model  = create_model_from_key(key)
+            kernel = compile_model(self.x, self.channel, model)
+            self.assertEqual(kernel.has_log_rates, 's' not in key)
+            for i in range(10):
+                theta = kernel.pack(self._sample(model))
+                with np.errstate(divide = 'ignore'):
+                    expected = np.log(kernel.rates(theta))
+                assert_allclose(kernel.log_rates(theta), expected, rtol = 1e-8)
+
+    def test_logaddexp_into(self):
+        a = np.array([0., - np.inf, - np.inf, 3., - 800., 1e3])
+        b = np.array([0., 2., - np.inf, - np.inf, - 801., - 1e3])
+        expected = np.logaddexp(a, b)
+        self.assertIs(_logaddexp_into(a, b, np.empty(6)), a)
+        assert_allclose(a, expected, rtol = 1e-15)
+
+    def test_rates_out(self):
+        for key in ['FsL', 'XbF', 'GC']:
+            model  = create_model_from_key(key)
+            kernel = compile_model(self.x, self.channel, model)
+            theta  = kernel.pack(self._sample(model))
+            out    = np.empty(len(self.x))
+            rates  = kernel.rates(theta, out = out)
+            self.assertIs(rates, out)
+            assert_equal(rates, kernel.rates(theta))
+            # the scratch arrays of the kernel are never returned
+            self.assertIsNot(kernel.rates(theta), kernel.rates(theta))
+
+    def test_support_rtol(self):
+        x = np.arange(2000) * 0.064
+        for key in ['G', 'FF', 'GX', 'FsL', 'XbF', 'FC']:
+            model  = create_model_from_key(key)
+            kernel = compile_model(x, self.channel, model)
+            sparse = RateKernel(x, self.channel, support_rtol = 1e-12, **model)
+            samples = [self._sample(model) for i in range(5)]
+            theta   = np.array([kernel.pack(sample) for sample in samples])
+            for t in theta:
+                # every pulse is within 1e-12 of its amplitude of the full rate
+                atol = 1e-12 * np.sum(t) * (1 + model['lens'])
+                assert_allclose(sparse.rates(t), kernel.rates(t),
+                                rtol = 1e-10, atol = atol)
+                assert_allclose(np.exp(sparse.log_rates(t)),
+                                np.exp(kernel.log_rates(t)),
+                                rtol = 1e-10, atol = atol)
+            assert_allclose(sparse.batch_rates(theta),
+                            kernel.batch_rates(theta),
+                            rtol = 1e-10, atol = 1e-12 * np.sum(theta) * 2)
+
+    def test_support_rtol_unsorted(self):
+        model = create_model_from_key('F')
+        with self.assertRaises(ValueError):
+            RateKernel(self.x[::-1], self.channel, support_rtol = 1e-6,
+                       **model)
+
+    def test_integrated_rates(self):
+        # variable bins, integrated against a fine grid of point rates
+        edges  = np.concatenate([[0.], np.cumsum(np.linspace(0.02, 0.2, 100))])
+        left, right = edges[:-1], edges[1:]
+        for key in ['G', 'FL', 'XF', 'FC']:
+            model  = create_model_from_key(key)
+            kernel = compile_model(left, self.channel, model,
+                                   bin_right = right, bin_width = 0.064,
+                                   n_nodes = 8)
+            self.assertIsInstance(kernel, IntegratedRateKernel)
+            fine = compile_model(np.linspace(0, edges[-1], 200001),
+                                 self.channel, model)
+            samples = [self._sample(model) for i in range(3)]
+            theta   = np.array([kernel.pack(sample) for sample in samples])
+            # pulses resolved by the nodes of the widest bins
+            for key in kernel.keys:
+                if key.split('_')[0] in ['sigma', 'tau']:
+                    np.maximum(theta[:, kernel.index[key]], 0.5,
+                               out = theta[:, kernel.index[key]])
+                elif key.split('_')[0] in ['xi', 'gamma', 'nu']:
+                    np.clip(theta[:, kernel.index[key]], 0.5, 5.,
+                            out = theta[:, kernel.index[key]])
+            for t in theta:
+                rates = fine.rates(t)
+                cumulative = np.concatenate([[0.], np.cumsum(
+                        (rates[1:] + rates[:-1]) / 2 * np.diff(fine.x))])
+                expected = np.diff(np.interp(edges, fine.x, cumulative))
+                # the quadrature is least accurate over the onset of a pulse
+                assert_allclose(kernel.rates(t), expected / 0.064,
+                                rtol = 2e-3, atol = 1e-6 * np.max(expected))
+                # an explicit x gives point rates
+                assert_allclose(kernel.rates(t, left),
+                                RateKernel(left, self.channel, **model).rates(t))
+            assert_allclose(kernel.batch_rates(theta),
+                            [kernel.rates(t) for t in theta], rtol = 1e-10)
+            for t in theta:
+                with np.errstate(divide = 'ignore'):
+                    expected = np.log(kernel.rates(t))
+                assert_allclose(kernel.log_rates(t), expected, rtol = 1e-8)
+            quantiles = kernel.rate_quantiles(theta, [0.5], chunk_size = 7)
+            assert_allclose(quantiles[0],
+                            np.median(kernel.batch_rates(theta), axis = 0),
+                            rtol = 1e-10)
+
+    def test_integrated_chunks(self):
+        model  = create_model_from_key('Fs')
+        kernel = IntegratedRateKernel(self.x, self.channel,
+                                      bin_right = self.x + 0.064, **model)
+        self.assertEqual(kernel.points_per_bin, kernel.n_nodes)
+        samples  = [self._sample(model) for i in range(50)]
+        theta    = np.array([kernel.pack(s) for s in samples])
+        methods  = ['exact', 'sketch']
+        expected = [kernel.rate_quantiles(theta, [0.5], method = method)
+                    for method in methods]
+        negative = kernel._negative_rows(theta)
+        # the rates of a chunk at the nodes are bounded, not those per bin
+        sizes = []
+        summed_rates = kernel._summed_rates
+        def _summed_rates(theta, x = None):
+            rates = summed_rates(theta, x)
+            sizes.append(rates.size)
+            return rates
+        with mock.patch('PyGRB.backend.ratekernel.MAX_BATCH_ELEMENTS', 4000):
+            with mock.patch.object(kernel, '_summed_rates', _summed_rates):
+                for method, quantiles in zip(methods, expected):
+                    assert_allclose(kernel.rate_quantiles(
+                        theta, [0.5], method = method), quantiles)
+                assert_equal(kernel._negative_rows(theta), negative)
+        self.assertLessEqual(max(sizes), 4000)
+
+    def test_sharp_pulses(self):
+        ''' A sharp rise and a pulse narrower than the nodes of its bins. '''
+        edges = np.arange(0., 10.05, 0.1)
+        model = dict(count_FRED = [1], count_FREDx = [2], lens = True)
+        kernel = IntegratedRateKernel(edges[:-1], 0, bin_right = edges[1:],
+                                      bin_width = 0.1, n_nodes = 4, **model)
+        parameters = dict(  background_a = 1., time_delay = 3.03,
+                            magnification_ratio = 0.5,
+                            start_1_a = 1.234, scale_1_a = 100., tau_1_a = 0.05,
+                            xi_1_a = 5., start_2_a = 2.05, scale_2_a = 100.,
+                            tau_2_a = 2., xi_2_a = 5., gamma_2_a = 5.,
+                            nu_2_a = 5.)
+        theta = kernel.pack(parameters)
+        fine  = RateKernel(np.linspace(0., 10., 1000001), 0, **model)
+        rates = fine.rates(theta)
+        cumulative = np.concatenate([[0.], np.cumsum(
+                (rates[1:] + rates[:-1]) / 2 * np.diff(fine.x))])
+        expected = np.diff(np.interp(edges, fine.x, cumulative)) / 0.1
+        assert_allclose(kernel.rates(theta), expected, rtol = 1e-4)
+        assert_allclose(kernel.batch_rates(theta[None])[0], expected,
+                        rtol = 1e-4)
+        assert_allclose(np.exp(kernel.log_rates(theta)), expected, rtol = 1e-4)
+        # a batch of shifted pulses, some in the same bins, and a slice
+        batch = np.repeat(theta[None], 6, axis = 0)
+        batch[:, kernel.index['start_1_a']] += np.arange(6) * 0.037
+        batch[:, kernel.index['start_2_a']] -= np.arange(6) * 0.061
+        rates = np.array([kernel.rates(t) for t in batch])
+        assert_allclose(kernel.batch_rates(batch), rates, rtol = 1e-12)
+        assert_allclose(kernel._bin_rates(batch, slice(13, 57)),
+                        rates[:, 13:57], rtol = 1e-12)
+
+    def test_integral(self):
+        fine = np.linspace(-2., 20., 2200001)
+        for key in ['G', 'FL', 'XF', 'FC', 'Fs']:
+            model  = create_model_from_key(key)
+            kernel = compile_model(fine, self.channel, model)
+            for i in range(3):
+                theta = kernel.pack(self._sample(model))
+                # pulses resolved by the fine grid, which drop to the
+                # background within it
+                for name, i in kernel.index.items():
+                    name = name.rsplit('_', 2)[0]
+                    if name in ['sigma', 'tau', 'sg_lambda']:
+                        theta[i] = np.clip(theta[i], 0.05, 1.)
+                    elif name in ['xi', 'gamma', 'nu']:
+                        theta[i] = np.clip(theta[i], 0.5, 5.)
+                    elif name == 'sg_omega':
+                        theta[i] = 1.
+                    elif name == 'sg_A':
+                        theta[i] = theta[kernel.bg_index] / 2.
+                rates = kernel.rates(theta)
+                for lower, upper in [(-2., 20.), (1., 3.)]:
+                    mask = (fine >= lower) & (fine <= upper)
+                    assert_allclose(kernel.integral(theta, lower, upper),
+                                    np.trapz(rates[mask], fine[mask]),
+                                    rtol = 1e-5)
+
+    def test_integrated_background(self):
+        model  = create_model_from_key('F')
+        right  = self.x + np.where(np.arange(200) % 2, 0.064, 0.032)
+        kernel = IntegratedRateKernel(self.x, self.channel, bin_right = right,
+                                      **model)
+        self.assertEqual(kernel.bin_width, 0.032)
+        theta = kernel.pack(self._sample(model))
+        theta[kernel.index['scale_1_b']] = 0.
+        assert_allclose(kernel.rates(theta),
+                        theta[kernel.bg_index] * (right - self.x) / 0.032)
+        with self.assertRaises(ValueError):
+            IntegratedRateKernel(self.x, self.channel, bin_right = self.x,
+                                 **model)
+
+    def test_negative_rate(self):
+        model  = create_model_from_key('Fs')
+        kernel = compile_model(self.x, self.channel, model)
+        sample = self._sample(model)
+        sample.update(sg_A_1_b = 1e6, sg_lambda_1_b = 1., sg_omega_1_b = 5.,
+                      res_begin_1_b = 2.)
+        sample['background_b'] = 1e-1
+        self.assertTrue(np.all(kernel(sample) == 0))
+        theta = np.array([kernel.pack(s)
+                          for s in [sample, self._sample(model)]])
+        theta[1, kernel.index['sg_A_1_b']] = 0.
+        rates = kernel.batch_rates(theta)
+        assert_equal(kernel._negative_rows(theta), [True, False])
+        assert_equal(rates.max(axis = 1) == 0, [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from numpy.testing import assert_allclose
+
+from bilby.core.sampler import Nestle
+
+from PyGRB.backend.makemodels import create_model_from_key
+from PyGRB.backend.makepriors import MakePriors
+from PyGRB.backend.rateclass  import PoissonRate
+from PyGRB.backend.samplerpool import SamplerPool
+
+
+class TestSamplerPool(unittest.TestCase):
+
+    def setUp(self):
+        model = create_model_from_key('FF')
+        self.x = np.arange(100) * 0.064
+        self.y = np.random.poisson(5, 100)
+        priors = MakePriors(priors_pulse_start = 0.0,
+                            priors_pulse_end   = 5.0,
+                            channel = 0, **model).priors
+        likelihood  = PoissonRate(self.x, self.y, 0, **model)
+        self.outdir = tempfile.mkdtemp()
+        self.sampler = Nestle(likelihood, priors, outdir = self.outdir,
+                              label = 'test_pool')
+        self.pool = SamplerPool(2)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.outdir)
+        del self.x
+        del self.y
+        del self.sampler
+        del self.pool
+
+    def test_serial_map(self):
+        self.assertEqual(self.pool.map(abs, [-1, 2, -3]), [1, 2, 3])
+        self.assertIsNone(self.pool._pool)
+
+    def test_sampler_map(self):
+        u = list(np.random.uniform(size = (10, self.sampler.ndim)))
+        theta = self.pool.map(self.sampler.prior_transform, u)
+        self.assertIsNotNone(self.pool._pool)
+        assert_allclose(theta, [self.sampler.prior_transform(v) for v in u])
+        logl = self.pool.map(self.sampler.log_likelihood, theta)
+        assert_allclose(logl, [self.sampler.log_likelihood(t) for t in theta])
+
+
+if __name__ == '__main__':
+    unittest.main()
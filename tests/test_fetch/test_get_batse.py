@@ -1,7 +1,13 @@
 import os
+import gzip
+import shutil
+import tempfile
+import threading
 import unittest
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 
-from PyGRB.fetch.get_BATSE import GetBATSEBurst
+from PyGRB.fetch.get_BATSE import GetBATSEBurst, fetch_file, fetch_bursts
 
 
 class TestFetchBATSE(unittest.TestCase):
@@ -35,3 +41,96 @@ class TestFetchBATSE(unittest.TestCase):
         assert(os.path.exists(path))
         if delete:
             os.remove(path)
+
+
+class _FlakyHandler(SimpleHTTPRequestHandler):
+    """ Serves files, failing the first request for each. """
+    failed = set()
+
+    def do_GET(self):
+        if self.path not in self.failed:
+            self.failed.add(self.path)
+            self.send_error(503)
+        else:
+            super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFetchBursts(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd    = os.getcwd()
+        self.root   = tempfile.mkdtemp()
+        self.served = os.path.join(self.root, 'served')
+        # a stand-in for the BATSE trigger directory
+        for trigger in [1, 2, 3]:
+            folder = os.path.join(self.served, '00001_00200',
+                                  f'0000{trigger}_burst')
+            os.makedirs(folder)
+            with gzip.open(os.path.join(folder,
+                        f'discsc_bfits_{trigger}.fits.gz'), 'wb') as f:
+                f.write(b'counts' * 1000)
+        with open(os.path.join(folder, 'tte_bfits_3.fits.gz'), 'wb') as f:
+            f.write(b'not a gzip file')
+        _FlakyHandler.failed = set()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(
+                        _FlakyHandler, directory = self.served))
+        threading.Thread(target = self.server.serve_forever,
+                         daemon = True).start()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+        del self.cwd
+        del self.root
+        del self.served
+        del self.server
+        del self.url
+
+    def test_fetch_bursts(self):
+        paths, failed = fetch_bursts([1, 2, 3, 4], ['discsc', 'tte'],
+                                     max_workers = 4, backoff = 0.01,
+                                     base_url = self.url)
+        self.assertEqual(sorted(paths), [(1, 'discsc'), (2, 'discsc'),
+                                         (3, 'discsc')])
+        self.assertIsInstance(failed[(4, 'discsc')], FileNotFoundError)
+        self.assertIsInstance(failed[(3, 'tte')], OSError)
+        for path in paths.values():
+            with gzip.open(path) as f:
+                self.assertEqual(f.read(), b'counts' * 1000)
+        # nothing is left half written
+        self.assertFalse(os.path.exists('data/BATSE/tte/tte_bfits_3.fits.gz'))
+        self.assertEqual(os.listdir('data/BATSE/tte'), [])
+        # a second run skips the downloaded files
+        paths, failed = fetch_bursts([1, 2, 3], 'discsc',
+                                     base_url = 'http://127.0.0.1:1/')
+        self.assertEqual(len(paths), 3)
+        self.assertEqual(failed, {})
+
+    def test_fetch_file_part(self):
+        burst = GetBATSEBurst(1, 'discsc', base_url = self.url,
+                              download = False)
+        with open(f'{burst.path}.part', 'wb') as f:
+            f.write(b'stale')
+        fetch_file(burst.remote, burst.path, backoff = 0.01)
+        with gzip.open(burst.path) as f:
+            self.assertEqual(f.read(), b'counts' * 1000)
+        self.assertFalse(os.path.exists(f'{burst.path}.part'))
+
+    def test_retries(self):
+        burst = GetBATSEBurst(2, 'discsc', base_url = self.url,
+                              download = False)
+        with self.assertRaises(OSError):
+            fetch_file(burst.remote, burst.path, retries = 0)
+        fetch_file(burst.remote, burst.path, retries = 0)
+        self.assertTrue(os.path.exists(burst.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
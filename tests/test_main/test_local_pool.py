@@ -0,0 +1,107 @@
+import os
+import shutil
+import unittest
+import numpy as np
+
+from PyGRB.backend.admin import mkdir
+from PyGRB.backend.makemodels import create_model_from_key
+from PyGRB.backend.rate_functions import FRED_pulse
+from PyGRB.main.fitpulse import PulseFitter
+from PyGRB.preprocess.grb import EmptyGRB
+
+
+class PulseTester(PulseFitter):
+    """ Test class for PulseFitter. """
+
+    def __init__(self, *args, **kwargs):
+        super(PulseTester, self).__init__(*args, **kwargs)
+
+    def _get_base_directory(self):
+        """
+        Sets the directory that code products are made to be /products/ in
+        the folder the script was ran from.
+        """
+        dir = f'test_products/{self.tlabel}_model_comparison_{str(self.nSamples)}'
+        self.base_folder = dir
+        mkdir(dir)
+
+
+class FailingTester(PulseTester):
+    """ Test class whose fits of channel 1 fail. """
+
+    def main_1_channel(self, channel, model):
+        if channel == 1:
+            raise ValueError('Channel 1 fails.')
+        super(FailingTester, self).main_1_channel(channel, model)
+
+
+class TestLocalPool(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        x = np.arange(200) * 0.064
+        counts = np.zeros((200, 4))
+        for i in range(4):
+            counts[:, i] = np.random.poisson(
+                                FRED_pulse(x, 3., 200., 2., 1.5) + 50.)
+        GRB = EmptyGRB( x, x + 0.064, counts, burst = 1,
+                        colours = ['red', 'orange', 'green', 'blue'],
+                        clabels = ['1', '2', '3', '4'],
+                        datatype = 'discsc', satellite = 'test')
+        self.kwargs = dict( times = None, datatype = 'discsc',
+                            nSamples = 51, sampler = 'nestle',
+                            priors_pulse_start = 0, priors_pulse_end = 10,
+                            GRB = GRB, test = True, HPC = True)
+        self.fit = PulseTester(1, **self.kwargs)
+        self.models = [create_model_from_key('F')]
+
+    def tearDown(self):
+        del self.fit
+        del self.kwargs
+        del self.models
+        shutil.rmtree('test_products/0001_model_comparison_51')
+
+    def test_main_local_pool(self):
+        timings = self.fit.main_local_pool(self.models, channels = [0, 1],
+                                           n_processes = 2)
+        self.assertEqual(set(timings), {('F', 0), ('F', 1)})
+        for channel in [0, 1]:
+            path = self.fit._result_file(channel, self.models[0])
+            self.assertTrue(os.path.exists(path))
+        # completed jobs are skipped
+        timings = self.fit.main_local_pool(self.models, channels = [0, 1])
+        self.assertEqual(timings, {})
+
+    def test_rebinned_result_file(self):
+        fit = PulseTester(1, rebin = dict(method = 'min_counts',
+                                          min_counts = 500), **self.kwargs)
+        path = fit._result_file(0, self.models[0])
+        self.assertIn('_F_MC500_IB4_', path)
+        self.assertNotEqual(path, self.fit._result_file(0, self.models[0]))
+
+    def test_integrated_result_file(self):
+        paths = {self.fit._result_file(0, self.models[0])}
+        for n_nodes in [4, 8]:
+            fit = PulseTester(1, integrate_bins = True, n_nodes = n_nodes,
+                              **self.kwargs)
+            path = fit._result_file(0, self.models[0])
+            self.assertIn(f'_F_IB{n_nodes}_', path)
+            paths.add(path)
+        self.assertEqual(len(paths), 3)
+
+    def test_failed_jobs(self):
+        fit = FailingTester(1, **self.kwargs)
+        for n_processes in [1, 2]:
+            with self.assertRaises(RuntimeError) as context:
+                fit.main_local_pool(self.models, channels = [1, 0],
+                                    n_processes = n_processes)
+            self.assertIn('model F channel 1', str(context.exception))
+            self.assertIsInstance(context.exception.__cause__, ValueError)
+            # the other jobs still finish
+            path = fit._result_file(0, self.models[0])
+            self.assertTrue(os.path.exists(path))
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
+from astropy.io import fits
 
-from PyGRB.preprocess.BATSEpreprocess import BATSESignal
+from PyGRB.preprocess.BATSEpreprocess import BATSESignal, _nearest_index
 
 
 class TestBATSESignal(unittest.TestCase):
@@ -72,3 +77,65 @@ class TestBATSESignal(unittest.TestCase):
         with self.assertRaises(Exception):
             BATSESignal(burst,  datatype = 'T90',
                                 times = self.times, bgs = self.bgs)
+
+
+
+class TestBATSESignalWindow(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd  = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        os.chdir(self.root)
+        # a fake discsc file, with 1.024 s bins either side of 64 ms bins
+        edges = np.concatenate([np.arange(-100, 0, 1.024),
+                                np.arange(0, 50, 0.064)[1:],
+                                np.arange(50, 150, 1.024)])
+        times = np.stack([edges[:-1], edges[1:]], axis = 1)
+        rates = np.random.uniform(100, 200, (len(times), 4))
+        table = fits.BinTableHDU.from_columns([
+                    fits.Column(name = 'TIMES',  format = '2D', array = times),
+                    fits.Column(name = 'RATES',  format = '4E', array = rates),
+                    fits.Column(name = 'ERRORS', format = '4E',
+                                array = np.sqrt(rates))])
+        os.makedirs('data/BATSE/discsc')
+        fits.HDUList([fits.PrimaryHDU(), table]).writeto(
+                    'data/BATSE/discsc/discsc_bfits_1.fits.gz')
+        self.kwargs = dict(burst = 1, datatype = 'discsc', bgs = True)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+        del self.cwd
+        del self.root
+        del self.kwargs
+
+    def test_nearest_index(self):
+        bins = np.array([0., 1., 1., 2., 4.])
+        for time in [-1., 0., 0.5, 1., 1.4, 1.5, 1.6, 3., 3.5, 5.]:
+            self.assertEqual(_nearest_index(bins, time),
+                             np.abs(bins - time).argmin())
+
+    def test_window(self):
+        full = BATSESignal(times = 'full', **self.kwargs)
+        for times in [(-2., 10.), (-150., 3.), (20., 200.), (-50., -20.)]:
+            test  = BATSESignal(times = times, **self.kwargs)
+            start = np.abs(full.bin_left - times[0]).argmin()
+            stop  = np.abs(full.bin_left - times[1]).argmin()
+            np.testing.assert_equal(test.bin_left,
+                                    full.bin_left[start:stop])
+            np.testing.assert_equal(test.counts, full.counts[start:stop])
+            np.testing.assert_equal(test.count_bs,
+                                    full.count_bs[start:stop])
+            np.testing.assert_equal(test.background, full.background)
+
+    def test_data(self):
+        full = BATSESignal(times = 'full', **self.kwargs)
+        for mirror in [True, False]:
+            test = BATSESignal(times = (-2., 10.), mirror = mirror,
+                               **self.kwargs)
+            self.assertEqual(test.data.dtype.names,
+                             ('TIMES', 'RATES', 'ERRORS'))
+            np.testing.assert_equal(test.data['TIMES'][:, 0], full.bin_left)
+            np.testing.assert_equal(test.data['TIMES'][:, 1], full.bin_right)
+            np.testing.assert_equal(test.data['ERRORS'], full.errors)
+            self.assertIs(test.data, test.data)
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from PyGRB.preprocess.cache import (ArrayCache, file_hash,
+                                    default_cache_root, CACHE_ENV)
+
+
+class TestArrayCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root   = tempfile.mkdtemp()
+        self.cache  = ArrayCache(self.root)
+        self.arrays = {'bins' : np.arange(10.), 'counts' : np.ones(10)}
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        del self.root
+        del self.cache
+        del self.arrays
+
+    def test_key(self):
+        key = ArrayCache.key(trigger = 3770, sampling_rate = 2e-6)
+        self.assertEqual(key, ArrayCache.key(sampling_rate = 2e-6,
+                                             trigger = 3770))
+        self.assertNotEqual(key, ArrayCache.key(trigger = 3770,
+                                                sampling_rate = 2.1e-6))
+
+    def test_save_load(self):
+        key = ArrayCache.key(trigger = 1)
+        self.assertIsNone(self.cache.load(key, ['bins', 'counts']))
+        self.cache.save(key, self.arrays)
+        loaded = self.cache.load(key, ['bins', 'counts'])
+        for name, array in self.arrays.items():
+            np.testing.assert_equal(loaded[name], array)
+            self.assertIsInstance(loaded[name], np.memmap)
+            self.assertFalse(loaded[name].flags.writeable)
+        # a second writer of the same entry leaves the first in place
+        self.cache.save(key, self.arrays)
+        self.assertEqual(os.listdir(os.path.join(self.root, key[:2])), [key])
+
+    def test_file_hash(self):
+        path = os.path.join(self.root, 'source.fits')
+        with open(path, 'wb') as f:
+            f.write(b'photons')
+        first = file_hash(path)
+        self.assertEqual(first, file_hash(path))
+        with open(path, 'wb') as f:
+            f.write(b'more photons')
+        self.assertNotEqual(first, file_hash(path))
+
+    def test_default_cache_root(self):
+        previous = os.environ.get(CACHE_ENV)
+        os.environ[CACHE_ENV] = self.root
+        try:
+            self.assertEqual(ArrayCache().root, self.root)
+        finally:
+            if previous is None:
+                del os.environ[CACHE_ENV]
+            else:
+                os.environ[CACHE_ENV] = previous
+        self.assertTrue(os.path.isabs(default_cache_root()))
+
+
+if __name__ == '__main__':
+    unittest.main()
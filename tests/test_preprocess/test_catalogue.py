@@ -0,0 +1,48 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from PyGRB.preprocess.cache import ArrayCache
+from PyGRB.preprocess.catalogue import (load_T90_index, lookup_T90,
+                                        CATALOGUE_PATH, T90_COLUMNS)
+
+
+class TestT90Index(unittest.TestCase):
+
+    def setUp(self):
+        self.root  = tempfile.mkdtemp()
+        self.cache = ArrayCache(self.root)
+        self.table = pd.read_excel(CATALOGUE_PATH, sheet_name = 'batsegrb',
+                                   header = 0, usecols = T90_COLUMNS)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        del self.root
+        del self.cache
+        del self.table
+
+    def test_lookup(self):
+        for trigger in [105, 973, 3770, self.table['trigger_num'].iloc[-1]]:
+            row = self.table[self.table['trigger_num'] == trigger]
+            self.assertEqual(lookup_T90(trigger, self.cache),
+                             tuple(float(row[name].iloc[0])
+                                   for name in T90_COLUMNS[1:]))
+
+    def test_no_T90(self):
+        no_T90 = self.table['trigger_num'][self.table['t90'].isna()]
+        for trigger in [1, 142, 10 ** 6, no_T90.iloc[0]]:
+            with self.assertRaises(KeyError):
+                lookup_T90(trigger, self.cache)
+
+    def test_index(self):
+        index = load_T90_index(self.cache)
+        self.assertIs(index, load_T90_index(self.cache))
+        self.assertTrue(np.all(np.diff(index['trigger_num']) > 0))
+        self.assertEqual(len(index['trigger_num']),
+                         self.table['t90'].notna().sum())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from astropy.io import fits
+
+from PyGRB.preprocess.mirror import (FITSMirror, FITSTables, mirror_path,
+                                     open_tables)
+
+
+class TestFITSMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'tte_list_1.fits.gz')
+        self.times   = np.arange(20.).reshape(10, 2)
+        self.photons = [np.sort(np.random.uniform(0, 1, n)) for n in [3, 0, 5]]
+        self._write(self.times)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        del self.root
+        del self.path
+        del self.times
+        del self.photons
+
+    def _write(self, times):
+        fixed = fits.BinTableHDU.from_columns([
+                    fits.Column(name = 'TIMES', format = '2D', array = times),
+                    fits.Column(name = 'RATES', format = 'E',
+                                array = np.ones(len(times)))])
+        variable = fits.BinTableHDU.from_columns([
+                    fits.Column(name = 'DET', format = 'I',
+                                array = np.arange(3)),
+                    fits.Column(name = 'PHOTONS', format = 'PD()',
+                                array = np.array(self.photons, dtype = object))])
+        fits.HDUList([fits.PrimaryHDU(), fixed, variable]).writeto(
+                    self.path, overwrite = True)
+
+    def test_mirror_path(self):
+        self.assertEqual(mirror_path(self.path),
+                         os.path.join(self.root, 'tte_list_1'))
+
+    def test_columns(self):
+        for i in range(2):
+            mirror = FITSMirror(self.path)
+            self.assertEqual(mirror.names(1), ['TIMES', 'RATES'])
+            times = mirror.column('TIMES', hdu = 1)
+            self.assertIsInstance(times, np.memmap)
+            self.assertTrue(times.dtype.isnative)
+            np.testing.assert_equal(times, self.times)
+            photons = mirror.column('PHOTONS')
+            self.assertEqual(len(photons), 3)
+            for row, expected in zip(photons, self.photons):
+                np.testing.assert_equal(row, expected)
+        with self.assertRaises(KeyError):
+            mirror.column('BANANA')
+
+    def test_no_mirror(self):
+        tables = open_tables(self.path, mirror = False)
+        self.assertIsInstance(tables, FITSTables)
+        self.assertFalse(os.path.isdir(mirror_path(self.path)))
+        mirror = open_tables(self.path)
+        for hdu in [1, 2]:
+            self.assertEqual(tables.names(hdu), mirror.names(hdu))
+        times = tables.column('TIMES', hdu = 1)
+        self.assertTrue(times.dtype.isnative)
+        np.testing.assert_equal(times, self.times)
+        for row, expected in zip(tables.column('PHOTONS'), self.photons):
+            np.testing.assert_equal(row, expected)
+        with self.assertRaises(KeyError):
+            tables.column('BANANA')
+
+    def test_table(self):
+        for tables in [FITSMirror(self.path), FITSTables(self.path)]:
+            table = tables.table(1)
+            np.testing.assert_equal(table['TIMES'], self.times)
+            np.testing.assert_equal(table.RATES, np.ones(len(self.times)))
+            photons = tables.table()['PHOTONS']
+            for row, expected in zip(photons, self.photons):
+                np.testing.assert_equal(row, expected)
+
+    def test_stale(self):
+        FITSMirror(self.path)
+        self._write(self.times + 1)
+        # the modification time may not change within the test
+        stat = os.stat(self.path)
+        os.utime(self.path, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        np.testing.assert_equal(FITSMirror(self.path).column('TIMES', hdu = 1),
+                                self.times + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
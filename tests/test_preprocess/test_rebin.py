@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+
+from PyGRB.preprocess.grb import EmptyGRB
+from PyGRB.preprocess.rebin import (min_count_starts, bayesian_block_starts,
+                                    rebin_counts, rebin_GRB, rebin_label)
+
+
+class TestRebin(unittest.TestCase):
+
+    def setUp(self):
+        self.bin_left  = np.arange(1000) * 0.064
+        self.bin_right = self.bin_left + 0.064
+        rate = np.full(1000, 10.)
+        rate[400:500] = 100.
+        self.counts = np.random.poisson(np.stack([rate, rate / 2], axis = 1))
+        self.GRB = EmptyGRB(self.bin_left, self.bin_right, self.counts,
+                            burst = 1, colours = ['r', 'g'],
+                            clabels = ['1', '2'], datatype = 'discsc',
+                            satellite = 'test')
+
+    def tearDown(self):
+        del self.bin_left
+        del self.bin_right
+        del self.counts
+        del self.GRB
+
+    def test_min_count_starts(self):
+        starts = min_count_starts(self.counts, 50)
+        sums   = np.add.reduceat(self.counts.sum(axis = 1), starts)
+        self.assertTrue(np.all(sums[:-1] >= 50))
+        # each group is ended by the first bin to reach min_counts
+        ends = np.append(starts[1:], 1000) - 1
+        self.assertTrue(np.all(sums[:-1] - self.counts.sum(axis = 1)[
+                                                    ends[:-1]] < 50))
+
+    def test_min_count_starts_positive(self):
+        with self.assertRaises(ValueError):
+            min_count_starts(self.counts, 0)
+
+    def test_bayesian_block_starts(self):
+        starts = bayesian_block_starts(self.bin_left, self.bin_right,
+                                       self.counts)
+        self.assertEqual(starts[0], 0)
+        self.assertIn(400, starts)
+        self.assertIn(500, starts)
+        self.assertLess(len(starts), 20)
+
+    def test_rebin_counts(self):
+        left, right, counts = rebin_counts(self.bin_left, self.bin_right,
+                                           self.counts, [0, 3, 10])
+        np.testing.assert_equal(left,  self.bin_left[[0, 3, 10]])
+        np.testing.assert_equal(right, self.bin_right[[2, 9, 999]])
+        np.testing.assert_equal(counts[1], self.counts[3:10].sum(axis = 0))
+
+    def test_rebin_GRB(self):
+        for kwargs in [dict(), dict(method = 'min_counts', min_counts = 100)]:
+            GRB = rebin_GRB(self.GRB, **kwargs)
+            self.assertLess(len(GRB.bin_left), len(self.bin_left))
+            np.testing.assert_equal(GRB.counts.sum(axis = 0),
+                                    self.counts.sum(axis = 0))
+            np.testing.assert_allclose(GRB.bin_left[1:], GRB.bin_right[:-1])
+            self.assertEqual(GRB.clabels, self.GRB.clabels)
+
+    def test_rebin_GRB_gaps(self):
+        bin_left = np.concatenate([self.bin_left[:500],
+                                   self.bin_left[500:] + 1.])
+        GRB = EmptyGRB(bin_left, bin_left + 0.064, self.counts[:, :1])
+        rebinned = rebin_GRB(GRB, method = 'min_counts', min_counts = 1e9)
+        np.testing.assert_equal(rebinned.bin_left,  bin_left[[0, 500]])
+        np.testing.assert_equal(rebinned.bin_right, bin_left[[499, 999]]
+                                                    + 0.064)
+
+    def test_rebin_GRB_method(self):
+        with self.assertRaises(ValueError):
+            rebin_GRB(self.GRB, method = 'banana')
+
+    def test_rebin_label(self):
+        self.assertEqual(rebin_label(), 'BB0.05')
+        self.assertEqual(rebin_label(p0 = 0.05), rebin_label())
+        self.assertEqual(rebin_label(method = 'min_counts', min_counts = 20),
+                         'MC20')
+        self.assertEqual(rebin_label(p0 = 0.01, tolerance = 1e-3),
+                         'BB0.01T0.001')
+        with self.assertRaises(ValueError):
+            rebin_label(method = 'banana')
+
+
+if __name__ == '__main__':
+    unittest.main()
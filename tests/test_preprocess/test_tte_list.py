@@ -1,8 +1,12 @@
 import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
 
 
-from PyGRB.preprocess.GRB_class import BATSEGRB
+from PyGRB.preprocess.GRB_class import (BATSEGRB, bin_arrival_times,
+                                        merge_photon_lists)
 
 
 class TestBATSEGRB(unittest.TestCase):
@@ -18,24 +22,90 @@ class TestBATSEGRB(unittest.TestCase):
     def test_burst_assignment_tte_list(self):
         burst = 3770
         datatype = 'tte_list'
+        cache_root = tempfile.mkdtemp()
+        try:
+            test = BATSEGRB(burst, datatype = datatype,
+                            cache_root = cache_root)
+            test.interpolate_data()
+            # one cache entry for each channel
+            entries = [e for d in os.listdir(cache_root)
+                         for e in os.listdir(os.path.join(cache_root, d))]
+            self.assertEqual(len(entries), 4)
+        finally:
+            shutil.rmtree(cache_root)
 
-        _path = 'data/BATSE/TTE_list_data/'
-        path = f'{_path}channel_{1}_d01234567_{"bins"}.npy'
 
-        if os.path.exists(path):
-            delete = False
-        else:
-            delete = True
+class TestBinArrivalTimes(unittest.TestCase):
 
+    def setUp(self):
+        # arrival times on a 2 us clock with repeated times, and bins 10x
+        # wider so that several distinct times share a bin
+        clock = 2e-6
+        times = np.round(np.random.uniform(0, 0.1, 3000) / clock) * clock
+        self.arrival_times = np.sort(np.concatenate([times, times[:300]]))
+        num_bins  = int((self.arrival_times[-1] - self.arrival_times[0])
+                        / (10 * clock))
+        self.bins = np.linspace(self.arrival_times[0], self.arrival_times[0]
+                                + 10 * clock * num_bins, num_bins)
+
+    def tearDown(self):
+        del self.arrival_times
+        del self.bins
+
+    def test_nearest_bins(self):
+        ''' Tests the binning against a search of every bin. '''
+        unique, counts = np.unique(self.arrival_times, return_counts = True)
+        new_counts = np.zeros(len(self.bins))
+        difference = np.zeros(len(unique))
+        for i in range(len(unique)):
+            difference[i] = np.abs(self.bins - unique[i]).min()
+            new_counts[np.abs(self.bins - unique[i]).argmin()] = counts[i]
+        binned, diff = bin_arrival_times(self.arrival_times, self.bins)
+        np.testing.assert_equal(binned, new_counts)
+        np.testing.assert_equal(diff, difference)
+
+    def test_chunks(self):
+        binned, diff = bin_arrival_times(self.arrival_times, self.bins)
+        for chunk_size in [1, 7, 1000]:
+            chunked = bin_arrival_times(self.arrival_times, self.bins,
+                                        chunk_size)
+            np.testing.assert_equal(chunked[0], binned)
+            np.testing.assert_equal(chunked[1], diff)
+
+
+class TestMergePhotonLists(unittest.TestCase):
+
+    def setUp(self):
+        self.photon_lists  = [np.sort(np.round(np.random.uniform(0, 1, n), 3))
+                              for n in [100, 0, 50, 200]]
+        self.channel_lists = [np.random.randint(1, 5, len(p))
+                              for p in self.photon_lists]
+
+    def tearDown(self):
+        del self.photon_lists
+        del self.channel_lists
 
-        test = BATSEGRB(burst, datatype = datatype)
-        assert(os.path.exists(path))
+    def test_merge(self):
+        detectors = [0, 1, 3]
+        photons = merge_photon_lists(self.photon_lists, self.channel_lists,
+                                     detectors)
+        for j in range(1, 5):
+            expected = np.sort(np.concatenate(
+                [self.photon_lists[k][self.channel_lists[k] == j]
+                 for k in detectors]))
+            np.testing.assert_equal(
+                photons['time'][photons['channel'] == j], expected)
+        for k in detectors:
+            mask = photons['detector'] == k
+            np.testing.assert_equal(photons['time'][mask],
+                                    self.photon_lists[k])
+            np.testing.assert_equal(photons['channel'][mask],
+                                    self.channel_lists[k])
 
-        if delete:
-            for c in range(1,5):
-                for q in ["bins", "diff", "counts"]:
-                    path = f'{_path}channel_{c}_d01234567_{q}.npy'
-                    os.remove(path)
+    def test_ties(self):
+        photons = merge_photon_lists([np.zeros(3), np.zeros(2)],
+                                     [np.ones(3), np.ones(2)], [1, 0])
+        np.testing.assert_equal(photons['detector'], [1, 1, 0, 0, 0])
 
 
 if __name__ == '__main__':